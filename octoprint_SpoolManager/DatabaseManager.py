@@ -1,26 +1,106 @@
 # coding=utf-8
+import base64
 import datetime
 import json
 import logging
 import os
 import shutil
+import threading
+import time
+from contextlib import contextmanager
 
 from peewee import *
+from peewee import __sqlite_version__, sort_models
+from playhouse.pool import PooledPostgresqlDatabase
 
 from octoprint_SpoolManager.api import Transformer
 from octoprint_SpoolManager.common import StringUtils
 from octoprint_SpoolManager.models.PluginMetaDataModel import PluginMetaDataModel
+from octoprint_SpoolManager.models.SpoolLabelModel import SpoolLabelModel
 from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+from octoprint_SpoolManager.spool_catalogs import SpoolCatalogs, readSpoolLabels
+from octoprint_SpoolManager.spool_counts import SpoolCounts
 from octoprint_SpoolManager.WrappedLoggingHandler import WrappedLoggingHandler
 
 from .db import DatabaseSettings
 
 FORCE_CREATE_TABLES = False
 
-CURRENT_DATABASE_SCHEME_VERSION = 7
+CURRENT_DATABASE_SCHEME_VERSION = 9
 
 # List all Models
-MODELS = [PluginMetaDataModel, SpoolModel]
+MODELS = [PluginMetaDataModel, SpoolModel, SpoolLabelModel]
+
+# sortColumn of the spool table -> field
+SORT_FIELDS = {
+    "displayName": SpoolModel.displayName,
+    "lastUse": SpoolModel.lastUse,
+    "firstUse": SpoolModel.firstUse,
+    "remaining": SpoolModel.remainingWeightInGram,
+    "material": SpoolModel.material,
+}
+
+# filament usage of a spool, maintained by the odometer commits (saveSpoolsUsage)
+USAGE_FIELDS = (SpoolModel.usedLengthInMM, SpoolModel.usedWeightInGram)
+
+# spools per INSERT statement of the bulk import
+IMPORT_BATCH_SIZE = 250
+
+# spools per query of the streamed export
+EXPORT_CHUNK_SIZE = 500
+
+# cached spool counts, one per filter combination of the table
+SPOOL_COUNTS_CACHE_SIZE = 128
+
+# pooled connections that were idle longer, are checked with a simple query before reuse
+POOL_HEALTH_CHECK_AFTER_SECONDS = 30
+
+
+class HealthCheckedPooledPostgresqlDatabase(PooledPostgresqlDatabase):
+    """
+    Connection pool with an idle timeout (the peewee stale_timeout is the age of the connection)
+    and a health check of connections that were idle for a while
+    """
+
+    def __init__(self, database, idle_timeout=None, **kwargs):
+        self._idleTimeout = idle_timeout
+        self._idleSince = {}
+        super().__init__(database, **kwargs)
+
+    def _is_closed(self, conn):
+        # called during checkout of a pooled connection
+        if super()._is_closed(conn):
+            return True
+        idleSince = self._idleSince.pop(self.conn_key(conn), None)
+        if idleSince is None:
+            return False
+        idleSeconds = time.time() - idleSince
+        if self._idleTimeout and idleSeconds > self._idleTimeout:
+            self._closeQuietly(conn)
+            return True
+        if idleSeconds > POOL_HEALTH_CHECK_AFTER_SECONDS:
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            except Exception:
+                self._closeQuietly(conn)
+                return True
+        return False
+
+    def _close(self, conn, close_conn=False):
+        if close_conn:
+            self._idleSince.pop(self.conn_key(conn), None)
+        else:
+            # checkin
+            self._idleSince[self.conn_key(conn)] = time.time()
+        super()._close(conn, close_conn)
+
+    def _closeQuietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
 
 
 class DatabaseManager:
@@ -39,23 +119,55 @@ class DatabaseManager:
         self._isConnected = False
         self._currentErrorMessageDict = None
 
-    def _buildDatabaseConnection(self):
+        # pool mode: one database object for all threads, each thread checks out its own connection
+        self._pooledDatabase = None
+        self._pooledDatabaseKey = None
+        self._poolLock = threading.Lock()
+
+        # vendors, materials, labels, colors; maintained by save/delete
+        self._spoolCatalogs = SpoolCatalogs()
+        # filter signature -> spool count, cleared by save/delete
+        self._spoolCounts = SpoolCounts(SPOOL_COUNTS_CACHE_SIZE)
+
+    def _buildDatabaseConnection(self, databaseSettings=None, usePool=None):
+        """
+        :param databaseSettings: default the current settings
+        :param usePool: default the pool setting of the current settings
+        """
+        if databaseSettings == None:
+            databaseSettings = self._databaseSettings
+        if usePool == None:
+            usePool = self._isPoolEnabled()
         database = None
-        if self._databaseSettings.useExternal == False:
+        if databaseSettings.useExternal == False:
             # local database`
-            database = SqliteDatabase(self._databaseSettings.fileLocation)
+            # (thread safe, in pool mode each thread keeps its own connection open)
+            database = SqliteDatabase(databaseSettings.fileLocation)
         else:
-            databaseType = self._databaseSettings.type
-            databaseName = self._databaseSettings.name
-            host = self._databaseSettings.host
-            port = self._databaseSettings.port
-            user = self._databaseSettings.user
-            password = self._databaseSettings.password
+            databaseType = databaseSettings.type
+            databaseName = databaseSettings.name
+            host = databaseSettings.host
+            port = databaseSettings.port
+            user = databaseSettings.user
+            password = databaseSettings.password
             if "postgres" == databaseType:
-                # Connect to a Postgres database.
-                database = PostgresqlDatabase(
-                    databaseName, user=user, password=password, host=host, port=port
-                )
+                if usePool:
+                    database = HealthCheckedPooledPostgresqlDatabase(
+                        databaseName,
+                        user=user,
+                        password=password,
+                        host=host,
+                        port=port,
+                        max_connections=databaseSettings.poolSize,
+                        idle_timeout=databaseSettings.poolIdleTimeout,
+                        # wait for a free connection, if all are in use
+                        timeout=10,
+                    )
+                else:
+                    # Connect to a Postgres database.
+                    database = PostgresqlDatabase(
+                        databaseName, user=user, password=password, host=host, port=port
+                    )
 
         return database
 
@@ -63,20 +175,74 @@ class DatabaseManager:
         if forceCreateTables:
             self._logger.info("Creating new database-tables, because FORCE == TRUE!")
             self._createDatabaseTables()
+        else:
+            self._upgradeDatabaseScheme()
 
         self._logger.info("Database created-check done")
 
-    def _createDatabaseTables(self):
+    def _upgradeDatabaseScheme(self):
+        if self._database.table_exists(PluginMetaDataModel._meta.table_name) == False:
+            return
+        schemeVersionModel = PluginMetaDataModel.get_or_none(
+            PluginMetaDataModel.key == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
+        )
+        if schemeVersionModel == None:
+            return
+        schemeVersion = int(schemeVersionModel.value)
+        upgrades = {8: self._upgradeFrom7To8, 9: self._upgradeFrom8To9}
+        while schemeVersion < CURRENT_DATABASE_SCHEME_VERSION:
+            newSchemeVersion = schemeVersion + 1
+            if newSchemeVersion not in upgrades:
+                self._logger.error(
+                    "No upgrade of the database scheme from %d to %d available"
+                    % (schemeVersion, newSchemeVersion)
+                )
+                return
+            self._logger.info(
+                "Upgrading database scheme from %d to %d"
+                % (schemeVersion, newSchemeVersion)
+            )
+            with self._database.atomic():
+                upgrades[newSchemeVersion]()
+                schemeVersionModel.value = newSchemeVersion
+                schemeVersionModel.save()
+            schemeVersion = newSchemeVersion
+
+    def _upgradeFrom7To8(self):
+        # normalized labels, filled from the JSON column
+        self._database.create_tables([SpoolLabelModel])
+        labelRows = []
+        for spoolModel in SpoolModel.select(SpoolModel.databaseId, SpoolModel.labels):
+            for label in readSpoolLabels(spoolModel.labels):
+                labelRows.append({"spool": spoolModel.databaseId, "label": label})
+        for batch in chunked(labelRows, 500):
+            SpoolLabelModel.insert_many(batch).execute()
+
+    def _upgradeFrom8To9(self):
+        # indexes for the table filter/sort combinations, only the missing ones are created
+        SpoolModel.create_table(safe=True)
+
+    def _createDatabaseTables(self, database=None):
+        """
+        :param database: default the current database, otherwise an other (probe) database, the models stay
+        bound to the current database
+        """
         self._logger.info("Creating new database tables for spoolmanager-plugin")
-        self._database.connect(reuse_if_open=True)
-        self._database.drop_tables(MODELS)
-        self._database.create_tables(MODELS)
-
-        PluginMetaDataModel.create(
+        currentDatabase = database == None
+        if currentDatabase:
+            database = self._database
+            database.connect(reuse_if_open=True)
+        for model in reversed(sort_models(MODELS)):
+            SchemaManager(model, database).drop_all(safe=True)
+        for model in sort_models(MODELS):
+            SchemaManager(model, database).create_all(safe=True)
+
+        PluginMetaDataModel.insert(
             key=PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION,
             value=CURRENT_DATABASE_SCHEME_VERSION,
-        )
-        self.closeDatabase()
+        ).execute(database)
+        if currentDatabase:
+            self.closeDatabase()
 
     def _storeErrorMessage(self, type, title, message, sendErrorPopUp):
         # store current error message
@@ -135,14 +301,29 @@ class DatabaseManager:
         return self._databaseSettings
 
     def testDatabaseConnection(self, databaseSettings=None):
+        """
+        :param databaseSettings: default the current settings, other settings are tested with a separate
+        connection (see _openProbeDatabase)
+        :return: None or the error message dict
+        """
         result = None
-        backupCurrentDatabaseSettings = None
-        try:
-            # use provided databasesettings or default if not provided
-            if databaseSettings != None:
-                backupCurrentDatabaseSettings = self._databaseSettings
-                self._databaseSettings = databaseSettings
+        if databaseSettings != None:
+            try:
+                with self._openProbeDatabase(databaseSettings):
+                    pass
+            except Exception as e:
+                self._logger.exception("testDatabaseConnection")
+                result = {
+                    "type": "error",
+                    "title": "connection problem",
+                    "message": str(e),
+                }
+                self._passMessageToClient(
+                    result["type"], result["title"], result["message"]
+                )
+            return result
 
+        try:
             succesfull = self.connectoToDatabase()
             if succesfull == False:
                 result = self.getCurrentErrorMessageDict()
@@ -151,11 +332,30 @@ class DatabaseManager:
                 self.closeDatabase()
             except:
                 pass  # do nothing
-            if backupCurrentDatabaseSettings != None:
-                self._databaseSettings = backupCurrentDatabaseSettings
 
         return result
 
+    @contextmanager
+    def _openProbeDatabase(self, databaseSettings):
+        """
+        Separate connection for other database settings (connection test, meta data, recreate): never pooled,
+        the models stay bound to the current database and the pool (with the connections of the other
+        threads) is not touched
+        """
+        database = self._buildDatabaseConnection(databaseSettings, usePool=False)
+        if database == None:
+            raise ValueError(
+                "Database type '%s' is not supported" % databaseSettings.type
+            )
+        database.connect()
+        try:
+            yield database
+        finally:
+            try:
+                database.close()
+            except Exception:
+                pass  ## ignore close exception
+
     def getCurrentErrorMessageDict(self):
         return self._currentErrorMessageDict
 
@@ -172,13 +372,16 @@ class DatabaseManager:
             if self.sqlLoggingEnabled:
                 self._logger.info("Databaseconnection with...")
                 self._logger.info(self._databaseSettings)
-            self._database = self._buildDatabaseConnection()
+            if self._isPoolEnabled():
+                self._connectPooledDatabase()
+            else:
+                self._database = self._buildDatabaseConnection()
 
-            # connect to Database
-            DatabaseManager.db = self._database
-            self._database.bind(MODELS)
+                # connect to Database
+                DatabaseManager.db = self._database
+                self._database.bind(MODELS)
 
-            self._database.connect()
+                self._database.connect()
             if self.sqlLoggingEnabled:
                 self._logger.info(
                     "Database connection succesful. Checking Scheme versions"
@@ -199,6 +402,10 @@ class DatabaseManager:
         self,
     ):
         self._currentErrorMessageDict = None
+        if self._isPoolEnabled() and self._database is self._pooledDatabase:
+            # the pool stays available for all other threads
+            self._releasePooledConnection()
+            return
         try:
             self._database.close()
             pass
@@ -206,6 +413,75 @@ class DatabaseManager:
             pass  ## ignore close exception
         self._isConnected = False
 
+    def _isPoolEnabled(self):
+        return self._databaseSettings != None and self._databaseSettings.poolEnabled
+
+    def _buildPooledDatabaseKey(self):
+        databaseSettings = self._databaseSettings
+        return (
+            databaseSettings.useExternal,
+            databaseSettings.fileLocation,
+            databaseSettings.type,
+            databaseSettings.host,
+            databaseSettings.port,
+            databaseSettings.name,
+            databaseSettings.user,
+            databaseSettings.password,
+            databaseSettings.poolSize,
+            databaseSettings.poolIdleTimeout,
+        )
+
+    def _connectPooledDatabase(self):
+        pooledDatabaseKey = self._buildPooledDatabaseKey()
+        with self._poolLock:
+            if (
+                self._pooledDatabase == None
+                or self._pooledDatabaseKey != pooledDatabaseKey
+            ):
+                # new or changed database settings
+                self.closePool()
+                self._pooledDatabase = self._buildDatabaseConnection()
+                self._pooledDatabaseKey = pooledDatabaseKey
+            if self._database is not self._pooledDatabase:
+                self._database = self._pooledDatabase
+                DatabaseManager.db = self._database
+                self._database.bind(MODELS)
+        # reuses the open connection of the current thread or checks out a new one
+        self._database.connect(reuse_if_open=True)
+
+    def _isPooledConnectionOpen(self):
+        return (
+            self._pooledDatabase != None
+            and self._database is self._pooledDatabase
+            and self._pooledDatabase.is_closed() == False
+        )
+
+    def _releasePooledConnection(self):
+        database = self._pooledDatabase
+        if database == None or isinstance(database, SqliteDatabase):
+            # sqlite: long-lived connection per thread
+            return
+        if database.is_closed() == False and database.in_transaction() == False:
+            # back into the pool
+            database.close()
+
+    def closePool(self):
+        """
+        closes all pooled connections, e.g. during shutdown
+        """
+        database = self._pooledDatabase
+        self._pooledDatabase = None
+        self._pooledDatabaseKey = None
+        if database == None:
+            return
+        try:
+            if isinstance(database, PooledPostgresqlDatabase):
+                database.close_all()
+            else:
+                database.close()
+        except Exception:
+            pass  ## ignore close exception
+
     def isConnected(self):
         return self._isConnected
 
@@ -274,22 +550,23 @@ class DatabaseManager:
         self._currentErrorMessageDict = None
         self._logger.info("ReCreating Database")
 
-        backupCurrentDatabaseSettings = None
         if databaseSettings != None:
-            backupCurrentDatabaseSettings = self._databaseSettings
-            self._databaseSettings = databaseSettings
-        try:
-            # - connect to dataabase
-            self.connectoToDatabase()
+            # e.g. the external database, could be the current one
+            with self._openProbeDatabase(databaseSettings) as database:
+                self._createDatabaseTables(database)
+            self._spoolCatalogs.invalidate()
+            self._spoolCounts.clear()
+            return
 
-            self._createDatabase(True)
+        # - connect to dataabase
+        self.connectoToDatabase()
 
-            # - close dataabase
-            self.closeDatabase()
-        finally:
-            # - restore database settings
-            if backupCurrentDatabaseSettings != None:
-                self._databaseSettings = backupCurrentDatabaseSettings
+        self._createDatabase(True)
+        self._spoolCatalogs.invalidate()
+        self._spoolCounts.clear()
+
+        # - close dataabase
+        self.closeDatabase()
 
     def _handleReusableConnection(
         self,
@@ -298,6 +575,7 @@ class DatabaseManager:
         methodeNameForLogging,
         defaultReturnValue=None,
     ):
+        releaseConnection = False
         try:
             if withReusedConnection == True:
                 if self._isConnected == False:
@@ -306,6 +584,10 @@ class DatabaseManager:
                     )
                     return defaultReturnValue
             else:
+                # nested calls (e.g. inside a transaction) use the connection of the outer call
+                releaseConnection = (
+                    self._isPoolEnabled() and self._isPooledConnectionOpen() == False
+                )
                 self.connectoToDatabase()
             return databaseCallMethode()
         except Exception as e:
@@ -319,26 +601,21 @@ class DatabaseManager:
             )
             return defaultReturnValue
         finally:
-            try:
-                if withReusedConnection == False:
-                    self._closeDatabase()
-            except:
-                pass  # do nothing
+            if releaseConnection:
+                try:
+                    self._releasePooledConnection()
+                except:
+                    pass  # do nothing
         pass
 
     def loadDatabaseMetaInformations(self, databaseSettings=None):
-
-        backupCurrentDatabaseSettings = None
-        if databaseSettings != None:
-            backupCurrentDatabaseSettings = self._databaseSettings
-        else:
-            # use default settings
+        """
+        Scheme version and spool count of the local and (if used) the external database, each read with a
+        separate connection (see _openProbeDatabase)
+        :param databaseSettings: default the current settings
+        """
+        if databaseSettings == None:
             databaseSettings = self._databaseSettings
-            backupCurrentDatabaseSettings = self._databaseSettings
-        # filelocation
-        # backupname
-        # scheme version
-        # spoolitem count
         schemeVersionFromPlugin = CURRENT_DATABASE_SCHEME_VERSION
         localSchemeVersionFromDatabaseModel = "-"
         localSpoolItemCount = "-"
@@ -346,60 +623,32 @@ class DatabaseManager:
         externalSpoolItemCount = "-"
         errorMessage = ""
         loadResult = False
-        # - save current DatbaseSettings
-        # currentDatabaseSettings = self._databaseSettings
-        # currentDatabase = self._database
-        # externalConnected = False
-        # always read local meta data
         try:
-            currentDatabaseType = databaseSettings.type
-
-            # First load meta from local sqlite database
-            databaseSettings.type = "sqlite"
-            databaseSettings.baseFolder = self._databaseSettings.baseFolder
-            databaseSettings.fileLocation = self._databaseSettings.fileLocation
-            self._databaseSettings = databaseSettings
+            # always read local meta data
+            localDatabaseSettings = DatabaseSettings()
+            localDatabaseSettings.useExternal = False
+            localDatabaseSettings.baseFolder = self._databaseSettings.baseFolder
+            localDatabaseSettings.fileLocation = self._databaseSettings.fileLocation
             try:
-                self.connectoToDatabase(sendErrorPopUp=False)
-                localSchemeVersionFromDatabaseModel = PluginMetaDataModel.get(
-                    PluginMetaDataModel.key
-                    == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
-                ).value
-                localSpoolItemCount = self.countSpoolsByQuery()
-                self.closeDatabase()
+                with self._openProbeDatabase(localDatabaseSettings) as database:
+                    localSchemeVersionFromDatabaseModel, localSpoolItemCount = (
+                        self._readMetaInformations(database)
+                    )
             except Exception as e:
                 errorMessage = "local database: " + str(e)
                 self._logger.error("Connecting to local database not possible")
                 self._logger.exception(e)
-                try:
-                    self.closeDatabase()
-                except Exception:
-                    pass  # ignore close exception
 
-            # Use orign Databasetype to collect the other meta dtaa (if neeeded)
-            databaseSettings.type = currentDatabaseType
             if databaseSettings.useExternal == True:
                 # External DB
-                self._databaseSettings = databaseSettings
-                self.connectoToDatabase(sendErrorPopUp=False)
-                externalSchemeVersionFromDatabaseModel = PluginMetaDataModel.get(
-                    PluginMetaDataModel.key
-                    == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
-                ).value
-                externalSpoolItemCount = self.countSpoolsByQuery()
-                self.closeDatabase()
+                with self._openProbeDatabase(databaseSettings) as database:
+                    externalSchemeVersionFromDatabaseModel, externalSpoolItemCount = (
+                        self._readMetaInformations(database)
+                    )
             loadResult = True
         except Exception as e:
             errorMessage = str(e)
             self._logger.exception(e)
-            try:
-                self.closeDatabase()
-            except Exception:
-                pass  # ignore close exception
-        finally:
-            # restore orig. databasettings
-            if backupCurrentDatabaseSettings != None:
-                self._databaseSettings = backupCurrentDatabaseSettings
 
         return {
             "success": loadResult,
@@ -411,6 +660,21 @@ class DatabaseManager:
             "externalSpoolItemCount": externalSpoolItemCount,
         }
 
+    def _readMetaInformations(self, database):
+        """
+        :return: (scheme version, spool count) of the (probe) database
+        """
+        schemeVersion = (
+            PluginMetaDataModel.select()
+            .where(
+                PluginMetaDataModel.key
+                == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
+            )
+            .get(database)
+            .value
+        )
+        return (schemeVersion, SpoolModel.select().count(database))
+
     def loadFirstSingleSpool(self, withReusedConnection=False):
         def databaseCallMethode():
             return SpoolModel.select().limit(1)[0]
@@ -427,6 +691,26 @@ class DatabaseManager:
             databaseCallMethode, withReusedConnection, "loadSpool"
         )
 
+    def loadSpools(self, databaseIds, withReusedConnection=False):
+        """
+        loads all spools with one query
+        :return: dict databaseId -> SpoolModel, not existing spools are missing. None if the database call failed
+        """
+
+        def databaseCallMethode():
+            # ids from older settings or urls could be strings
+            uniqueDatabaseIds = set(int(databaseId) for databaseId in databaseIds)
+            if len(uniqueDatabaseIds) == 0:
+                return {}
+            myQuery = SpoolModel.select().where(
+                SpoolModel.databaseId.in_(list(uniqueDatabaseIds))
+            )
+            return {spoolModel.databaseId: spoolModel for spoolModel in myQuery}
+
+        return self._handleReusableConnection(
+            databaseCallMethode, withReusedConnection, "loadSpools"
+        )
+
     def loadSpoolTemplates(self, withReusedConnection=False):
         def databaseCallMethode():
             return SpoolModel.select().where(SpoolModel.isTemplate == True)
@@ -435,128 +719,330 @@ class DatabaseManager:
             databaseCallMethode, withReusedConnection, "loadSpoolTemplates"
         )
 
+    def _buildFilteredSpoolsQuery(self, tableQuery):
+        """
+        spools matching the filters of the table, without paging and sorting
+        """
+        filterName = tableQuery["filterName"]
+        myQuery = SpoolModel.select()
+
+        if "materialFilter" in tableQuery:
+            materialFilter = tableQuery["materialFilter"]
+            vendorFilter = tableQuery["vendorFilter"]
+            colorFilter = tableQuery["colorFilter"]
+
+            # materialFilter
+            # u'ABS,PLA'
+            # u''
+            # u'all'
+            materialFilter = StringUtils.to_native_str(materialFilter)
+            if materialFilter != "all":
+                if StringUtils.isEmpty(materialFilter):
+                    myQuery = myQuery.where((SpoolModel.material == ""))
+                else:
+                    allMaterials = materialFilter.split(",")
+                    myQuery = myQuery.where(SpoolModel.material.in_(allMaterials))
+                    # for material in allMaterials:
+                    # 	myQuery = myQuery.orwhere((SpoolModel.material == material))
+            # vendorFilter
+            # u'MatterMost,TheFactory'
+            # u''
+            # u'all'
+            vendorFilter = StringUtils.to_native_str(vendorFilter)
+            if vendorFilter != "all":
+                if StringUtils.isEmpty(vendorFilter):
+                    myQuery = myQuery.where((SpoolModel.vendor == ""))
+                else:
+                    allVendors = vendorFilter.split(",")
+                    myQuery = myQuery.where(SpoolModel.vendor.in_(allVendors))
+                    # for vendor in allVendors:
+                    # 	myQuery = myQuery.orwhere((SpoolModel.vendor == vendor))
+            # colorFilter
+            # u'#ff0000;red,#ff0000;keinRot,#ff0000;deinRot,#ff0000;meinRot,#ffff00;yellow'
+            # u''
+            # u'all'
+            colorFilter = StringUtils.to_native_str(colorFilter)
+            if colorFilter != "all" and StringUtils.isNotEmpty(colorFilter):
+                allColorObjects = colorFilter.split(",")
+                allColors = []
+                allColorNames = []
+                for colorObject in allColorObjects:
+                    colorCodeColorName = colorObject.split(";")
+                    color = colorCodeColorName[0]
+                    colorName = colorCodeColorName[1]
+                    allColors.append(color)
+                    allColorNames.append(colorName)
+                myQuery = myQuery.where(SpoolModel.color.in_(allColors))
+                myQuery = myQuery.where(SpoolModel.colorName.in_(allColorNames))
+
+                #
+                # 	myQuery = myQuery.orwhere(  (SpoolModel.color == color) & (SpoolModel.colorName == colorName) )
+            pass
+
+        # labelFilter
+        # u'outdoor,flexible'
+        # u'all'
+        if "labelFilter" in tableQuery:
+            labelFilter = StringUtils.to_native_str(tableQuery["labelFilter"])
+            if labelFilter != "all" and StringUtils.isNotEmpty(labelFilter):
+                # spools with one of the labels, semi-join over the (label, spool) index
+                allLabels = labelFilter.split(",")
+                spoolsWithLabels = SpoolLabelModel.select(SpoolLabelModel.spool).where(
+                    SpoolLabelModel.label.in_(allLabels)
+                )
+                myQuery = myQuery.where(SpoolModel.databaseId.in_(spoolsWithLabels))
+
+        # mySqlText = myQuery.sql()
+
+        if "onlyTemplates" in filterName:
+            myQuery = myQuery.where((SpoolModel.isTemplate == True))
+        else:
+            if filterName == "hideEmptySpools":
+                myQuery = myQuery.where(
+                    (SpoolModel.remainingWeightInGram > 0)
+                    | (SpoolModel.remainingWeightInGram == None)
+                )
+            if filterName == "hideInactiveSpools":
+                myQuery = myQuery.where((SpoolModel.isActive == True))
+            if filterName == "hideEmptySpools,hideInactiveSpools":
+                myQuery = myQuery.where(
+                    (
+                        (SpoolModel.remainingWeightInGram > 0)
+                        | (SpoolModel.remainingWeightInGram == None)
+                    )
+                    & (SpoolModel.isActive == True)
+                )
+        return myQuery
+
+    def _buildFilterSignature(self, tableQuery):
+        if tableQuery == None:
+            return ()
+        return tuple(
+            StringUtils.to_native_str(tableQuery.get(key, ""))
+            for key in [
+                "filterName",
+                "materialFilter",
+                "vendorFilter",
+                "colorFilter",
+                "labelFilter",
+            ]
+        )
+
+    def _sortExpression(self, sortColumn, value):
+        # displayName is sorted case-insensitive
+        if sortColumn == "displayName":
+            return fn.Lower(value)
+        return value
+
+    def _buildSpoolsPageQuery(self, tableQuery):
+        """
+        filtered, sorted and paged spools of the table
+        """
+        sortColumn = tableQuery["sortColumn"]
+        sortOrder = tableQuery["sortOrder"]
+
+        myQuery = self._buildFilteredSpoolsQuery(tableQuery)
+        if self._isPagedTableQuery(tableQuery):
+            offset = int(tableQuery["from"])
+            limit = int(tableQuery["to"])
+            myQuery = myQuery.offset(offset).limit(limit)
+
+        sortField = SORT_FIELDS.get(sortColumn)
+        if sortField != None:
+            sortExpression = self._sortExpression(sortColumn, sortField)
+            if "desc" == sortOrder:
+                myQuery = myQuery.order_by(sortExpression.desc())
+            else:
+                myQuery = myQuery.order_by(sortExpression.asc())
+        return myQuery
+
+    def _isPagedTableQuery(self, tableQuery):
+        return (
+            "selectedPageSize" not in tableQuery
+            or StringUtils.to_native_str(tableQuery["selectedPageSize"]) != "all"
+        )
+
+    def _supportsWindowFunctions(self):
+        if isinstance(self._database, SqliteDatabase):
+            # window functions since SQLite 3.25
+            return __sqlite_version__ >= (3, 25, 0)
+        # PostgreSQL
+        return True
+
     def loadAllSpoolsByQuery(self, tableQuery=None, withReusedConnection=False):
         def databaseCallMethode():
             if tableQuery == None:
                 return SpoolModel.select().order_by(SpoolModel.created.desc())
+            return self._buildSpoolsPageQuery(tableQuery)
 
-            sortColumn = tableQuery["sortColumn"]
-            sortOrder = tableQuery["sortOrder"]
-            filterName = tableQuery["filterName"]
+        return self._handleReusableConnection(
+            databaseCallMethode, withReusedConnection, "loadAllSpoolsByQuery"
+        )
 
-            if (
-                "selectedPageSize" in tableQuery
-                and StringUtils.to_native_str(tableQuery["selectedPageSize"]) == "all"
-            ):
-                myQuery = SpoolModel.select()
+    def iterateAllSpools(self, chunkSize=EXPORT_CHUNK_SIZE):
+        """
+        Generator over all spools, newest first. The spools are loaded in chunks (keyset on the databaseId),
+        so only one chunk is in memory and a connection is only used while a chunk is loaded.
+        A database error (logged like all other database calls) raises a DatabaseError, also after some spools
+        were already handed out, so an export is never silently truncated.
+        """
+        lastDatabaseId = None
+        while True:
+            myQuery = SpoolModel.select().order_by(SpoolModel.databaseId.desc())
+            if lastDatabaseId != None:
+                myQuery = myQuery.where(SpoolModel.databaseId < lastDatabaseId)
+            myQuery = myQuery.limit(chunkSize)
+
+            def databaseCallMethode():
+                # iterator(): no result cache of the query next to the list
+                return list(myQuery.iterator())
+
+            spoolModels = self._handleReusableConnection(
+                databaseCallMethode, False, "iterateAllSpools"
+            )
+            if spoolModels == None:
+                raise DatabaseError("Could not load all spools, see the log")
+            yield from spoolModels
+            if len(spoolModels) < chunkSize:
+                return
+            lastDatabaseId = spoolModels[-1].databaseId
+
+    def loadSpoolsPageWithCount(self, tableQuery, withReusedConnection=False):
+        """
+        Page of the spool table together with the number of all spools matching the filters, both from the same
+        filter construction. The count comes with the rows (COUNT(*) OVER ()) in one query; a separate count query
+        is only needed without window functions or for a page behind the last spool.
+        The count is cached like countSpoolsByQuery(useCache=True), with a cached count only the rows are queried.
+        :return: (spoolModels, filteredCount)
+        """
+        filterSignature = self._buildFilterSignature(tableQuery)
+
+        def databaseCallMethode():
+            myQuery = self._buildSpoolsPageQuery(tableQuery)
+            cachedCount = self._spoolCounts.get(filterSignature)
+            if cachedCount != None:
+                return (list(myQuery), cachedCount)
+            countGeneration = self._spoolCounts.getGeneration()
+
+            if self._supportsWindowFunctions():
+                spoolModels = list(
+                    myQuery.select_extend(
+                        fn.COUNT(SQL("*")).over().alias("filteredCount")
+                    )
+                )
+                if len(spoolModels) > 0:
+                    filteredCount = spoolModels[0].filteredCount
+                elif (
+                    self._isPagedTableQuery(tableQuery) and int(tableQuery["from"]) > 0
+                ):
+                    # no row to carry the count
+                    filteredCount = self._buildFilteredSpoolsQuery(tableQuery).count()
+                else:
+                    filteredCount = 0
             else:
-                offset = int(tableQuery["from"])
-                limit = int(tableQuery["to"])
-                myQuery = SpoolModel.select().offset(offset).limit(limit)
-
-            if "materialFilter" in tableQuery:
-                materialFilter = tableQuery["materialFilter"]
-                vendorFilter = tableQuery["vendorFilter"]
-                colorFilter = tableQuery["colorFilter"]
-
-                # materialFilter
-                # u'ABS,PLA'
-                # u''
-                # u'all'
-                materialFilter = StringUtils.to_native_str(materialFilter)
-                if materialFilter != "all":
-                    if StringUtils.isEmpty(colorFilter):
-                        myQuery = myQuery.where((SpoolModel.material == ""))
-                    else:
-                        allMaterials = materialFilter.split(",")
-                        myQuery = myQuery.where(SpoolModel.material.in_(allMaterials))
-                        # for material in allMaterials:
-                        # 	myQuery = myQuery.orwhere((SpoolModel.material == material))
-                # vendorFilter
-                # u'MatterMost,TheFactory'
-                # u''
-                # u'all'
-                vendorFilter = StringUtils.to_native_str(vendorFilter)
-                if vendorFilter != "all":
-                    if StringUtils.isEmpty(vendorFilter):
-                        myQuery = myQuery.where((SpoolModel.vendor == ""))
-                    else:
-                        allVendors = vendorFilter.split(",")
-                        myQuery = myQuery.where(SpoolModel.vendor.in_(allVendors))
-                        # for vendor in allVendors:
-                        # 	myQuery = myQuery.orwhere((SpoolModel.vendor == vendor))
-                # colorFilter
-                # u'#ff0000;red,#ff0000;keinRot,#ff0000;deinRot,#ff0000;meinRot,#ffff00;yellow'
-                # u''
-                # u'all'
-                colorFilter = StringUtils.to_native_str(colorFilter)
-                if colorFilter != "all" and StringUtils.isNotEmpty(colorFilter):
-                    allColorObjects = colorFilter.split(",")
-                    allColors = []
-                    allColorNames = []
-                    for colorObject in allColorObjects:
-                        colorCodeColorName = colorObject.split(";")
-                        color = colorCodeColorName[0]
-                        colorName = colorCodeColorName[1]
-                        allColors.append(color)
-                        allColorNames.append(colorName)
-                    myQuery = myQuery.where(SpoolModel.color.in_(allColors))
-                    myQuery = myQuery.where(SpoolModel.colorName.in_(allColorNames))
-
-                    #
-                    # 	myQuery = myQuery.orwhere(  (SpoolModel.color == color) & (SpoolModel.colorName == colorName) )
-                pass
+                spoolModels = list(myQuery)
+                filteredCount = self._buildFilteredSpoolsQuery(tableQuery).count()
 
-            # mySqlText = myQuery.sql()
+            self._spoolCounts.put(filterSignature, filteredCount, countGeneration)
+            return (spoolModels, filteredCount)
 
-            if "onlyTemplates" in filterName:
-                myQuery = myQuery.where((SpoolModel.isTemplate == True))
-            else:
-                if filterName == "hideEmptySpools":
-                    myQuery = myQuery.where(
-                        (spoolModel.remainingWeightInGram > 0)
-                        | (spoolModel.remainingWeightInGram == None)
-                    )
-                if filterName == "hideInactiveSpools":
-                    myQuery = myQuery.where((SpoolModel.isActive == True))
-                if filterName == "hideEmptySpools,hideInactiveSpools":
-                    myQuery = myQuery.where(
-                        (
-                            (spoolModel.remainingWeightInGram > 0)
-                            | (spoolModel.remainingWeightInGram == None)
-                        )
-                        & (SpoolModel.isActive == True)
+        return self._handleReusableConnection(
+            databaseCallMethode,
+            withReusedConnection,
+            "loadSpoolsPageWithCount",
+            ([], 0),
+        )
+
+    def loadSpoolsByCursor(self, tableQuery, withReusedConnection=False):
+        """
+        Keyset pagination: the page starts after the spool of the cursor (sort value + databaseId as tiebreaker),
+        so every page costs the same and inserts/deletes don't shift the following pages.
+        NULL values are the smallest values (first for asc, last for desc) on all databases.
+        :param tableQuery: like loadAllSpoolsByQuery, "cursor" is empty for the first page or the nextCursor
+        of the previous page. The page size is "selectedPageSize"
+        :return: (spoolModels, nextCursor), nextCursor is None on the last page
+        """
+
+        def databaseCallMethode():
+            sortColumn = tableQuery["sortColumn"]
+            descending = "desc" == tableQuery["sortOrder"]
+            sortField = SORT_FIELDS.get(sortColumn, SpoolModel.databaseId)
+
+            myQuery = self._buildFilteredSpoolsQuery(tableQuery)
+            cursor = StringUtils.to_native_str(tableQuery.get("cursor", ""))
+            if StringUtils.isNotEmpty(cursor):
+                myQuery = myQuery.where(
+                    self._buildCursorCondition(
+                        sortColumn, sortField, descending, cursor
                     )
+                )
 
-            if "displayName" == sortColumn:
-                if "desc" == sortOrder:
-                    myQuery = myQuery.order_by(fn.Lower(SpoolModel.displayName).desc())
-                else:
-                    myQuery = myQuery.order_by(fn.Lower(SpoolModel.displayName).asc())
-            if "lastUse" == sortColumn:
-                if "desc" == sortOrder:
-                    myQuery = myQuery.order_by(SpoolModel.lastUse.desc())
-                else:
-                    myQuery = myQuery.order_by(SpoolModel.lastUse.asc())
-            if "firstUse" == sortColumn:
-                if "desc" == sortOrder:
-                    myQuery = myQuery.order_by(SpoolModel.firstUse.desc())
-                else:
-                    myQuery = myQuery.order_by(SpoolModel.firstUse.asc())
-            if "remaining" == sortColumn:
-                if "desc" == sortOrder:
-                    myQuery = myQuery.order_by(spoolModel.remainingWeightInGram.desc())
-                else:
-                    myQuery = myQuery.order_by(spoolModel.remainingWeightInGram.asc())
-            if "material" == sortColumn:
-                if "desc" == sortOrder:
-                    myQuery = myQuery.order_by(SpoolModel.material.desc())
-                else:
-                    myQuery = myQuery.order_by(SpoolModel.material.asc())
-            return myQuery
+            sortExpression = self._sortExpression(sortColumn, sortField)
+            if descending:
+                myQuery = myQuery.order_by(
+                    sortExpression.desc(nulls="last"), SpoolModel.databaseId.desc()
+                )
+            else:
+                myQuery = myQuery.order_by(
+                    sortExpression.asc(nulls="first"), SpoolModel.databaseId.asc()
+                )
+
+            pageSize = StringUtils.to_native_str(
+                tableQuery.get("selectedPageSize", "all")
+            )
+            if pageSize == "all":
+                return (list(myQuery), None)
+            pageSize = int(pageSize)
+            # one more to know if there is a next page
+            spoolModels = list(myQuery.limit(pageSize + 1))
+            if len(spoolModels) <= pageSize:
+                return (spoolModels, None)
+            spoolModels = spoolModels[:pageSize]
+            return (spoolModels, self._encodeCursor(sortField, spoolModels[-1]))
 
         return self._handleReusableConnection(
-            databaseCallMethode, withReusedConnection, "loadAllSpoolsByQuery"
+            databaseCallMethode, withReusedConnection, "loadSpoolsByCursor", ([], None)
+        )
+
+    def _encodeCursor(self, sortField, spoolModel):
+        sortValue = getattr(spoolModel, sortField.name)
+        if isinstance(sortValue, (datetime.datetime, datetime.date)):
+            sortValue = str(sortValue)
+        cursorJson = json.dumps([sortValue, spoolModel.databaseId])
+        return base64.urlsafe_b64encode(cursorJson.encode("utf-8")).decode("ascii")
+
+    def _buildCursorCondition(self, sortColumn, sortField, descending, cursor):
+        sortValue, databaseId = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        )
+        if sortValue != None:
+            sortValue = sortField.python_value(sortValue)
+        if sortField is SpoolModel.databaseId:
+            if descending:
+                return SpoolModel.databaseId < databaseId
+            return SpoolModel.databaseId > databaseId
+
+        sortExpression = self._sortExpression(sortColumn, sortField)
+        if sortValue == None:
+            if descending:
+                # NULLs are at the end
+                return (sortField.is_null()) & (SpoolModel.databaseId < databaseId)
+            return ((sortField.is_null()) & (SpoolModel.databaseId > databaseId)) | (
+                sortField.is_null(False)
+            )
+
+        cursorExpression = self._sortExpression(sortColumn, Value(sortValue))
+        if descending:
+            return (
+                (sortExpression < cursorExpression)
+                | (sortField.is_null())
+                | (
+                    (sortExpression == cursorExpression)
+                    & (SpoolModel.databaseId < databaseId)
+                )
+            )
+        return (sortExpression > cursorExpression) | (
+            (sortExpression == cursorExpression) & (SpoolModel.databaseId > databaseId)
         )
 
     def saveSpool(self, spoolModel, withReusedConnection=False):
@@ -565,47 +1051,33 @@ class DatabaseManager:
                 try:
                     databaseId = spoolModel.databaseId
                     if databaseId != None:
-                        versionFromUI = None
-                        # we need to update and we need to make sure nobody else modify the data
-                        currentSpoolModel = self.loadSpool(
-                            databaseId, withReusedConnection
-                        )
-                        if currentSpoolModel == None:
-                            self._passMessageToClient(
-                                "error",
-                                "DatabaseManager",
-                                "Could not update the Spool, because it is already deleted!",
-                            )
+                        if (
+                            self._increaseSpoolVersion(spoolModel, withReusedConnection)
+                            == False
+                        ):
                             return
-                        else:
-                            versionFromUI = (
-                                spoolModel.version if spoolModel.version != None else 1
-                            )
-                            versionFromDatabase = (
-                                currentSpoolModel.version
-                                if currentSpoolModel.version != None
-                                else 1
-                            )
-                            if versionFromUI != versionFromDatabase:
-                                self._passMessageToClient(
-                                    "error",
-                                    "DatabaseManager",
-                                    "Could not update the Spool, because someone already modified the spool. Do a manuel reload!",
-                                )
-                                return
-                            # okay fits, increate version
-                        newVersion = versionFromUI + 1
-                        spoolModel.version = newVersion
 
                     # Not needed any more, we have multi-temlates
                     # if (spoolModel.isTemplate == True):
                     # 	#  remove template flag from last templateSpool
                     # 	SpoolModel.update({SpoolModel.isTemplate: False}).where(SpoolModel.isTemplate == True).execute()
 
-                    spoolModel.save()
+                    labelsChanged = SpoolModel.labels in spoolModel.dirty_fields
+                    if databaseId != None:
+                        # the usage is maintained by saveSpoolsUsage, a model loaded before the last odometer
+                        # commit must not write its outdated values back
+                        spoolModel.save(only=self._buildSpoolFieldsToUpdate(spoolModel))
+                        self._updateRemainingWeights([databaseId])
+                        self._reloadSpoolUsage(spoolModel)
+                    else:
+                        spoolModel.save()
                     databaseId = spoolModel.get_id()
+                    if labelsChanged:
+                        self._storeSpoolLabels(spoolModel)
                     # do expicit commit
                     transaction.commit()
+                    self._spoolCatalogs.updateSpool(spoolModel)
+                    self._spoolCounts.clear()
                 except Exception as e:
                     # Because this block of code is wrapped with "atomic", a
                     # new transaction will begin automatically after the call
@@ -622,95 +1094,372 @@ class DatabaseManager:
 
             return databaseId
 
-        # always recalculate the remaing weight (total - used)
-        totalWeight = spoolModel.totalWeightInGram
-        usedWeight = spoolModel.usedWeightInGram
-        if totalWeight != None:
-            if usedWeight == None:
-                usedWeight = 0.0
-            remainingWeight = Transformer.calculateRemainingWeight(
-                usedWeight, totalWeight
-            )
-            spoolModel.remainingWeightInGram = remainingWeight
+        self._calculateRemainingWeight(spoolModel)
 
         return self._handleReusableConnection(
             databaseCallMethode, withReusedConnection, "saveSpool"
         )
 
-    def countSpoolsByQuery(self, withReusedConnection=False):
+    def saveSpools(self, spoolModels, withReusedConnection=False):
+        """
+        Updates all spools in one transaction, if one spool could not be updated nothing is stored.
+        :return: True if all spools are stored
+        """
+
         def databaseCallMethode():
-            myQuery = SpoolModel.select()
-            return myQuery.count()
+            with self._database.atomic() as transaction:  # Opens new transaction.
+                try:
+                    for spoolModel in spoolModels:
+                        # already connected, stay in this transaction
+                        if self._increaseSpoolVersion(spoolModel, True) == False:
+                            transaction.rollback()
+                            return False
+                        labelsChanged = SpoolModel.labels in spoolModel.dirty_fields
+                        spoolModel.save()
+                        if labelsChanged:
+                            self._storeSpoolLabels(spoolModel)
+                    transaction.commit()
+                    for spoolModel in spoolModels:
+                        self._spoolCatalogs.updateSpool(spoolModel)
+                    self._spoolCounts.clear()
+                except Exception as e:
+                    transaction.rollback()
+                    self._logger.exception("Could not update Spools in database")
+
+                    self._passMessageToClient(
+                        "error",
+                        "DatabaseManager",
+                        "Could not update the spools in the database. See OctoPrint.log for details!",
+                    )
+                    return False
+            return True
+
+        for spoolModel in spoolModels:
+            self._calculateRemainingWeight(spoolModel)
 
         return self._handleReusableConnection(
-            databaseCallMethode, withReusedConnection, "countSpoolsByQuery"
+            databaseCallMethode, withReusedConnection, "saveSpools", False
         )
 
-    def loadCatalogVendors(self, withReusedConnection=False):
+    def saveSpoolsUsage(self, spoolUsages, withReusedConnection=False):
+        """
+        Adds the filament usage (e.g. of an odometer commit) to the spools in one transaction.
+        The used length/weight are increased in the UPDATE itself and the remaining weight is recalculated from the
+        stored values, so neither a concurrent edit of the spool nor an other commit gets lost.
+        The version is not increased, a spool that is open in the edit dialog could still be saved (saveSpool
+        doesn't write the usage back).
+        :param spoolUsages: list of (databaseId, usedLengthInMM, usedWeightInGram or None if unknown, lastUse)
+        :return: list of the updated spools as stored, None if nothing is stored
+        """
+
         def databaseCallMethode():
-            result = set()
-            result.add("")
-            myQuery = SpoolModel.select(SpoolModel.vendor).distinct()
-            for spool in myQuery:
-                value = spool.vendor
-                if value != None:
-                    result.add(value)
-            return result
+            with self._database.atomic() as transaction:  # Opens new transaction.
+                try:
+                    for databaseId, usedLength, usedWeight, lastUse in spoolUsages:
+                        updatedValues = {
+                            SpoolModel.usedLengthInMM: fn.COALESCE(
+                                SpoolModel.usedLengthInMM, 0
+                            )
+                            + int(round(usedLength)),
+                            SpoolModel.lastUse: lastUse,
+                        }
+                        if usedWeight != None:
+                            updatedValues[SpoolModel.usedWeightInGram] = (
+                                fn.COALESCE(SpoolModel.usedWeightInGram, 0.0)
+                                + usedWeight
+                            )
+                        updatedRows = (
+                            SpoolModel.update(updatedValues)
+                            .where(SpoolModel.databaseId == databaseId)
+                            .execute()
+                        )
+                        if updatedRows == 0:
+                            transaction.rollback()
+                            self._passMessageToClient(
+                                "error",
+                                "DatabaseManager",
+                                "Could not update the Spool, because it is already deleted!",
+                            )
+                            return None
+                    databaseIds = [spoolUsage[0] for spoolUsage in spoolUsages]
+                    self._updateRemainingWeights(databaseIds)
+                    spoolModelsById = {
+                        spoolModel.databaseId: spoolModel
+                        for spoolModel in SpoolModel.select().where(
+                            SpoolModel.databaseId.in_(databaseIds)
+                        )
+                    }
+                    transaction.commit()
+                    spoolModels = [
+                        spoolModelsById[databaseId] for databaseId in databaseIds
+                    ]
+                    for spoolModel in spoolModels:
+                        self._spoolCatalogs.updateSpool(spoolModel)
+                    self._spoolCounts.clear()
+                    return spoolModels
+                except Exception as e:
+                    transaction.rollback()
+                    self._logger.exception("Could not update Spools in database")
+
+                    self._passMessageToClient(
+                        "error",
+                        "DatabaseManager",
+                        "Could not update the spools in the database. See OctoPrint.log for details!",
+                    )
+                    return None
 
         return self._handleReusableConnection(
-            databaseCallMethode, withReusedConnection, "loadCatalogVendors", set()
+            databaseCallMethode, withReusedConnection, "saveSpoolsUsage"
+        )
+
+    def _buildSpoolFieldsToUpdate(self, spoolModel):
+        """
+        all fields, the usage only if it was changed on this model. The remaining weight is always recalculated
+        in the database (_updateRemainingWeights)
+        """
+        # compared by name, peewee fields overload ==
+        usageFieldNames = [field.name for field in USAGE_FIELDS]
+        return [
+            field
+            for field in SpoolModel._meta.sorted_fields
+            if field.name != SpoolModel.remainingWeightInGram.name
+            and (field.name not in usageFieldNames or field.name in spoolModel._dirty)
+        ]
+
+    def _updateRemainingWeights(self, databaseIds):
+        # remaining = total - used, from the stored values (like _calculateRemainingWeight)
+        SpoolModel.update(
+            {
+                SpoolModel.remainingWeightInGram: Case(
+                    None,
+                    [
+                        (
+                            SpoolModel.totalWeightInGram.is_null(False),
+                            SpoolModel.totalWeightInGram
+                            - fn.COALESCE(SpoolModel.usedWeightInGram, 0.0),
+                        )
+                    ],
+                    SpoolModel.remainingWeightInGram,
+                )
+            }
+        ).where(SpoolModel.databaseId.in_(databaseIds)).execute()
+
+    def _reloadSpoolUsage(self, spoolModel):
+        usageFields = list(USAGE_FIELDS) + [SpoolModel.remainingWeightInGram]
+        storedValues = (
+            SpoolModel.select(*usageFields)
+            .where(SpoolModel.databaseId == spoolModel.databaseId)
+            .tuples()
+            .get()
         )
+        for field, value in zip(usageFields, storedValues):
+            # stored values, not a change of the model
+            spoolModel.__data__[field.name] = value
+            spoolModel._dirty.discard(field.name)
+
+    def importSpools(
+        self,
+        spoolModels,
+        batchSize=IMPORT_BATCH_SIZE,
+        updateProgress=None,
+        withReusedConnection=False,
+    ):
+        """
+        Inserts new spools (e.g. from the CSV import) with insert_many in batches, all in one transaction:
+        if one batch fails nothing is stored. The databaseIds are assigned to the spoolModels.
+        :param updateProgress: function(numberOfInsertedSpools), called after each batch
+        :return: True if all spools are stored
+        """
+        insertFields = [
+            field
+            for field in SpoolModel._meta.sorted_fields
+            if field is not SpoolModel.databaseId
+        ]
+        # older SQLite versions allow only 999 variables per statement
+        limitedVariables = __sqlite_version__ < (3, 32, 0)
+        if isinstance(self._database, SqliteDatabase) and limitedVariables:
+            batchSize = min(batchSize, 999 // len(insertFields))
 
-    def loadCatalogMaterials(self, withReusedConnection=False):
         def databaseCallMethode():
-            result = set()
-            myQuery = SpoolModel.select(SpoolModel.material).distinct()
-            for spool in myQuery:
-                value = spool.material
-                if value != None:
-                    result.add(value)
-            return result
+            with self._database.atomic() as transaction:  # Opens new transaction.
+                try:
+                    insertedCount = 0
+                    for spoolBatch in chunked(spoolModels, batchSize):
+                        self._insertSpoolBatch(spoolBatch, insertFields)
+                        insertedCount += len(spoolBatch)
+                        if updateProgress != None:
+                            updateProgress(insertedCount)
+                    transaction.commit()
+                except Exception as e:
+                    transaction.rollback()
+                    for spoolModel in spoolModels:
+                        spoolModel.databaseId = None
+                    self._logger.exception("Could not import Spools into database")
+
+                    self._passMessageToClient(
+                        "error",
+                        "DatabaseManager",
+                        "Could not import the spools into the database. See OctoPrint.log for details!",
+                    )
+                    return False
+            for spoolModel in spoolModels:
+                self._spoolCatalogs.updateSpool(spoolModel)
+            self._spoolCounts.clear()
+            return True
+
+        for spoolModel in spoolModels:
+            self._calculateRemainingWeight(spoolModel)
 
         return self._handleReusableConnection(
-            databaseCallMethode, withReusedConnection, "loadCatalogMaterials", set()
+            databaseCallMethode, withReusedConnection, "importSpools", False
+        )
+
+    def _insertSpoolBatch(self, spoolModels, insertFields):
+        # inside the transaction of the import
+        spoolRows = [
+            tuple(spoolModel.__data__.get(field.name) for field in insertFields)
+            for spoolModel in spoolModels
+        ]
+        insertQuery = SpoolModel.insert_many(spoolRows, fields=insertFields)
+        if self._database.returning_clause:
+            databaseIds = [
+                insertedRow[0]
+                for insertedRow in insertQuery.returning(SpoolModel.databaseId).tuples()
+            ]
+        else:
+            # SQLite: the rows of one INSERT get consecutive ids, the last one is returned
+            lastDatabaseId = insertQuery.execute()
+            databaseIds = range(lastDatabaseId - len(spoolRows) + 1, lastDatabaseId + 1)
+
+        labelRows = []
+        for spoolModel, databaseId in zip(spoolModels, databaseIds):
+            spoolModel.databaseId = databaseId
+            spoolModel._dirty.clear()
+            labelRows += [
+                {"spool": databaseId, "label": label}
+                for label in readSpoolLabels(spoolModel.labels)
+            ]
+        for labelBatch in chunked(labelRows, 400):
+            SpoolLabelModel.insert_many(labelBatch).execute()
+
+    def _storeSpoolLabels(self, spoolModel):
+        # inside the transaction of the spool
+        SpoolLabelModel.delete().where(
+            SpoolLabelModel.spool == spoolModel.databaseId
+        ).execute()
+        labelRows = [
+            {"spool": spoolModel.databaseId, "label": label}
+            for label in readSpoolLabels(spoolModel.labels)
+        ]
+        if len(labelRows) > 0:
+            SpoolLabelModel.insert_many(labelRows).execute()
+
+    def _increaseSpoolVersion(self, spoolModel, withReusedConnection):
+        # we need to update and we need to make sure nobody else modify the data
+        currentSpoolModel = self.loadSpool(spoolModel.databaseId, withReusedConnection)
+        if currentSpoolModel == None:
+            self._passMessageToClient(
+                "error",
+                "DatabaseManager",
+                "Could not update the Spool, because it is already deleted!",
+            )
+            return False
+        versionFromUI = spoolModel.version if spoolModel.version != None else 1
+        versionFromDatabase = (
+            currentSpoolModel.version if currentSpoolModel.version != None else 1
         )
+        if versionFromUI != versionFromDatabase:
+            self._passMessageToClient(
+                "error",
+                "DatabaseManager",
+                "Could not update the Spool, because someone already modified the spool. Do a manuel reload!",
+            )
+            return False
+        # okay fits, increate version
+        spoolModel.version = versionFromUI + 1
+        return True
+
+    def _calculateRemainingWeight(self, spoolModel):
+        # always recalculate the remaing weight (total - used)
+        totalWeight = spoolModel.totalWeightInGram
+        usedWeight = spoolModel.usedWeightInGram
+        if totalWeight != None:
+            if usedWeight == None:
+                usedWeight = 0.0
+            remainingWeight = Transformer.calculateRemainingWeight(
+                usedWeight, totalWeight
+            )
+            spoolModel.remainingWeightInGram = remainingWeight
+
+    def countSpoolsByQuery(
+        self, tableQuery=None, withReusedConnection=False, useCache=False
+    ):
+        """
+        :param tableQuery: count only the spools matching the filters of the table, None for all spools
+        :param useCache: the count is cached per filter signature until the next change of the spools
+        """
+        filterSignature = self._buildFilterSignature(tableQuery)
+        if useCache:
+            cachedCount = self._spoolCounts.get(filterSignature)
+            if cachedCount != None:
+                return cachedCount
+        countGeneration = self._spoolCounts.getGeneration()
 
-    def loadCatalogLabels(self, tableQuery, withReusedConnection=False):
         def databaseCallMethode():
-            result = set()
-            myQuery = SpoolModel.select(SpoolModel.labels).distinct()
-            for spool in myQuery:
-                value = spool.labels
-                if value != None:
-                    spoolLabels = json.loads(value)
-                    for singleLabel in spoolLabels:
-                        result.add(singleLabel)
-            return result
+            if tableQuery == None:
+                myQuery = SpoolModel.select()
+            else:
+                myQuery = self._buildFilteredSpoolsQuery(tableQuery)
+            return myQuery.count()
 
-        return self._handleReusableConnection(
-            databaseCallMethode, withReusedConnection, "loadCatalogLabels", set()
+        countResult = self._handleReusableConnection(
+            databaseCallMethode, withReusedConnection, "countSpoolsByQuery"
         )
+        if useCache and countResult != None:
+            self._spoolCounts.put(filterSignature, countResult, countGeneration)
+        return countResult
+
+    def loadCatalogs(self, knownCatalogVersion=None, withReusedConnection=False):
+        """
+        All catalogs from the maintained catalog store, only the first call (and after invalidateCaches) scans the table
+        :param knownCatalogVersion: version the client already has
+        :return: (catalogVersion, dict with vendors, materials, labels, colors) or (catalogVersion, None) if the
+        client has the current version
+        """
 
-    def loadCatalogColors(self, withReusedConnection=False):
         def databaseCallMethode():
-            result = []
-            myQuery = SpoolModel.select(
-                SpoolModel.color, SpoolModel.colorName
-            ).distinct()
-            for spool in myQuery:
-                if spool.color != None and spool.colorName:
-                    colorInfo = {
-                        "colorId": spool.color + ";" + spool.colorName,
-                        "color": spool.color,
-                        "colorName": spool.colorName,
-                    }
-                    result.append(colorInfo)
-            return result
+            if self._spoolCatalogs.isLoaded() == False:
+                self._spoolCatalogs.load(
+                    SpoolModel.select(
+                        SpoolModel.databaseId,
+                        SpoolModel.vendor,
+                        SpoolModel.material,
+                        SpoolModel.labels,
+                        SpoolModel.color,
+                        SpoolModel.colorName,
+                    )
+                )
+            if knownCatalogVersion == self._spoolCatalogs.getVersion():
+                return (knownCatalogVersion, None)
+            return self._spoolCatalogs.getCatalogs()
 
+        if self._spoolCatalogs.isLoaded():
+            # no database access needed
+            return databaseCallMethode()
         return self._handleReusableConnection(
-            databaseCallMethode, withReusedConnection, "loadCatalogColors", set()
+            databaseCallMethode,
+            withReusedConnection,
+            "loadCatalogs",
+            (None, {"vendors": [""], "materials": [], "labels": [], "colors": []}),
         )
 
+    def invalidateCaches(self):
+        """
+        Drops the catalogs and cached counts, e.g. the spools were modified by an other OctoPrint instance
+        """
+        self._spoolCatalogs.invalidate()
+        self._spoolCounts.clear()
+
     def deleteSpool(self, databaseId, withReusedConnection=False):
         def databaseCallMethode():
             with self._database.atomic() as transaction:  # Opens new transaction.
@@ -719,9 +1468,16 @@ class DatabaseManager:
                     # n = FilamentModel.delete().where(FilamentModel.printJob == databaseId).execute()
                     # n = TemperatureModel.delete().where(TemperatureModel.printJob == databaseId).execute()
 
+                    SpoolLabelModel.delete().where(
+                        SpoolLabelModel.spool == databaseId
+                    ).execute()
                     deleteResult = SpoolModel.delete_by_id(databaseId)
                     if deleteResult == 0:
                         return None
+                    # commit before the counts are cleared, a count query in between would read the deleted spool
+                    transaction.commit()
+                    self._spoolCatalogs.removeSpool(databaseId)
+                    self._spoolCounts.clear()
                     return databaseId
                     pass
                 except Exception as e:
@@ -1,6 +1,7 @@
 from .spool_manager_plugin import SpoolmanagerPlugin
 from .plugin_hooks import PluginHooks
 from .filament_odometer import FilamentOdometer
+from .odometer_queue import OdometerQueue
 
 __plugin_name__ = "SpoolManager Plugin"
 __plugin_pythoncompat__ = ">=2.7,<4"
@@ -8,11 +9,16 @@ __plugin_pythoncompat__ = ">=2.7,<4"
 
 def __plugin_load__():
     filament_odometer = FilamentOdometer()
+    odometer_queue = OdometerQueue(filament_odometer)
 
     global __plugin_implementation__
-    __plugin_implementation__ = SpoolmanagerPlugin(filament_odometer)
+    __plugin_implementation__ = SpoolmanagerPlugin(filament_odometer, odometer_queue)
 
-    hooks = PluginHooks(plugin=__plugin_implementation__, filament_odometer=filament_odometer)
+    hooks = PluginHooks(
+        plugin=__plugin_implementation__,
+        filament_odometer=filament_odometer,
+        odometer_queue=odometer_queue,
+    )
 
     global __plugin_hooks__
     __plugin_hooks__ = {
@@ -1,28 +1,59 @@
 # coding=utf-8
 from __future__ import absolute_import
 
+import concurrent.futures
 import datetime
+import itertools
 import json
 import logging
+import multiprocessing
 import shutil
 import tempfile
 import threading
-from io import BytesIO  # for handling byte strings
 from math import pi as PI
 
 import flask
 import octoprint.plugin
-import qrcode
 from flask import Response, abort, request, send_file
+from octoprint.filemanager import FileDestinations
 from octoprint.server.util.flask import no_firstrun_access
-from PIL import Image, ImageColor
+from peewee import DatabaseError
+from PIL import ImageColor
 
 from octoprint_SpoolManager import DatabaseManager
 from octoprint_SpoolManager.api import Transformer
 from octoprint_SpoolManager.common import CSVExportImporter, StringUtils
 from octoprint_SpoolManager.common.EventBusKeys import EventBusKeys
 from octoprint_SpoolManager.common.SettingsKeys import SettingsKeys
+from octoprint_SpoolManager.label_sheet import (
+    PAGE_SIZES,
+    SHEET_FORMATS,
+    LabelLayout,
+    buildLabelPages,
+    writeLabelSheet,
+)
 from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+from octoprint_SpoolManager.progress_throttle import ProgressThrottle
+from octoprint_SpoolManager.qr_code_cache import QR_CODE_FORMATS
+
+# csv import status is send to the client at most every N rows or T milliseconds
+CSV_PROGRESS_EVERY_ROWS = 100
+CSV_PROGRESS_EVERY_MILLIS = 500
+
+# allowed "size" parameter of the QR code in pixel
+QR_CODE_MIN_SIZE = 32
+QR_CODE_MAX_SIZE = 2048
+
+# label sheet: default grid, spools per request, sheet size kept in memory before a temporary file is used
+LABEL_SHEET_COLUMNS = 4
+LABEL_SHEET_ROWS = 6
+LABEL_SHEET_MAX_SPOOLS = 1000
+LABEL_SHEET_IN_MEMORY_BYTES = 8 * 1024 * 1024
+LABEL_SHEET_CHUNK_BYTES = 64 * 1024
+
+# label sheet QR codes: worker processes of the render pool, pool is stopped after this idle time
+LABEL_RENDER_MAX_WORKERS = 2
+LABEL_RENDER_IDLE_SECONDS = 60
 
 
 class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
@@ -176,15 +207,14 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             [SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS]
         )
 
+        selectedSpools = self._selectedSpoolsCache.getSelectedSpools(databaseIds)
         for toolIndex, databaseId in enumerate(databaseIds):
-            spoolModel = None
+            spoolModel = selectedSpools[toolIndex]
             if databaseId != None:
-                self._databaseManager.connectoToDatabase()
-                spoolModel = self._databaseManager.loadSpool(databaseId)
-                self._databaseManager.closeDatabase()
                 if spoolModel == None:
                     self._logger.warning(
                         "Last selected Spool for Tool %d from plugin-settings not found in database. Maybe deleted in the meantime."
+                        % toolIndex
                     )
             spoolModelList.append(spoolModel)
             if spoolModel != None:
@@ -203,7 +233,7 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
         return spoolModelList
 
     def _createSpoolModelFromLegacy(self, allSpoolLegacyList):
-        allSpoolModels = list()
+        # generator, the spools are created while they are streamed
         for spoolDict in allSpoolLegacyList:
             spoolModel = SpoolModel()
 
@@ -239,9 +269,7 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
                 spoolModel.usedWeight, spoolModel.density, spoolModel.diameter
             )
 
-            allSpoolModels.append(spoolModel)
-
-        return allSpoolModels
+            yield spoolModel
 
     def _calculateUsedLength(self, usedWeight, density, diameter):
         if diameter == None or density == None or usedWeight == None:
@@ -258,6 +286,7 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
     def _resetSelectedSpools(self):
         self._settings.set([SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS], [])
         self._settings.save()
+        self._selectedSpoolsCache.setSelection([])
 
     def _selectSpool(self, toolIndex, databaseId):
         # three cases
@@ -273,6 +302,8 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
         if databaseId != -1:
             spoolModel = self._databaseManager.loadSpool(databaseId)
             if spoolModel != None:
+                # the id from the QR code url is a string, the settings and the cache use the database value
+                databaseId = spoolModel.databaseId
                 self._logger.info(
                     "Store selected spool %s for tool %d in settings."
                     % (spoolModel.displayName, toolIndex)
@@ -340,7 +371,7 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
                     pass
             else:
                 self._logger.warning(
-                    "Selected Spool with id %d for tool %d not in database anymore. Maybe deleted in the meantime."
+                    "Selected Spool with id %s for tool %d not in database anymore. Maybe deleted in the meantime."
                     % (databaseId, toolIndex)
                 )
                 # remove spool from current toolIndex
@@ -367,6 +398,7 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             [SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS], databaseIds
         )
         self._settings.save()
+        self._selectedSpoolsCache.setSelection(databaseIds, spoolModel)
 
         # only check filament for the spool that was changed, as to not spam the user with warnings (for a specific toolIndex)
         if spoolModel is not None and toolIndex != -1:
@@ -391,7 +423,58 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
 
     @octoprint.plugin.BlueprintPlugin.route("/allowedToPrint", methods=["GET"])
     def allowed_to_print(self):
+        return flask.jsonify(self.getAllowedToPrintResult())
+
+    def _buildAllowedToPrintKey(self):
+        """
+        everything the allowedToPrint result depends on, None if it should not be cached
+        """
+        if self._printer.is_printing() or self._printer.is_paused():
+            # only the not printed part is required, depends on the file position
+            return None
+        jobFile = self._printer.get_current_data().get("job", {}).get("file", {})
+        printer_profile = self._printer_profile_manager.get_current_or_default()
+        return (
+            jobFile.get("origin"),
+            jobFile.get("path"),
+            jobFile.get("date"),
+            jobFile.get("size"),
+            printer_profile["extruder"]["count"],
+            tuple(
+                self._settings.get(
+                    [SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS]
+                )
+            ),
+            self._selectedSpoolsCache.getVersion(),
+            self._settingsVersion,
+        )
+
+    def getAllowedToPrintResult(self):
+        """
+        allowedToPrint result of the selected file, computed once per
+        (selected file, selected spools version, settings version)
+        """
+        with self._allowedToPrintLock:
+            allowedToPrintKey = self._buildAllowedToPrintKey()
+            if (
+                allowedToPrintKey != None
+                and self._allowedToPrintCache != None
+                and self._allowedToPrintCache[0] == allowedToPrintKey
+            ):
+                return self._allowedToPrintCache[1]
+
+            allowedToPrintResult = self._computeAllowedToPrintResult()
+            # the first load of the selected spools could change the version
+            allowedToPrintKey = self._buildAllowedToPrintKey()
+            if allowedToPrintKey != None:
+                self._allowedToPrintCache = (allowedToPrintKey, allowedToPrintResult)
+            return allowedToPrintResult
+
+    def invalidateAllowedToPrint(self):
+        with self._allowedToPrintLock:
+            self._allowedToPrintCache = None
 
+    def _computeAllowedToPrintResult(self):
         checkForSelectedSpool = self._settings.get_boolean(
             [SettingsKeys.SETTINGS_KEY_WARN_IF_SPOOL_NOT_SELECTED]
         )
@@ -402,7 +485,6 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             [SettingsKeys.SETTINGS_KEY_REMINDER_SELECTING_SPOOL]
         )
 
-        spoolModels = self.loadSelectedSpools()
         metaOrAttributesMissing = False
         result = {
             "noSpoolSelected": [],
@@ -410,14 +492,19 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             "reminderSpoolSelection": [],
         }
 
-        filamentLengthPresentInMeta = self._readingFilamentMetaData()
+        # all tools at once, the file selection already warned the user
+        snapshot = self._createRequiredWeightSnapshot()
+        spoolModels = snapshot.selectedSpools
+        requiredWeightResult = self._evaluateRequiredWeight(snapshot)
+        filamentLengthPresentInMeta = requiredWeightResult["metaDataMissing"] == False
+        # one item per tool of the file
+        detailedSpoolResults = requiredWeightResult["detailedSpoolResult"]
         printer_profile = self._printer_profile_manager.get_current_or_default()
         printerProfileToolCount = printer_profile["extruder"]["count"]
-        # for toolIndex, filamentLength in enumerate(self.metaDataFilamentLengths):
         for toolIndex in range(printerProfileToolCount):
             # we go over the filamentlength because those are what matters for this print
             if filamentLengthPresentInMeta:
-                if toolIndex >= len(self.metaDataFilamentLengths):
+                if toolIndex >= len(detailedSpoolResults):
                     # if this tool is not used (no filaLenght) in this print, everything is fine
                     continue
 
@@ -427,39 +514,39 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
 
             infoData = {
                 "toolIndex": toolIndex,
-                "spoolName": spoolModel.displayName
-                if spoolModel
-                else "(no spool selected)",
+                "spoolName": (
+                    spoolModel.displayName if spoolModel else "(no spool selected)"
+                ),
                 "material": spoolModel.material if spoolModel else "",
-                "remainingWeight": spoolModel.remainingWeight if spoolModel else "",
+                "remainingWeight": (
+                    spoolModel.remainingWeightInGram if spoolModel else ""
+                ),
                 "toolOffset": spoolModel.offsetTemperature if spoolModel else "",
                 "bedOffset": spoolModel.offsetBedTemperature if spoolModel else "",
-                "enclosureOffset": spoolModel.offsetEnclosureTemperature
-                if spoolModel
-                else "",
+                "enclosureOffset": (
+                    spoolModel.offsetEnclosureTemperature if spoolModel else ""
+                ),
             }
 
-            requiredWeightResult = self.checkRemainingFilament(toolIndex)
-            if (
-                requiredWeightResult["metaDataMissing"] == True
-                or requiredWeightResult["attributesMissing"] == True
+            detailedSpoolResult = (
+                detailedSpoolResults[toolIndex]
+                if toolIndex < len(detailedSpoolResults)
+                else None
+            )
+            if filamentLengthPresentInMeta == False or (
+                # weight of the selected spool not calculated
+                detailedSpoolResult["spoolSelected"] == True
+                and "requiredWeight" not in detailedSpoolResult
             ):
                 metaOrAttributesMissing = True
 
-            detailedSpoolResult = None
-            if (
-                "detailedSpoolResult" in requiredWeightResult
-                and len(requiredWeightResult["detailedSpoolResult"]) > 0
-            ):
-                detailedSpoolResult = requiredWeightResult["detailedSpoolResult"][0]
-
             if (
                 spoolModel is not None
                 and detailedSpoolResult is not None
                 and detailedSpoolResult["spoolSelected"] == True
             ):
                 if detailedSpoolResult["requiredLength"] > 0:
-                    if detailedSpoolResult["notEnough"] == True:
+                    if detailedSpoolResult.get("notEnough") == True:
                         # if not enough or needed amount could not calculated
                         result["filamentNotEnough"].append(infoData)
                     # add every spool for reminding, if more the 0gr is needed
@@ -479,22 +566,73 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             # no popup, because turned off by user
             result["reminderSpoolSelection"] = []
 
-        return flask.jsonify(
-            {
-                "result": result,
-                "metaOrAttributesMissing": metaOrAttributesMissing,
-                "toolOffsetEnabled": self._settings.get_boolean(
-                    [SettingsKeys.SETTINGS_KEY_TOOL_OFFSET_ENABLED]
-                ),
-                "bedOffsetEnabled": self._settings.get_boolean(
-                    [SettingsKeys.SETTINGS_KEY_BED_OFFSET_ENABLED]
-                ),
-                "enclosureOffsetEnabled": self._settings.get_boolean(
-                    [SettingsKeys.SETTINGS_KEY_ENCLOSURE_OFFSET_ENABLED]
-                ),
-            }
+        return {
+            "result": result,
+            "metaOrAttributesMissing": metaOrAttributesMissing,
+            "toolOffsetEnabled": self._settings.get_boolean(
+                [SettingsKeys.SETTINGS_KEY_TOOL_OFFSET_ENABLED]
+            ),
+            "bedOffsetEnabled": self._settings.get_boolean(
+                [SettingsKeys.SETTINGS_KEY_BED_OFFSET_ENABLED]
+            ),
+            "enclosureOffsetEnabled": self._settings.get_boolean(
+                [SettingsKeys.SETTINGS_KEY_ENCLOSURE_OFFSET_ENABLED]
+            ),
+        }
+
+    @octoprint.plugin.BlueprintPlugin.route(
+        "/analyseFilament/<string:origin>/<path:path>", methods=["GET"]
+    )
+    def analyseFilament(self, origin, path):
+        """
+        Extruded length per tool of a G-code file, the result is stored in the file metadata.
+        If not analysed yet, the analysis is started in the background: 202 and filamentLengths None,
+        ask again later
+        """
+        if origin != FileDestinations.LOCAL or not self._file_manager.file_exists(
+            origin, path
+        ):
+            abort(404)
+
+        metadata = self._file_manager.get_metadata(origin, path) or {}
+        filamentLengths = self._loadFilamentLengthsFromFileAnalysis(
+            origin, path, metadata
+        )
+        if filamentLengths is None:
+            return flask.make_response(flask.jsonify({"filamentLengths": None}), 202)
+
+        return flask.jsonify({"filamentLengths": filamentLengths})
+
+    @octoprint.plugin.BlueprintPlugin.route(
+        "/remainingFilament/<string:origin>/<path:path>", methods=["GET"]
+    )
+    def remainingFilament(self, origin, path):
+        """
+        Required length per tool from a file position (parameter filePos, default: current print position) to
+        the end of the file.
+        Without a checkpoint index, the index is built in the background: 202 and filamentLengths None,
+        ask again later
+        """
+        if origin != FileDestinations.LOCAL or not self._file_manager.file_exists(
+            origin, path
+        ):
+            abort(404)
+
+        filePos = request.args.get("filePos", None, type=int)
+        metadata = self._file_manager.get_metadata(origin, path) or {}
+        if self._loadCheckpointIndex(origin, path, metadata) is None:
+            self._startBackgroundFileTask(
+                path, self.buildCheckpointIndex, origin, path, metadata.get("hash")
+            )
+            return flask.make_response(
+                flask.jsonify({"filePos": filePos, "filamentLengths": None}), 202
+            )
+        remainingLengths = self._loadRemainingFilamentLengths(
+            origin, path, metadata, filePos
         )
 
+        return flask.jsonify({"filePos": filePos, "filamentLengths": remainingLengths})
+
     @octoprint.plugin.BlueprintPlugin.route("/startPrintConfirmed", methods=["GET"])
     def start_print_confirmed(self):
         spoolModels = self.loadSelectedSpools()
@@ -599,6 +737,66 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
         else:
             abort(404)
 
+    def _readQRCodeColors(self, requestParameters):
+        """
+        :return: (fillColor, backgroundColor) from the request or the settings
+        """
+        fillColor = None
+        backgroundColor = None
+        if "fillColor" in requestParameters and "backgroundColor" in requestParameters:
+            fillColor = requestParameters["fillColor"]
+            backgroundColor = requestParameters["backgroundColor"]
+        else:
+            fillColor = self._settings.get(
+                [SettingsKeys.SETTINGS_KEY_QR_CODE_FILL_COLOR]
+            )
+            backgroundColor = self._settings.get(
+                [SettingsKeys.SETTINGS_KEY_QR_CODE_BACKGROUND_COLOR]
+            )
+
+        # verify color codes
+        if fillColor.startswith("#"):
+            fillColor = ImageColor.getcolor(fillColor, "RGB")
+        if backgroundColor.startswith("#"):
+            backgroundColor = ImageColor.getcolor(backgroundColor, "RGB")
+        return (fillColor, backgroundColor)
+
+    def _buildSpoolSelectionUrl(self, databaseId, requestParameters):
+        """
+        url of the QR code, selects the spool
+        """
+        spoolSelectionUrl = None
+
+        useURLPrefix = None
+        qrCodeUrlPrefix = None
+        if "useURLPrefix" in requestParameters:
+            useURLPrefix = True
+            qrCodeUrlPrefix = requestParameters["urlPrefix"]
+
+        if useURLPrefix == None:
+            useURLPrefix = self._settings.get_boolean(
+                [SettingsKeys.SETTINGS_KEY_QR_CODE_USE_URL_PREFIX]
+            )
+
+        if useURLPrefix:
+            if qrCodeUrlPrefix == None:
+                qrCodeUrlPrefix = self._settings.get(
+                    [SettingsKeys.SETTINGS_KEY_QR_CODE_URL_PREFIX]
+                )
+
+            spoolSelectionUrl = (
+                qrCodeUrlPrefix
+                + "/plugin/SpoolManager/selectSpoolByQRCode/"
+                + str(databaseId)
+            )
+        else:
+            spoolSelectionUrl = flask.url_for(
+                "plugin.SpoolManager.selectSpoolByQRCode",
+                _external=True,
+                databaseId=databaseId,
+            )
+        return spoolSelectionUrl
+
     @octoprint.plugin.BlueprintPlugin.route(
         "/generateQRCode/<string:databaseId>", methods=["GET"]
     )
@@ -614,88 +812,192 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
 
             requestParameters = request.args
 
-            fillColor = None
-            backgroundColor = None
-            if (
-                "fillColor" in requestParameters
-                and "backgroundColor" in requestParameters
-            ):
-                fillColor = requestParameters["fillColor"]
-                backgroundColor = requestParameters["backgroundColor"]
-            else:
-                fillColor = self._settings.get(
-                    [SettingsKeys.SETTINGS_KEY_QR_CODE_FILL_COLOR]
-                )
-                backgroundColor = self._settings.get(
-                    [SettingsKeys.SETTINGS_KEY_QR_CODE_BACKGROUND_COLOR]
-                )
+            fillColor, backgroundColor = self._readQRCodeColors(requestParameters)
 
-            # verify color codes
-            if fillColor.startswith("#"):
-                fillColor = ImageColor.getcolor(fillColor, "RGB")
-            if backgroundColor.startswith("#"):
-                backgroundColor = ImageColor.getcolor(backgroundColor, "RGB")
-
-            imageFileLocation = self._basefolder + "/static/images/SPMByOlli.png"
-            olliImage = Image.open(imageFileLocation)  # .crop((175, 90, 235, 150))
-
-            # https://note.nkmk.me/en/python-pillow-qrcode/
-            qrMaker = qrcode.QRCode(
-                border=4, error_correction=qrcode.constants.ERROR_CORRECT_H
+            # optional: width/height in pixel and image format
+            size = None
+            if "size" in requestParameters:
+                try:
+                    size = int(requestParameters["size"])
+                except ValueError:
+                    abort(400)
+                if size < QR_CODE_MIN_SIZE or size > QR_CODE_MAX_SIZE:
+                    abort(400)
+            imageFormat = requestParameters.get("format", "jpeg").lower()
+            if imageFormat not in QR_CODE_FORMATS:
+                abort(400)
+
+            spoolSelectionUrl = self._buildSpoolSelectionUrl(
+                databaseId, requestParameters
             )
 
-            spoolSelectionUrl = None
-
-            useURLPrefix = None
-            qrCodeUrlPrefix = None
-            if "useURLPrefix" in requestParameters:
-                useURLPrefix = True
-                qrCodeUrlPrefix = requestParameters["urlPrefix"]
+            # the key of the cached image is also the ETag, a known image is not send again
+            qrCodeKey = self._qrCodeCache.buildKey(
+                spoolSelectionUrl, fillColor, backgroundColor, size, imageFormat
+            )
+            if qrCodeKey in request.if_none_match:
+                notModifiedResponse = Response(status=304)
+                notModifiedResponse.set_etag(qrCodeKey)
+                return notModifiedResponse
+
+            qrCodeImage = self._qrCodeCache.getImage(
+                qrCodeKey,
+                spoolSelectionUrl,
+                fillColor,
+                backgroundColor,
+                size,
+                imageFormat,
+            )
+            qrCodeResponse = Response(
+                qrCodeImage, mimetype=QR_CODE_FORMATS[imageFormat][1]
+            )
+            qrCodeResponse.set_etag(qrCodeKey)
+            # the colors/url prefix could be changed in the settings, so always revalidate
+            qrCodeResponse.headers["Cache-Control"] = "no-cache"
+            return qrCodeResponse
+        else:
+            abort(404)
 
-            if useURLPrefix == None:
-                useURLPrefix = self._settings.get_boolean(
-                    [SettingsKeys.SETTINGS_KEY_QR_CODE_USE_URL_PREFIX]
-                )
+    def _createLabelRenderExecutor(self):
+        # spawn instead of fork: OctoPrint runs many threads. Every worker imports the plugin, so only a few
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=min(LABEL_RENDER_MAX_WORKERS, multiprocessing.cpu_count()),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
 
-            if useURLPrefix:
-                if qrCodeUrlPrefix == None:
-                    qrCodeUrlPrefix = self._settings.get(
-                        [SettingsKeys.SETTINGS_KEY_QR_CODE_URL_PREFIX]
-                    )
+    def _loadLabelSheetSpools(self, requestParameters):
+        """
+        :return: spools of the "databaseIds" (in this order) or matching the table filter, None if neither is given
+        or too many "databaseIds". At most LABEL_SHEET_MAX_SPOOLS + 1 spools are loaded, enough to reject a too big sheet
+        """
+        if "databaseIds" in requestParameters:
+            try:
+                databaseIds = [
+                    int(databaseId)
+                    for databaseId in requestParameters["databaseIds"].split(",")
+                    if databaseId.strip() != ""
+                ]
+            except ValueError:
+                return None
+            databaseIds = list(dict.fromkeys(databaseIds))
+            if len(databaseIds) > LABEL_SHEET_MAX_SPOOLS:
+                return None
+            spoolModelsById = self._databaseManager.loadSpools(databaseIds)
+            if spoolModelsById == None:
+                return []
+            return [
+                spoolModelsById[databaseId]
+                for databaseId in databaseIds
+                if databaseId in spoolModelsById
+            ]
+        if "filterName" in requestParameters:
+            tableQuery = requestParameters.to_dict()
+            # limited in the query, not the whole inventory in memory
+            tableQuery["selectedPageSize"] = str(LABEL_SHEET_MAX_SPOOLS + 1)
+            tableQuery["from"] = 0
+            tableQuery["to"] = LABEL_SHEET_MAX_SPOOLS + 1
+            tableQuery.setdefault("sortColumn", "displayName")
+            tableQuery.setdefault("sortOrder", "asc")
+            spoolModels = self._databaseManager.loadAllSpoolsByQuery(tableQuery)
+            return [] if spoolModels == None else list(spoolModels)
+        return None
 
-                spoolSelectionUrl = (
-                    qrCodeUrlPrefix
-                    + "/plugin/SpoolManager/selectSpoolByQRCode/"
-                    + databaseId
-                )
-            else:
-                spoolSelectionUrl = flask.url_for(
-                    "plugin.SpoolManager.selectSpoolByQRCode",
-                    _external=True,
-                    databaseId=databaseId,
+    @octoprint.plugin.BlueprintPlugin.route("/generateQRCodeSheet", methods=["GET"])
+    def generateQRCodeSheet(self):
+        """
+        Labels (QR code and spool name) of many spools in one sheet.
+        Spools: "databaseIds" comma separated or the filter parameters of loadSpoolsByQuery.
+        Optional: format pdf (all pages) or png ("page", 0-based), pageSize a4/letter, columns, rows
+        and the QR code parameters (colors, url prefix)
+        """
+        requestParameters = request.args
+        sheetFormat = requestParameters.get("format", "pdf").lower()
+        pageSize = requestParameters.get("pageSize", "a4").lower()
+        if sheetFormat not in SHEET_FORMATS or pageSize not in PAGE_SIZES:
+            abort(400)
+        try:
+            columns = int(requestParameters.get("columns", LABEL_SHEET_COLUMNS))
+            rows = int(requestParameters.get("rows", LABEL_SHEET_ROWS))
+            pageIndex = int(requestParameters.get("page", 0))
+        except ValueError:
+            abort(400)
+        if columns < 1 or columns > 10 or rows < 1 or rows > 15:
+            abort(400)
+
+        spoolModels = self._loadLabelSheetSpools(requestParameters)
+        if spoolModels == None or len(spoolModels) > LABEL_SHEET_MAX_SPOOLS:
+            abort(400)
+        layout = LabelLayout(pageSize, columns, rows)
+        pageCount = layout.pageCount(len(spoolModels))
+        if pageIndex < 0 or pageIndex >= pageCount:
+            abort(404)
+        self._logger.info("API generate QR code sheet for %d spools" % len(spoolModels))
+        if sheetFormat == "png":
+            # only the labels of the requested page are rendered
+            labelsPerPage = layout.labelsPerPage()
+            spoolModels = spoolModels[
+                pageIndex * labelsPerPage : (pageIndex + 1) * labelsPerPage
+            ]
+            pageIndex = 0
+
+        # all QR codes in the size of the label, the missing ones are rendered in parallel
+        fillColor, backgroundColor = self._readQRCodeColors(requestParameters)
+        qrCodeRequests = [
+            (
+                self._buildSpoolSelectionUrl(spoolModel.databaseId, requestParameters),
+                fillColor,
+                backgroundColor,
+                layout.qrCodeSize,
+                "png",
+            )
+            for spoolModel in spoolModels
+        ]
+        if len(qrCodeRequests) > 1:
+            with self._labelRenderExecutor.batch() as labelRenderExecutor:
+                qrCodeImages = self._qrCodeCache.getImages(
+                    qrCodeRequests, labelRenderExecutor
                 )
-
-            qrMaker.add_data(spoolSelectionUrl)
-            qrMaker.make(
-                fit=True,
+        else:
+            qrCodeImages = self._qrCodeCache.getImages(qrCodeRequests)
+        labels = [
+            (
+                qrCodeImage,
+                "%s (%s)" % (spoolModel.displayName or "", spoolModel.databaseId),
             )
+            for qrCodeImage, spoolModel in zip(qrCodeImages, spoolModels)
+        ]
 
-            img_qr_big = qrMaker.make_image(
-                fill_color=fillColor, back_color=backgroundColor
-            ).convert("RGB")
-            pos = (
-                (img_qr_big.size[0] - olliImage.size[0]) // 2,
-                (img_qr_big.size[1] - olliImage.size[1]) // 2,
+        # in memory up to a limit, then in a temporary file
+        sheetFile = tempfile.SpooledTemporaryFile(max_size=LABEL_SHEET_IN_MEMORY_BYTES)
+        try:
+            writeLabelSheet(
+                buildLabelPages(labels, layout), sheetFormat, sheetFile, pageIndex
             )
-            img_qr_big.paste(olliImage, pos)
-
-            qr_io = BytesIO()
-            img_qr_big.save(qr_io, "JPEG", quality=100)
-            qr_io.seek(0)
-
-            return send_file(qr_io, mimetype="image/jpeg")
-        else:
-            abort(404)
+        except Exception:
+            sheetFile.close()
+            raise
+        sheetFile.seek(0)
+
+        def streamSheet():
+            try:
+                while True:
+                    sheetChunk = sheetFile.read(LABEL_SHEET_CHUNK_BYTES)
+                    if not sheetChunk:
+                        break
+                    yield sheetChunk
+            finally:
+                sheetFile.close()
+
+        currentDate = datetime.datetime.now().strftime("%Y%m%d-%H%M")
+        fileName = "SpoolManager-Labels-" + currentDate + "." + sheetFormat
+        return Response(
+            streamSheet(),
+            mimetype=SHEET_FORMATS[sheetFormat],
+            headers={
+                "Content-Disposition": "attachment; filename=" + fileName,
+                "X-Page-Count": str(pageCount),
+            },
+        )
 
     @octoprint.plugin.BlueprintPlugin.route(
         "/generateQRCodeView/<string:databaseId>", methods=["GET"]
@@ -778,8 +1080,12 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             # importStatus, currenLineNumber, backupFilePath,  successMessages, errorCollection
             sendCSVUploadStatusToClient("running", lineNumber, "", "", errorCollection)
 
+        # not a client message for each line
+        parsingProgress = ProgressThrottle(
+            updateParsingStatus, CSV_PROGRESS_EVERY_ROWS, CSV_PROGRESS_EVERY_MILLIS
+        )
         resultOfSpools = CSVExportImporter.parseCSV(
-            path, updateParsingStatus, errorCollection, logger
+            path, parsingProgress.update, errorCollection, logger
         )
 
         if len(errorCollection) != 0:
@@ -802,28 +1108,26 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             if SettingsKeys.KEY_IMPORTCSV_MODE_REPLACE == importCSVMode:
                 # delete old database and init a clean database
                 databaseManager.reCreateDatabase()
+                self._selectedSpoolsCache.invalidate()
                 # reset selected spool
                 self._resetSelectedSpools()
 
                 importModeText = "fully replaced"
 
-            # - insert all printjobs in database
-            currentSpoolNumber = 0
+            # - insert all spools in database, in batches and one transaction (remaining weight is calculated there)
             for spool in resultOfSpools:
-                currentSpoolNumber = currentSpoolNumber + 1
-                updateParsingStatus(currentSpoolNumber)
-
-                remainingWeight = Transformer.calculateRemainingWeight(
-                    spool.usedWeight, spool.totalWeightInGram
-                )
-                if remainingWeight != None:
-                    spool.remainingWeight = remainingWeight
-                    # spool.save()
-
                 spool.isActive = True
 
-                databaseManager.saveSpool(spool)
-            pass
+            importProgress = ProgressThrottle(
+                updateParsingStatus, CSV_PROGRESS_EVERY_ROWS, CSV_PROGRESS_EVERY_MILLIS
+            )
+            if (
+                databaseManager.importSpools(
+                    resultOfSpools, updateProgress=importProgress.update
+                )
+                == False
+            ):
+                errorCollection.append("Could not import the spools, nothing imported!")
         else:
             errorCollection.append("Nothing to import!")
 
@@ -891,6 +1195,7 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             databaseSettings = self._buildDatabaseSettingsFromJson(jsonData)
 
         self._databaseManager.reCreateDatabase(databaseSettings)
+        self._selectedSpoolsCache.invalidate()
 
         return flask.jsonify({"result": "success"})
 
@@ -928,14 +1233,23 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
     def exportSpoolsData(self, exportType):
 
         if exportType == "CSV":
-            allSpoolModels = self._databaseManager.loadAllSpoolsByQuery(None)
+            # streamed, the spools are loaded in chunks while the CSV is sent
+            allSpoolModels = self._databaseManager.iterateAllSpools()
+            # the first chunk is loaded before the response starts, so a not available database is answered
+            # with an error status. A later error aborts the stream (incomplete download, not a short CSV)
+            try:
+                firstSpoolModels = list(itertools.islice(allSpoolModels, 1))
+            except DatabaseError:
+                abort(500)
 
             now = datetime.datetime.now()
             currentDate = now.strftime("%Y%m%d-%H%M")
             fileName = "SpoolManager-" + currentDate + ".csv"
 
             return Response(
-                CSVExportImporter.transform2CSV(allSpoolModels),
+                CSVExportImporter.transform2CSV(
+                    itertools.chain(firstSpoolModels, allSpoolModels)
+                ),
                 mimetype="text/csv",
                 headers={"Content-Disposition": "attachment; filename=" + fileName},
             )
@@ -970,19 +1284,29 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
         self._logger.debug("API Load all spool")
         tableQuery = flask.request.values
 
-        allSpools = self._databaseManager.loadAllSpoolsByQuery(tableQuery)
-        totalItemCount = self._databaseManager.countSpoolsByQuery()
+        # cursor mode: "cursor" is empty for the first page, then the "nextCursor" of the previous response
+        nextCursor = None
+        if "cursor" in tableQuery:
+            allSpools, nextCursor = self._databaseManager.loadSpoolsByCursor(tableQuery)
+            totalItemCount = self._databaseManager.countSpoolsByQuery(
+                tableQuery, useCache=True
+            )
+        else:
+            # page and number of the spools matching the filters in one query
+            allSpools, totalItemCount = self._databaseManager.loadSpoolsPageWithCount(
+                tableQuery
+            )
 
         # allSpoolsAsDict = self._transformAllSpoolModelsToDict(allSpools)
         allSpoolsAsDict = Transformer.transformAllSpoolModelsToDict(allSpools)
 
         # load all catalogs: vendors, materials, labels, [colors]
-        vendors = list(self._databaseManager.loadCatalogVendors(tableQuery))
-        materials = list(self._databaseManager.loadCatalogMaterials(tableQuery))
-        labels = list(self._databaseManager.loadCatalogLabels(tableQuery))
-        colors = list(self._databaseManager.loadCatalogColors(tableQuery))
-
-        materials = self._addAdditionalMaterials(materials)
+        # not needed if the client already has the current version
+        catalogVersion, catalogs = self._databaseManager.loadCatalogs(
+            tableQuery.get("catalogVersion")
+        )
+        if catalogs != None:
+            catalogs["materials"] = self._addAdditionalMaterials(catalogs["materials"])
 
         tempateSpoolAsDict = None
         allTemplateSpools = self._databaseManager.loadSpoolTemplates()
@@ -990,12 +1314,6 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             allTemplateSpools
         )
 
-        catalogs = {
-            "vendors": vendors,
-            "materials": materials,
-            "colors": colors,
-            "labels": labels,
-        }
         selectedSpoolsAsDicts = [
             (
                 None
@@ -1009,8 +1327,10 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             {
                 "templateSpools": allTemplateSpoolsAsDict,
                 "catalogs": catalogs,
+                "catalogVersion": catalogVersion,
                 "totalItemCount": totalItemCount,
                 "allSpools": allSpoolsAsDict,
+                "nextCursor": nextCursor,
                 "selectedSpools": selectedSpoolsAsDicts,
             }
         )
@@ -1071,6 +1391,9 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
             spoolModel, withReusedConnection=True
         )
         self._databaseManager.closeDatabase()
+        if newDatabaseId != None:
+            self._selectedSpoolsCache.updateSpool(spoolModel)
+            self.invalidateAllowedToPrint()
 
         if databaseId == None:
             # New spool was created
@@ -1095,6 +1418,8 @@ class SpoolManagerAPI(octoprint.plugin.BlueprintPlugin):
         self._logger.info("API Delete spool with database id '" + str(databaseId) + "'")
         databaseId = self._databaseManager.deleteSpool(databaseId)
         if databaseId != None:
+            self._selectedSpoolsCache.removeSpool(databaseId)
+            self.invalidateAllowedToPrint()
             eventPayload = {"databaseId": databaseId}
             self._sendPayload2EventBus(
                 EventBusKeys.EVENT_BUS_SPOOL_DELETED, eventPayload
@@ -9,6 +9,9 @@ from io import StringIO
 from octoprint_SpoolManager.common import StringUtils
 from octoprint_SpoolManager.models.SpoolModel import SpoolModel
 
+# spool rows per yielded part of the CSV export
+EXPORT_ROWS_PER_CHUNK = 100
+
 FORMAT_DATETIME = "%d.%m.%Y %H:%M"
 FORMAT_DATE = "%d.%m.%Y"
 
@@ -357,41 +360,41 @@ ALL_COLUMNS = {
 }
 
 
-def transform2CSV(allJobs):
-    result = None
-    si = (
-        StringIO()
-    )  # TODO maybe a bad idea to use a internal memory based string, needs to be switched to response stream
+def transform2CSV(allSpools, rowsPerChunk=EXPORT_ROWS_PER_CHUNK):
+    """
+    Streams the CSV: the header is yielded immediately, then the rows in chunks of rowsPerChunk.
+    allSpools could be any iterable (e.g. a generator over the database), it is consumed row by row.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n")
+
+    def takeBuffer():
+        csvText = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return csvText
 
-    writer = csv.writer(si, quoting=csv.QUOTE_ALL)
     #  Write HEADER
-    headerList = list()
-    csvLine = ""
-    for columnKey in ALL_COLUMNS_SORTED:
-        csvColumn = ALL_COLUMNS[columnKey]
-        label = '"' + csvColumn.columnLabel + '"'
-        headerList.append(label)
-
-    csvLine = ",".join(headerList) + "\n"
-    # writer.writerow(headerList)
-    # print(csvLine)
-    yield csvLine
+    writer.writerow(
+        [ALL_COLUMNS[columnKey].columnLabel for columnKey in ALL_COLUMNS_SORTED]
+    )
+    yield takeBuffer()
 
     # Write CSV-Content
-    if allJobs != None:
-        for job in allJobs:
-            csvRow = list()
-            for columnKey in ALL_COLUMNS_SORTED:
-                # print(columnKey)
-                csvColumn = ALL_COLUMNS[columnKey]
-                csvColumnValue = '"' + csvColumn.getCSV(job) + '"'
-                csvRow.append(csvColumnValue)
-            csvLine = ",".join(csvRow) + "\n"
-            # print(csvLine)
-            yield csvLine
-            # writer.writerow(csvRow)
-    # result = si.getvalue()
-    # return result
+    if allSpools != None:
+        rowCount = 0
+        for spoolModel in allSpools:
+            writer.writerow(
+                [
+                    ALL_COLUMNS[columnKey].getCSV(spoolModel)
+                    for columnKey in ALL_COLUMNS_SORTED
+                ]
+            )
+            rowCount += 1
+            if rowCount % rowsPerChunk == 0:
+                yield takeBuffer()
+        if buffer.tell() > 0:
+            yield takeBuffer()
 
 
 ########################################################################################################## -> IMPORT CSV
@@ -0,0 +1,115 @@
+# coding=utf-8
+import math
+
+# Only these commands could change the extrusion state of the FilamentOdometer
+ODOMETER_G_CODES = frozenset((0, 1, 2, 3, 90, 91, 92))
+ODOMETER_M_CODES = frozenset((82, 83, 605))
+
+# Same commands, but in the notation of the "gcode" argument of OctoPrint's gcode-hooks (T0, T1,.. are passed as "T")
+ODOMETER_GCODE_COMMANDS = frozenset(
+    (
+        "G0",
+        "G1",
+        "G2",
+        "G3",
+        "G00",
+        "G01",
+        "G02",
+        "G03",
+        "G90",
+        "G91",
+        "G92",
+        "M82",
+        "M83",
+        "M605",
+        "T",
+    )
+)
+
+
+def isOdometerGCodeCommand(gcode):
+    """
+    Prefilter for the "gcode" argument of OctoPrint's gcode-hooks, that is passed as written, so zero-padded
+    commands (G092, M082) are normalized like in tokenizeOdometerLine.
+    """
+    if gcode in ODOMETER_GCODE_COMMANDS:
+        return True
+    if gcode is None or len(gcode) < 3 or gcode[1] != "0":
+        return False
+    try:
+        code = int(gcode[1:])
+    except ValueError:
+        return False
+    letter = gcode[0]
+    if letter == "G":
+        return code in ODOMETER_G_CODES
+    if letter == "M":
+        return code in ODOMETER_M_CODES
+    return False
+
+
+def tokenizeOdometerLine(line):
+    """
+    Parse a single G-code line in one pass.
+
+    Returns a tuple (letter, code, parameters) e.g. ("G", 1, {"X": "10", "E": "1.5"}) or None if the
+    command could not influence the extrusion (M105, M117, comments,...).
+    The parameter values are not converted, use parseFloat/parseInt only for the needed ones.
+    If a parameter letter is present multiple times, the first occurrence wins.
+    """
+    commentPos = line.find(";")
+    if commentPos >= 0:
+        line = line[:commentPos]
+
+    words = line.split()
+    if not words:
+        return None
+
+    command = words[0]
+    letter = command[0]
+    if letter == "N" and len(words) > 1:
+        # skip line number
+        words = words[1:]
+        command = words[0]
+        letter = command[0]
+
+    if letter != "G" and letter != "M" and letter != "T":
+        return None
+    try:
+        code = int(command[1:])
+    except ValueError:
+        return None
+    if letter == "G":
+        if code not in ODOMETER_G_CODES:
+            return None
+    elif letter == "M":
+        if code not in ODOMETER_M_CODES:
+            return None
+
+    parameters = {}
+    for word in words[1:]:
+        key = word[0]
+        if key not in parameters:
+            parameters[key] = word[1:]
+    return (letter, code, parameters)
+
+
+def parseFloat(value):
+    if value is None:
+        return None
+    try:
+        result = float(value)
+    except ValueError:
+        return None
+    if not math.isfinite(result):
+        return None
+    return result
+
+
+def parseInt(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
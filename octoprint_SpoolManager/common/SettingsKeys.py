@@ -39,11 +39,23 @@ class SettingsKeys:
     SETTINGS_KEY_DATABASE_NAME = "databaseName"
     SETTINGS_KEY_DATABASE_USER = "databaseUser"
     SETTINGS_KEY_DATABASE_PASSWORD = "databasePassword"
+    SETTINGS_KEY_DATABASE_POOL_ENABLED = "databasePoolEnabled"
+    SETTINGS_KEY_DATABASE_POOL_SIZE = "databasePoolSize"
+    SETTINGS_KEY_DATABASE_POOL_IDLE_TIMEOUT = "databasePoolIdleTimeout"
 
     SETTINGS_KEY_TOOL_OFFSET_ENABLED = "toolOffsetEnabled"
     SETTINGS_KEY_BED_OFFSET_ENABLED = "bedOffsetEnabled"
     SETTINGS_KEY_ENCLOSURE_OFFSET_ENABLED = "enclosureOffsetEnabled"
 
+    ## Odometer
+    SETTINGS_KEY_ASYNC_ODOMETER_ENABLED = "asyncOdometerEnabled"
+    SETTINGS_KEY_ASYNC_ODOMETER_QUEUE_SIZE = "asyncOdometerQueueSize"
+    SETTINGS_KEY_CHECKPOINT_INDEX_INTERVAL_KB = "checkpointIndexIntervalKB"
+    SETTINGS_KEY_ODOMETER_CHECKPOINT_INTERVAL = "odometerCheckpointInterval"
+    SETTINGS_KEY_INCREMENTAL_COMMIT_ENABLED = "incrementalCommitEnabled"
+    SETTINGS_KEY_INCREMENTAL_COMMIT_INTERVAL = "incrementalCommitInterval"
+
     ## Debugging
     SETTINGS_KEY_SQL_LOGGING_ENABLED = "sqlLoggingEnabled"
     SETTINGS_KEY_EXTRUSION_DEBUGGING_ENABLED = "extrusionDebuggingEnabled"
+    SETTINGS_KEY_EXTRUSION_NOTIFICATIONS_PER_SECOND = "extrusionNotificationsPerSecond"
@@ -10,6 +10,10 @@ class DatabaseSettings:
     port = 0
     user = ""
     password = ""
+    # Connection pool
+    poolEnabled = False
+    poolSize = 5
+    poolIdleTimeout = 300  # seconds
 
     def __str__(self):
         return str(self.__dict__)
@@ -0,0 +1,90 @@
+# coding=utf-8
+import concurrent.futures
+import logging
+import threading
+import time
+
+
+class DebouncedTask:
+    """
+    Runs a task in a worker thread, delaySeconds after the last trigger (trailing debounce): all triggers until then
+    share this one run, later triggers schedule the next run. Runs never overlap.
+    With maxWaitSeconds, continuous triggers can't postpone the run for longer than that. A trigger that was less
+    than delaySeconds before such a run, gets an additional run delaySeconds after it.
+    """
+
+    def __init__(self, task, delaySeconds, name="DebouncedTask", maxWaitSeconds=None):
+        self._logger = logging.getLogger(__name__)
+        self._task = task
+        self._delaySeconds = delaySeconds
+        self._maxWaitSeconds = maxWaitSeconds
+        self._name = name
+        self._lock = threading.Lock()
+        self._timer = None
+        # identifies the current timer, a cancelled timer could already wait for the lock
+        self._timerToken = 0
+        self._firstTriggerTime = None
+        self._lastTriggerTime = None
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=name
+        )
+
+    def trigger(self):
+        """
+        :return: True if a new run was scheduled, False if the trigger joined the scheduled run
+        """
+        with self._lock:
+            now = time.monotonic()
+            newRun = self._timer == None
+            if newRun:
+                self._firstTriggerTime = now
+            self._lastTriggerTime = now
+            runTime = now + self._delaySeconds
+            if self._maxWaitSeconds != None:
+                runTime = min(runTime, self._firstTriggerTime + self._maxWaitSeconds)
+            self._startTimer(runTime - now)
+            return newRun
+
+    def shutdown(self):
+        with self._lock:
+            self._cancelTimer()
+        self._executor.shutdown(wait=False)
+
+    def _startTimer(self, delaySeconds):
+        self._cancelTimer()
+        self._timer = threading.Timer(
+            max(0.0, delaySeconds), self._submit, args=(self._timerToken,)
+        )
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancelTimer(self):
+        self._timerToken += 1
+        if self._timer != None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _submit(self, timerToken):
+        with self._lock:
+            if timerToken != self._timerToken:
+                # restarted or cancelled in the meantime
+                return
+            self._timer = None
+            try:
+                self._executor.submit(self._run)
+            except RuntimeError:
+                # already shut down
+                return
+            remainingDelay = (
+                self._lastTriggerTime + self._delaySeconds - time.monotonic()
+            )
+            if remainingDelay > 0:
+                # run forced by maxWaitSeconds, the last trigger needs its own run
+                self._firstTriggerTime = time.monotonic()
+                self._startTimer(remainingDelay)
+
+    def _run(self):
+        try:
+            self._task()
+        except Exception:
+            self._logger.exception("Task '%s' failed" % self._name)
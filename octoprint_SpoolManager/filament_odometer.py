@@ -1,5 +1,101 @@
 # coding=utf-8
-import math
+import logging
+import threading
+from array import array
+
+from octoprint_SpoolManager.common import GCodeTokenizer
+
+
+class ExtrusionChangedNotifier:
+    """
+    Coalesces the extrusion changes of the odometer and passes only the latest values to the listener,
+    at most maxUpdatesPerSecond times (thread: own timer thread).
+    notify() is called by the sending thread and only marks the values as changed, it never waits for the listener.
+    The values are read with valuesProvider when they are passed to the listener.
+    """
+
+    def __init__(self, listener, maxUpdatesPerSecond, valuesProvider):
+        self._logger = logging.getLogger(__name__)
+        self._listener = listener
+        self._valuesProvider = valuesProvider
+        self._interval = 1.0 / maxUpdatesPerSecond
+        self._changed = False
+        self._emitLock = threading.Lock()
+        self._stopEvent = threading.Event()
+
+    def start(self):
+        thread = threading.Thread(
+            target=self._run, name="SpoolManager.ExtrusionChangedNotifier"
+        )
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._stopEvent.set()
+
+    def notify(self):
+        self._changed = True
+
+    def flush(self):
+        """
+        pass the current values immediately to the listener
+        """
+        self._changed = True
+        self._emitPending()
+
+    def _run(self):
+        while not self._stopEvent.wait(self._interval):
+            self._emitPending()
+
+    def _emitPending(self):
+        with self._emitLock:
+            if self._changed == False:
+                return
+            self._changed = False
+            try:
+                self._listener(self._valuesProvider())
+            except Exception:
+                self._logger.exception("Extrusion changed listener failed")
+
+
+class ExtrusionState:
+    """
+    Per tool extrusion values (mm) of the odometer.
+    The arrays are preallocated for 'capacity' tools, only the first 'toolCount' tools are used by the print.
+    committedExtrusion is the part of maxExtrusion that is already stored in the database.
+    """
+
+    __slots__ = (
+        "capacity",
+        "toolCount",
+        "currentE",
+        "totalExtrusion",
+        "maxExtrusion",
+        "committedExtrusion",
+    )
+
+    def __init__(self, capacity=1):
+        self.capacity = max(1, capacity)
+        self.toolCount = 1
+        self.currentE = array("d", [0.0]) * self.capacity
+        self.totalExtrusion = array("d", [0.0]) * self.capacity
+        self.maxExtrusion = array("d", [0.0]) * self.capacity
+        self.committedExtrusion = array("d", [0.0]) * self.capacity
+
+    def useTools(self, toolCount):
+        if toolCount > self.capacity:
+            # more tools used than expected by the printer profile
+            missing = array("d", [0.0]) * (toolCount - self.capacity)
+            self.currentE.extend(missing)
+            self.totalExtrusion.extend(missing)
+            self.maxExtrusion.extend(missing)
+            self.committedExtrusion.extend(missing)
+            self.capacity = toolCount
+        if toolCount > self.toolCount:
+            self.toolCount = toolCount
+
+    def getMaxExtrusion(self):
+        return self.maxExtrusion[: self.toolCount].tolist()
 
 
 class FilamentOdometer:
@@ -7,25 +103,60 @@ class FilamentOdometer:
     copied from gcodeinterpreter.py Version OP 1.5.2
     """
 
+    __slots__ = (
+        "extrusionChangedListener",
+        "extrusionChangedNotifier",
+        "max_extruders",
+        "extruder_count",
+        "g90_extruder",
+        "extrusionState",
+        "currentExtruder",
+        "relativeE",
+        "relativeMode",
+        "duplicationMode",
+    )
+
     def __init__(self, extrusionChangedListener=None):
         self.extrusionChangedListener = extrusionChangedListener
+        self.extrusionChangedNotifier = None
+        self.extruder_count = 1
         self._set_default_extusion_values()
 
-    def set_extrusion_changed_listener(self, extrusion_changed_listener):
+    def set_extrusion_changed_listener(
+        self, extrusion_changed_listener, max_updates_per_second=0
+    ):
+        """
+        max_updates_per_second > 0: the changes are coalesced and the listener is called from a timer thread,
+        otherwise the listener is called directly for each extruding move
+        """
+        if self.extrusionChangedNotifier is not None:
+            self.extrusionChangedNotifier.stop()
+            self.extrusionChangedNotifier = None
         self.extrusionChangedListener = extrusion_changed_listener
+        if extrusion_changed_listener is not None and max_updates_per_second > 0:
+            self.extrusionChangedNotifier = ExtrusionChangedNotifier(
+                extrusion_changed_listener,
+                max_updates_per_second,
+                self.getExtrusionAmount,
+            )
+            self.extrusionChangedNotifier.start()
 
     def set_g90_extruder(self, flag=False):
         self.g90_extruder = flag
 
+    def set_extruder_count(self, count):
+        """
+        extruder count of the printer profile, used to preallocate the extrusion state on the next reset
+        """
+        self.extruder_count = min(max(1, count), self.max_extruders + 1)
+
     def reset(self):
-        self.currentE = [0.0]
-        self.totalExtrusion = [0.0]
-        self.maxExtrusion = [0.0]
+        self.extrusionState = ExtrusionState(self.extruder_count)
         self.currentExtruder = 0  # Tool Id
         self.relativeE = False
         self.relativeMode = False
         self.duplicationMode = False
-        self._fireExtrusionChangedEvent()
+        self.flush_extrusion_changed_event()
 
     def _set_default_extusion_values(self):
         self.max_extruders = 10
@@ -37,124 +168,55 @@ class FilamentOdometer:
         reset only the extruded ammount,
         the other values like relative/absolute mode must be untouched
         """
-        for toolIndex in range(len(self.maxExtrusion)):
-            self.maxExtrusion[toolIndex] = 0.0
-            self.totalExtrusion[toolIndex] = 0.0
+        state = self.extrusionState
+        for toolIndex in range(state.toolCount):
+            state.maxExtrusion[toolIndex] = 0.0
+            state.totalExtrusion[toolIndex] = 0.0
+            state.committedExtrusion[toolIndex] = 0.0
         # yes, it it changed, but the UI should present last used value self._fireExtrusionChangedEvent()
 
     def processGCodeLine(self, line):
-        # comment should not be during "hook-processing"
-        if ";" in line:
-            # comment = line[line.find(";") + 1:].strip()
-            line = line[0 : line.find(";")]
-            pass
-
-        if len(line) == 0:
+        token = GCodeTokenizer.tokenizeOdometerLine(line)
+        if token is None:
             return
-        G = self._getCodeInt(line, "G")
-        M = self._getCodeInt(line, "M")
-        T = self._getCodeInt(line, "T")
-
-        if G is not None:
-            if G >= 0 and G <= 3:  # Move (linear G0/G1 or G2/G3)
-                x = self._getCodeFloat(line, "X")
-                y = self._getCodeFloat(line, "Y")
-                z = self._getCodeFloat(line, "Z")
-                e = self._getCodeFloat(line, "E")
-                f = self._getCodeFloat(line, "F")
-
-                if x is not None or y is not None or z is not None:
-                    # this is a move
-                    move = True
-                else:
-                    # print head stays on position
-                    move = False
+        letter, code, parameters = token
 
+        if letter == "G":
+            if code <= 3:  # Move (linear G0/G1 or G2/G3)
+                e = GCodeTokenizer.parseFloat(parameters.get("E"))
                 if e is not None:
-                    if self.relativeMode or self.relativeE:
-                        # e is already relative, nothing to do
-                        pass
-                    else:
-                        e -= self.currentE[self.currentExtruder]
-
-                    # # If move with extrusion, calculate new min/max coordinates of model
-                    # if e > 0.0 and move:
-                    #     # extrusion and move -> oldPos & pos relevant for print area & dimensions
-                    #     self._minMax.record(oldPos)
-                    #     self._minMax.record(pos)
-
-                    self.totalExtrusion[self.currentExtruder] += e
-                    self.currentE[self.currentExtruder] += e
-                    self.maxExtrusion[self.currentExtruder] = max(
-                        self.maxExtrusion[self.currentExtruder],
-                        self.totalExtrusion[self.currentExtruder],
-                    )
-
-                    if (
-                        self.currentExtruder == 0
-                        and len(self.currentE) > 1
-                        and self.duplicationMode
-                    ):
-                        # Copy first extruder length to other extruders
-                        for i in range(1, len(self.currentE)):
-                            self.totalExtrusion[i] += e
-                            self.currentE[i] += e
-                            self.maxExtrusion[i] = max(
-                                self.maxExtrusion[i], self.totalExtrusion[i]
-                            )
-                    self._fireExtrusionChangedEvent()
-                else:
-                    e = 0.0
+                    self.processExtrusion(e)
 
-            elif G == 90:  # Absolute position
+            elif code == 90:  # Absolute position
                 self.relativeMode = False
                 if self.g90_extruder:
                     self.relativeE = False
 
-            elif G == 91:  # Relative position
+            elif code == 91:  # Relative position
                 self.relativeMode = True
                 if self.g90_extruder:
                     self.relativeE = True
 
-            elif G == 92:
-                x = self._getCodeFloat(line, "X")
-                y = self._getCodeFloat(line, "Y")
-                z = self._getCodeFloat(line, "Z")
-                e = self._getCodeFloat(line, "E")
-
-                if e is None and x is None and y is None and z is None:
-                    # no parameters, set all axis to 0
-                    self.currentE[self.currentExtruder] = 0.0
-                    # pos.x = 0.0
-                    # pos.y = 0.0
-                    # pos.z = 0.0
-                else:
+            elif code == 92:
+                e = GCodeTokenizer.parseFloat(parameters.get("E"))
+                if e is not None:
                     # some parameters set, only set provided axes
-                    if e is not None:
-                        self.currentE[self.currentExtruder] = e
-                    # if x is not None:
-                    #     pos.x = x
-                    # if y is not None:
-                    #     pos.y = y
-                    # if z is not None:
-                    #     pos.z = z
-
-        elif M is not None:
-            if M == 82:  # Absolute E
+                    self.extrusionState.currentE[self.currentExtruder] = e
+                elif (
+                    GCodeTokenizer.parseFloat(parameters.get("X")) is None
+                    and GCodeTokenizer.parseFloat(parameters.get("Y")) is None
+                    and GCodeTokenizer.parseFloat(parameters.get("Z")) is None
+                ):
+                    # no parameters, set all axis to 0
+                    self.extrusionState.currentE[self.currentExtruder] = 0.0
+
+        elif letter == "M":
+            if code == 82:  # Absolute E
                 self.relativeE = False
-            elif M == 83:  # Relative E
+            elif code == 83:  # Relative E
                 self.relativeE = True
-            # elif M == 207 or M == 208:  # Firmware retract settings
-            #     s = self._getCodeFloat(line, "S")
-            #     f = self._getCodeFloat(line, "F")
-            #     if s is not None and f is not None:
-            #         if M == 207:
-            #             fwretractTime = s / f
-            #             fwretractDist = s
-            #         else:
-            #             fwrecoverTime = (fwretractDist + s) / f
-            elif M == 605:  # Duplication/Mirroring mode
-                s = self._getCodeInt(line, "S")
+            elif code == 605:  # Duplication/Mirroring mode
+                s = GCodeTokenizer.parseInt(parameters.get("S"))
                 if s in [2, 4, 5, 6]:
                     # Duplication / Mirroring mode selected. Printer firmware copies extrusion commands
                     # from first extruder to all other extruders
@@ -162,12 +224,9 @@ class FilamentOdometer:
                 else:
                     self.duplicationMode = False
 
-        elif T is not None:
+        else:
+            T = code
             if T > self.max_extruders:
-                # self._logger.warning(
-                #     "GCODE tried to select tool %d, that looks wrong, ignoring for GCODE analysis"
-                #     % T
-                # )
                 print(
                     "GCODE tried to select tool %d, that looks wrong, ignoring for GCODE analysis"
                     % T
@@ -176,70 +235,105 @@ class FilamentOdometer:
             elif T == self.currentExtruder:
                 pass
             else:
-                # pos.x -= (
-                #     offsets[currentExtruder][0]
-                #     if currentExtruder < len(offsets)
-                #     else 0
-                # )
-                # pos.y -= (
-                #     offsets[currentExtruder][1]
-                #     if currentExtruder < len(offsets)
-                #     else 0
-                # )
-
                 self.currentExtruder = T
+                self.extrusionState.useTools(T + 1)
 
-                # pos.x += (
-                #     offsets[currentExtruder][0]
-                #     if currentExtruder < len(offsets)
-                #     else 0
-                # )
-                # pos.y += (
-                #     offsets[currentExtruder][1]
-                #     if currentExtruder < len(offsets)
-                #     else 0
-                # )
-
-                if len(self.currentE) <= self.currentExtruder:
-                    for _ in range(len(self.currentE), self.currentExtruder + 1):
-                        self.currentE.append(0.0)
-                if len(self.maxExtrusion) <= self.currentExtruder:
-                    for _ in range(len(self.maxExtrusion), self.currentExtruder + 1):
-                        self.maxExtrusion.append(0.0)
-                if len(self.totalExtrusion) <= self.currentExtruder:
-                    for _ in range(len(self.totalExtrusion), self.currentExtruder + 1):
-                        self.totalExtrusion.append(0.0)
+    def processExtrusion(self, e):
+        """
+        E value of a move (G0-G3) in the current absolute/relative mode
+        """
+        state = self.extrusionState
+        tool = self.currentExtruder
+        currentE = state.currentE
+        totalExtrusion = state.totalExtrusion
+        maxExtrusion = state.maxExtrusion
+
+        if self.relativeMode or self.relativeE:
+            # e is already relative, nothing to do
+            pass
+        else:
+            e -= currentE[tool]
+
+        currentE[tool] += e
+        total = totalExtrusion[tool] + e
+        totalExtrusion[tool] = total
+        if total > maxExtrusion[tool]:
+            maxExtrusion[tool] = total
+
+        if tool == 0 and self.duplicationMode:
+            # Copy first extruder length to other extruders
+            for i in range(1, state.toolCount):
+                currentE[i] += e
+                total = totalExtrusion[i] + e
+                totalExtrusion[i] = total
+                if total > maxExtrusion[i]:
+                    maxExtrusion[i] = total
+        self._fireExtrusionChangedEvent()
+
+    def getState(self):
+        """
+        snapshot of the complete odometer state (json serializable), see setState
+        """
+        state = self.extrusionState
+        toolCount = state.toolCount
+        return {
+            "currentE": state.currentE[:toolCount].tolist(),
+            "totalExtrusion": state.totalExtrusion[:toolCount].tolist(),
+            "maxExtrusion": state.maxExtrusion[:toolCount].tolist(),
+            "committedExtrusion": state.committedExtrusion[:toolCount].tolist(),
+            "currentExtruder": self.currentExtruder,
+            "relativeE": self.relativeE,
+            "relativeMode": self.relativeMode,
+            "duplicationMode": self.duplicationMode,
+        }
+
+    def setState(self, state):
+        toolCount = len(state["maxExtrusion"])
+        extrusionState = ExtrusionState(max(self.extruder_count, toolCount))
+        extrusionState.useTools(toolCount)
+        extrusionState.currentE[:toolCount] = array("d", state["currentE"])
+        extrusionState.totalExtrusion[:toolCount] = array("d", state["totalExtrusion"])
+        extrusionState.maxExtrusion[:toolCount] = array("d", state["maxExtrusion"])
+        if "committedExtrusion" in state:
+            extrusionState.committedExtrusion[:toolCount] = array(
+                "d", state["committedExtrusion"]
+            )
+        self.extrusionState = extrusionState
+        self.currentExtruder = state["currentExtruder"]
+        self.relativeE = state["relativeE"]
+        self.relativeMode = state["relativeMode"]
+        self.duplicationMode = state["duplicationMode"]
 
     def getCurrentTool(self):
         return self.currentExtruder
 
     def getExtrusionAmount(self):
-        return self.maxExtrusion
-
-    def _fireExtrusionChangedEvent(self):
-        if self.extrusionChangedListener != None:
-            self.extrusionChangedListener(self.getExtrusionAmount())
-
-    def _getCodeInt(self, line, code):
-        return self._getCode(line, code, int)
+        return self.extrusionState.getMaxExtrusion()
 
-    def _getCodeFloat(self, line, code):
-        return self._getCode(line, code, float)
+    def getCommittedExtrusion(self):
+        state = self.extrusionState
+        return state.committedExtrusion[: state.toolCount].tolist()
 
-    def _getCode(self, line, code, c):
-        n = line.find(code) + 1
-        if n < 1:
-            return None
-        m = line.find(" ", n)
-        try:
-            if m < 0:
-                result = c(line[n:])
-            else:
-                result = c(line[n:m])
-        except ValueError:
-            return None
+    def setCommittedExtrusion(self, extrusionValues):
+        """
+        watermark for incremental commits: the provided extrusion (e.g. a former getExtrusionAmount()) is stored,
+        so only the part above it must be committed the next time
+        """
+        committedExtrusion = self.extrusionState.committedExtrusion
+        for toolIndex, extrusion in enumerate(extrusionValues):
+            committedExtrusion[toolIndex] = extrusion
 
-        if math.isnan(result) or math.isinf(result):
-            return None
+    def flush_extrusion_changed_event(self):
+        """
+        inform the listener about the current values without waiting for the next notification interval
+        """
+        if self.extrusionChangedNotifier is not None:
+            self.extrusionChangedNotifier.flush()
+        else:
+            self._fireExtrusionChangedEvent()
 
-        return result
+    def _fireExtrusionChangedEvent(self):
+        if self.extrusionChangedNotifier is not None:
+            self.extrusionChangedNotifier.notify()
+        elif self.extrusionChangedListener != None:
+            self.extrusionChangedListener(self.getExtrusionAmount())
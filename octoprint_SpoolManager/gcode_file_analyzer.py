@@ -0,0 +1,173 @@
+# coding=utf-8
+import bisect
+import mmap
+import os
+import re
+
+from octoprint_SpoolManager.common import GCodeTokenizer
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# sparse checkpoint index: one odometer snapshot every N bytes
+DEFAULT_CHECKPOINT_INTERVAL = 1024 * 1024
+
+# additional file metadata, where the analysis result/checkpoint index is stored
+FILE_METADATA_KEY = "spoolmanager_filament_analysis"
+CHECKPOINT_INDEX_METADATA_KEY = "spoolmanager_checkpoint_index"
+
+# Matches only lines that could change the odometer state, all other lines (comments, travel moves, temperatures,...)
+# are skipped by the regex engine without creating python objects for them.
+# group 1: E value of an extruding move (G0-G3), first E word of the line
+# group 2: G90-G92, M82/M83, M605 (also zero-padded) or tool change, passed to FilamentOdometer.processGCodeLine
+_ODOMETER_LINE_PATTERN = re.compile(
+    rb"^[ \t]*(?:N\d+[ \t]+)?(?:"
+    rb"G0*[0-3](?=[ \t])[^;\n]*?[ \t]E([^ \t;\r\n]*)"
+    rb"|((?:G0*9[0-2]|M0*8[23]|M0*605)(?![\d.])[^\n]*|T\d[^\n]*)"
+    rb")",
+    re.MULTILINE,
+)
+
+
+def analyseGCodeFile(
+    filePath, g90InfluencesExtruder=False, chunkSize=DEFAULT_CHUNK_SIZE
+):
+    """
+    Runs the FilamentOdometer over a whole G-code file.
+    The file is read in chunks and each chunk is filtered/parsed with a single regex pass, so the memory usage is
+    bounded by the chunk size, regardless of the file size.
+
+    :return: list of the extruded length in mm per tool, same as FilamentOdometer.getExtrusionAmount()
+    """
+    filamentOdometer = _createOdometer(g90InfluencesExtruder)
+
+    remainder = b""
+    with open(filePath, "rb") as gcodeFile:
+        while True:
+            chunk = gcodeFile.read(chunkSize)
+            if not chunk:
+                break
+            chunk = remainder + chunk
+            lastLineEnd = chunk.rfind(b"\n")
+            if lastLineEnd < 0:
+                remainder = chunk
+                continue
+            remainder = chunk[lastLineEnd + 1 :]
+            _processChunk(filamentOdometer, chunk, 0, lastLineEnd + 1)
+
+    if remainder:
+        _processChunk(filamentOdometer, remainder, 0, len(remainder))
+
+    return list(filamentOdometer.getExtrusionAmount())
+
+
+def buildCheckpointIndex(
+    filePath,
+    g90InfluencesExtruder=False,
+    checkpointInterval=DEFAULT_CHECKPOINT_INTERVAL,
+):
+    """
+    Scans the memory-mapped file once and records the odometer state at the first line start after every
+    checkpointInterval bytes. The last checkpoint is the state at the end of the file.
+
+    :return: json serializable index, used by remainingFilamentFromOffset
+    """
+    filamentOdometer = _createOdometer(g90InfluencesExtruder)
+    fileSize = os.path.getsize(filePath)
+    checkpoints = [_createCheckpoint(0, filamentOdometer)]
+    if fileSize > 0:
+        with open(filePath, "rb") as gcodeFile, _mapFile(gcodeFile) as fileContent:
+            startPos = 0
+            while startPos < fileSize:
+                endPos = fileContent.find(b"\n", startPos + checkpointInterval)
+                endPos = fileSize if endPos < 0 else endPos + 1
+                _processChunk(filamentOdometer, fileContent, startPos, endPos)
+                checkpoints.append(_createCheckpoint(endPos, filamentOdometer))
+                startPos = endPos
+
+    return {
+        "fileSize": fileSize,
+        "g90InfluencesExtruder": g90InfluencesExtruder,
+        "checkpointInterval": checkpointInterval,
+        "checkpoints": checkpoints,
+    }
+
+
+def remainingFilamentFromOffset(filePath, checkpointIndex, offset):
+    """
+    Extruded length per tool from the file position (e.g. filepos of a paused print) to the end of the file.
+    Only the lines between the nearest checkpoint and the offset are scanned.
+    """
+    checkpoints = checkpointIndex["checkpoints"]
+    checkpointOffsets = [checkpoint[0] for checkpoint in checkpoints]
+    offset = min(max(offset, 0), checkpointIndex["fileSize"])
+    checkpoint = checkpoints[bisect.bisect_right(checkpointOffsets, offset) - 1]
+
+    filamentOdometer = _createOdometer(checkpointIndex["g90InfluencesExtruder"])
+    filamentOdometer.setState(_checkpointToState(checkpoint))
+    startPos = checkpoint[0]
+    if offset > startPos:
+        with open(filePath, "rb") as gcodeFile, _mapFile(gcodeFile) as fileContent:
+            # only complete lines before the offset
+            endPos = fileContent.rfind(b"\n", startPos, offset) + 1
+            if endPos > startPos:
+                _processChunk(filamentOdometer, fileContent, startPos, endPos)
+
+    alreadyExtruded = filamentOdometer.getExtrusionAmount()
+    totalExtrusion = _checkpointToState(checkpoints[-1])["maxExtrusion"]
+    result = []
+    for toolIndex, toolExtrusion in enumerate(totalExtrusion):
+        if toolIndex < len(alreadyExtruded):
+            toolExtrusion -= alreadyExtruded[toolIndex]
+        result.append(max(0.0, toolExtrusion))
+    return result
+
+
+def _createOdometer(g90InfluencesExtruder):
+    filamentOdometer = FilamentOdometer()
+    filamentOdometer.set_g90_extruder(g90InfluencesExtruder)
+    return filamentOdometer
+
+
+def _mapFile(gcodeFile):
+    return mmap.mmap(gcodeFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _createCheckpoint(offset, filamentOdometer):
+    # compact list instead of a dict, because the index is stored in the file metadata
+    state = filamentOdometer.getState()
+    return [
+        offset,
+        state["currentExtruder"],
+        state["relativeE"],
+        state["relativeMode"],
+        state["duplicationMode"],
+        state["currentE"],
+        state["totalExtrusion"],
+        state["maxExtrusion"],
+    ]
+
+
+def _checkpointToState(checkpoint):
+    return {
+        "currentExtruder": checkpoint[1],
+        "relativeE": checkpoint[2],
+        "relativeMode": checkpoint[3],
+        "duplicationMode": checkpoint[4],
+        "currentE": checkpoint[5],
+        "totalExtrusion": checkpoint[6],
+        "maxExtrusion": checkpoint[7],
+    }
+
+
+def _processChunk(filamentOdometer, content, startPos, endPos):
+    processGCodeLine = filamentOdometer.processGCodeLine
+    processExtrusion = filamentOdometer.processExtrusion
+    parseFloat = GCodeTokenizer.parseFloat
+    for eValue, otherLine in _ODOMETER_LINE_PATTERN.findall(content, startPos, endPos):
+        if otherLine:
+            processGCodeLine(otherLine.decode("ascii", "ignore"))
+        else:
+            e = parseFloat(eValue)
+            if e is not None:
+                processExtrusion(e)
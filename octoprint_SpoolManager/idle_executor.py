@@ -0,0 +1,80 @@
+# coding=utf-8
+import threading
+from contextlib import contextmanager
+
+
+class IdleExecutor:
+    """
+    Executor that is created with the first map() of a batch and shut down idleSeconds after the last batch ended,
+    so e.g. the worker processes of a process pool don't stay around between rare label sheets.
+    The executor is not shut down while a batch is running.
+    """
+
+    def __init__(self, createExecutor, idleSeconds):
+        """
+        :param createExecutor: function() -> concurrent.futures.Executor
+        """
+        self._createExecutor = createExecutor
+        self._idleSeconds = idleSeconds
+        self._lock = threading.Lock()
+        self._executor = None
+        self._activeBatches = 0
+        self._idleTimer = None
+
+    @contextmanager
+    def batch(self):
+        """
+        :return: this IdleExecutor, map() is only allowed inside the batch
+        """
+        with self._lock:
+            self._cancelIdleTimer()
+            self._activeBatches += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._activeBatches -= 1
+                if self._activeBatches == 0 and self._executor != None:
+                    self._idleTimer = threading.Timer(
+                        self._idleSeconds, self._shutdownIfIdle
+                    )
+                    self._idleTimer.daemon = True
+                    self._idleTimer.start()
+
+    def map(self, fn, *iterables, **kwargs):
+        """
+        like Executor.map, the executor is created with the first call
+        """
+        with self._lock:
+            if self._activeBatches == 0:
+                raise RuntimeError("map() outside of a batch")
+            if self._executor == None:
+                self._executor = self._createExecutor()
+            executor = self._executor
+        return executor.map(fn, *iterables, **kwargs)
+
+    def isRunning(self):
+        return self._executor != None
+
+    def shutdown(self):
+        with self._lock:
+            self._cancelIdleTimer()
+            executor = self._executor
+            self._executor = None
+        if executor != None:
+            executor.shutdown(wait=False)
+
+    def _cancelIdleTimer(self):
+        if self._idleTimer != None:
+            self._idleTimer.cancel()
+            self._idleTimer = None
+
+    def _shutdownIfIdle(self):
+        with self._lock:
+            if self._activeBatches > 0 or self._executor == None:
+                # a new batch started in the meantime
+                return
+            self._idleTimer = None
+            executor = self._executor
+            self._executor = None
+        executor.shutdown(wait=False)
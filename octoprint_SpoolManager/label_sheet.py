@@ -0,0 +1,118 @@
+# coding=utf-8
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+# the label sheet is rendered with this resolution
+SHEET_DPI = 150
+# page size in pixel at SHEET_DPI
+PAGE_SIZES = {
+    "a4": (1240, 1754),
+    "letter": (1275, 1650),
+}
+# sheet format -> mimetype
+SHEET_FORMATS = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+}
+PAGE_MARGIN = 45
+CAPTION_HEIGHT = 36
+
+
+class LabelLayout:
+    """
+    Grid of labels (QR code with caption below) on a page
+    """
+
+    def __init__(self, pageSize="a4", columns=4, rows=6):
+        self.pageWidth, self.pageHeight = PAGE_SIZES[pageSize]
+        self.columns = columns
+        self.rows = rows
+        self.cellWidth = (self.pageWidth - 2 * PAGE_MARGIN) // columns
+        self.cellHeight = (self.pageHeight - 2 * PAGE_MARGIN) // rows
+        # QR code size that fits into a cell, also the size of the rendered QR codes
+        self.qrCodeSize = max(
+            1, min(self.cellWidth, self.cellHeight - CAPTION_HEIGHT) - 10
+        )
+
+    def labelsPerPage(self):
+        return self.columns * self.rows
+
+    def pageCount(self, labelCount):
+        return max(1, -(-labelCount // self.labelsPerPage()))
+
+
+def _loadCaptionFont():
+    try:
+        return ImageFont.load_default(size=20)
+    except TypeError:
+        # Pillow < 10.1, only the small bitmap font
+        return ImageFont.load_default()
+
+
+def _fitCaption(draw, caption, font, maxWidth):
+    if draw.textlength(caption, font=font) <= maxWidth:
+        return caption
+    while len(caption) > 1 and draw.textlength(caption + "...", font=font) > maxWidth:
+        caption = caption[:-1]
+    return caption + "..."
+
+
+def buildLabelPages(labels, layout):
+    """
+    Generator of the sheet pages, one page at a time is in memory
+    :param labels: list of (encoded QR code image with the size layout.qrCodeSize, caption)
+    """
+    font = _loadCaptionFont()
+    labelsPerPage = layout.labelsPerPage()
+    for pageIndex in range(layout.pageCount(len(labels))):
+        page = Image.new("RGB", (layout.pageWidth, layout.pageHeight), "white")
+        draw = ImageDraw.Draw(page)
+        pageLabels = labels[pageIndex * labelsPerPage : (pageIndex + 1) * labelsPerPage]
+        for labelIndex, (qrCodeImage, caption) in enumerate(pageLabels):
+            cellLeft = PAGE_MARGIN + (labelIndex % layout.columns) * layout.cellWidth
+            cellTop = PAGE_MARGIN + (labelIndex // layout.columns) * layout.cellHeight
+            with Image.open(BytesIO(qrCodeImage)) as qrCode:
+                page.paste(
+                    qrCode.convert("RGB"),
+                    (cellLeft + (layout.cellWidth - layout.qrCodeSize) // 2, cellTop),
+                )
+            caption = _fitCaption(draw, caption, font, layout.cellWidth - 10)
+            captionWidth = draw.textlength(caption, font=font)
+            draw.text(
+                (
+                    cellLeft + (layout.cellWidth - captionWidth) // 2,
+                    cellTop + layout.qrCodeSize + 8,
+                ),
+                caption,
+                fill="black",
+                font=font,
+            )
+        yield page
+
+
+def writeLabelSheet(pages, sheetFormat, sheetFile, pageIndex=0):
+    """
+    :param pages: iterable of the pages
+    :param sheetFile: seekable binary file
+    :param pageIndex: png only, the page that is written
+    """
+    if sheetFormat == "png":
+        for currentPageIndex, page in enumerate(pages):
+            if currentPageIndex == pageIndex:
+                page.save(sheetFile, "PNG", dpi=(SHEET_DPI, SHEET_DPI))
+                return
+        return
+
+    # page by page (incremental PDF update), instead of all pages in memory for save_all
+    firstPage = True
+    for page in pages:
+        sheetFile.seek(0)
+        page.save(
+            sheetFile,
+            "PDF",
+            append=firstPage == False,
+            resolution=SHEET_DPI,
+            quality=95,
+        )
+        firstPage = False
@@ -0,0 +1,21 @@
+# coding=utf-8
+from peewee import CharField, ForeignKeyField
+
+from octoprint_SpoolManager.models.BaseModel import BaseModel
+from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+
+
+class SpoolLabelModel(BaseModel):
+    """
+    One row per label of a spool, normalized copy of the JSON SpoolModel.labels column
+    (used for the label catalog and the label filter)
+    """
+
+    spool = ForeignKeyField(SpoolModel, backref="labelEntries", on_delete="CASCADE")
+    label = CharField(null=False)
+
+    class Meta:
+        indexes = (
+            # label filter: label -> spools, without touching the table
+            (("label", "spool"), True),
+        )
@@ -7,6 +7,7 @@ from peewee import (
     FloatField,
     IntegerField,
     TextField,
+    fn,
 )
 
 from octoprint_SpoolManager.models.BaseModel import BaseModel
@@ -14,20 +15,20 @@ from octoprint_SpoolManager.models.BaseModel import BaseModel
 
 class SpoolModel(BaseModel):
     isActive = BooleanField(null=True)
-    isTemplate = BooleanField(null=True)
+    isTemplate = BooleanField(null=True, index=True)
     displayName = CharField(null=True)
     vendor = CharField(null=True, index=True)
     totalWeightInGram = FloatField(null=True)
     spoolWeightInGram = FloatField(null=True)
     usedWeightInGram = FloatField(null=True)
-    remainingWeightInGram = FloatField(null=True)
+    remainingWeightInGram = FloatField(null=True, index=True)
 
     totalLengthInMM = IntegerField(null=True)
     usedLengthInMM = IntegerField(null=True)
     BarOrQRcode = CharField(null=True)
 
-    firstUse = DateTimeField(null=True)
-    lastUse = DateTimeField(null=True)
+    firstUse = DateTimeField(null=True, index=True)
+    lastUse = DateTimeField(null=True, index=True)
 
     purchasedFrom = CharField(null=True)
     purchasedOn = DateField(null=True)
@@ -59,3 +60,16 @@ class SpoolModel(BaseModel):
     offsetTemperature = IntegerField(null=True)
     offsetBedTemperature = IntegerField(null=True)
     offsetEnclosureTemperature = IntegerField(null=True)
+
+
+# indexes for the filter/sort combinations of the spool table (see DatabaseManager.loadAllSpoolsByQuery)
+# sort by displayName is case-insensitive
+SpoolModel.add_index(
+    SpoolModel.index(
+        fn.Lower(SpoolModel.displayName), name="spoolmodel_lower_displayname"
+    )
+)
+# hide inactive and/or empty spools
+SpoolModel.add_index(SpoolModel.isActive, SpoolModel.remainingWeightInGram)
+# color filter
+SpoolModel.add_index(SpoolModel.color, SpoolModel.colorName)
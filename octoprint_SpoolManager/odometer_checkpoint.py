@@ -0,0 +1,162 @@
+# coding=utf-8
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+
+# tool 0 - 10, see FilamentOdometer.max_extruders
+MAX_TOOLS = 11
+
+_MAGIC = b"SMOC"
+_VERSION = 2
+
+_FLAG_RELATIVE_E = 1
+_FLAG_RELATIVE_MODE = 2
+_FLAG_DUPLICATION_MODE = 4
+
+# magic, version, flags, toolCount, currentExtruder, timestamp,
+# currentE[], totalExtrusion[], maxExtrusion[], committedExtrusion[]
+# followed by a crc32 of all previous bytes
+_TOOL_VALUES = ("currentE", "totalExtrusion", "maxExtrusion", "committedExtrusion")
+_RECORD = struct.Struct("<4sBBBBd%dd" % (len(_TOOL_VALUES) * MAX_TOOLS))
+_CRC = struct.Struct("<I")
+RECORD_SIZE = _RECORD.size + _CRC.size
+
+
+def _padded(values):
+    values = list(values[:MAX_TOOLS])
+    return values + [0.0] * (MAX_TOOLS - len(values))
+
+
+def packState(state, timestamp):
+    flags = 0
+    if state["relativeE"]:
+        flags |= _FLAG_RELATIVE_E
+    if state["relativeMode"]:
+        flags |= _FLAG_RELATIVE_MODE
+    if state["duplicationMode"]:
+        flags |= _FLAG_DUPLICATION_MODE
+    toolCount = min(len(state["maxExtrusion"]), MAX_TOOLS)
+    toolValues = []
+    for key in _TOOL_VALUES:
+        toolValues += _padded(state[key])
+    record = _RECORD.pack(
+        _MAGIC,
+        _VERSION,
+        flags,
+        toolCount,
+        state["currentExtruder"],
+        timestamp,
+        *toolValues
+    )
+    return record + _CRC.pack(zlib.crc32(record))
+
+
+def unpackState(data):
+    """
+    :return: (state, timestamp) or None if the record is incomplete/damaged or from an other version
+    """
+    if len(data) != RECORD_SIZE:
+        return None
+    record = data[: _RECORD.size]
+    if _CRC.unpack(data[_RECORD.size :])[0] != zlib.crc32(record):
+        return None
+    values = _RECORD.unpack(record)
+    magic, version, flags, toolCount, currentExtruder, timestamp = values[:6]
+    if magic != _MAGIC or version != _VERSION:
+        return None
+    state = {
+        "currentExtruder": currentExtruder,
+        "relativeE": (flags & _FLAG_RELATIVE_E) != 0,
+        "relativeMode": (flags & _FLAG_RELATIVE_MODE) != 0,
+        "duplicationMode": (flags & _FLAG_DUPLICATION_MODE) != 0,
+    }
+    for index, key in enumerate(_TOOL_VALUES):
+        start = 6 + index * MAX_TOOLS
+        state[key] = list(values[start : start + toolCount])
+    return (state, timestamp)
+
+
+class OdometerCheckpoint:
+    """
+    Persists the odometer state of the running print, so the not yet committed extrusion survives an OctoPrint
+    restart/crash. The state is written as one small fixed-size record (temp file + atomic rename) from an own
+    thread, only if it has changed and at most every intervalSeconds.
+    """
+
+    def __init__(self, filePath):
+        self._logger = logging.getLogger(__name__)
+        self._filePath = filePath
+        self._writeLock = threading.Lock()
+        self._stopEvent = threading.Event()
+        self._thread = None
+        self._lastWrittenState = None
+
+    def getFilePath(self):
+        return self._filePath
+
+    def isRunning(self):
+        return self._thread is not None
+
+    def start(self, filamentOdometer: FilamentOdometer, intervalSeconds):
+        self.stop()
+        self._stopEvent.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(filamentOdometer, intervalSeconds),
+            name="SpoolManager.OdometerCheckpoint",
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopEvent.set()
+        self._thread.join()
+        self._thread = None
+
+    def write(self, state):
+        with self._writeLock:
+            if state == self._lastWrittenState:
+                return
+            record = packState(state, time.time())
+            tempFilePath = self._filePath + ".tmp"
+            with open(tempFilePath, "wb") as checkpointFile:
+                checkpointFile.write(record)
+                checkpointFile.flush()
+                os.fsync(checkpointFile.fileno())
+            os.replace(tempFilePath, self._filePath)
+            self._lastWrittenState = state
+
+    def read(self):
+        """
+        :return: (state, timestamp) of the last checkpoint or None
+        """
+        if not os.path.exists(self._filePath):
+            return None
+        with open(self._filePath, "rb") as checkpointFile:
+            data = checkpointFile.read(RECORD_SIZE + 1)
+        result = unpackState(data)
+        if result is None:
+            self._logger.warning(
+                "Odometer checkpoint '%s' is damaged, ignored" % self._filePath
+            )
+        return result
+
+    def remove(self):
+        with self._writeLock:
+            self._lastWrittenState = None
+            if os.path.exists(self._filePath):
+                os.remove(self._filePath)
+
+    def _run(self, filamentOdometer, intervalSeconds):
+        while not self._stopEvent.wait(intervalSeconds):
+            try:
+                self.write(filamentOdometer.getState())
+            except Exception:
+                self._logger.exception("Could not write odometer checkpoint")
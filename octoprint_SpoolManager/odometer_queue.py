@@ -0,0 +1,141 @@
+# coding=utf-8
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+
+
+class _Barrier:
+    def __init__(self):
+        self.reached = threading.Event()
+        self.released = threading.Event()
+
+
+class OdometerQueue:
+    """
+    Optional asynchronous odometer processing.
+    The sending thread only appends the raw command to a bounded queue (deque append/popleft are atomic, no lock needed),
+    a dedicated worker thread drains the queue into the FilamentOdometer.
+    The serial stream is never delayed: if the queue is full (e.g. worker paused by drained() during a slow commit),
+    the new command is dropped and counted in droppedLines, with one warning per full episode.
+    The capacity should be large enough that this never happens.
+    """
+
+    IDLE_WAIT_SECONDS = 0.5
+
+    def __init__(self, filament_odometer: FilamentOdometer) -> None:
+        self._logger = logging.getLogger(__name__)
+        self._filamentOdometer = filament_odometer
+        self._queue = deque()
+        self._capacity = 0
+        self._wakeupEvent = threading.Event()
+        self._stopEvent = threading.Event()
+        self._thread = None
+
+        self.droppedLines = 0
+        self.fullQueueEpisodes = 0
+        self.processedLines = 0
+        # True from the first dropped line until a line fits into the queue again
+        self._queueFull = False
+
+    def isRunning(self):
+        return self._thread is not None
+
+    def start(self, capacity):
+        if self._thread is not None:
+            return
+        self._capacity = capacity
+        self._stopEvent.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="SpoolManager.OdometerQueue"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        # process everything that is already queued, then stop
+        with self.drained():
+            self._stopEvent.set()
+        self._thread.join()
+        self._thread = None
+
+    def enqueue(self, line):
+        """
+        (thread: comm.sending_thread)
+        """
+        if len(self._queue) >= self._capacity:
+            self._dropLine()
+            return
+        self._queueFull = False
+        self._queue.append(line)
+        if not self._wakeupEvent.is_set():
+            self._wakeupEvent.set()
+
+    def _dropLine(self):
+        self.droppedLines += 1
+        if self._queueFull == False:
+            self._queueFull = True
+            self.fullQueueEpisodes += 1
+            self._logger.warning(
+                "Odometer queue full (%d lines), sent lines are dropped until the worker catches up"
+                % self._capacity
+            )
+
+    @contextmanager
+    def drained(self, timeout=10.0):
+        """
+        Waits until all already queued lines are processed and pauses the worker during the with-block,
+        so the odometer could be read/committed/reset without interference.
+        """
+        if self._thread is None:
+            yield
+            return
+
+        barrier = _Barrier()
+        self._queue.append(barrier)
+        self._wakeupEvent.set()
+        if barrier.reached.wait(timeout) == False:
+            self._logger.warning(
+                "Odometer queue not drained after %s seconds, %d lines still queued"
+                % (timeout, len(self._queue))
+            )
+        try:
+            yield
+        finally:
+            barrier.released.set()
+
+    def getStatistics(self):
+        return {
+            "running": self.isRunning(),
+            "queueDepth": len(self._queue),
+            "queueCapacity": self._capacity,
+            "droppedLines": self.droppedLines,
+            "fullQueueEpisodes": self.fullQueueEpisodes,
+            "processedLines": self.processedLines,
+        }
+
+    def _run(self):
+        queue = self._queue
+        processGCodeLine = self._filamentOdometer.processGCodeLine
+        while not self._stopEvent.is_set():
+            try:
+                item = queue.popleft()
+            except IndexError:
+                self._wakeupEvent.wait(self.IDLE_WAIT_SECONDS)
+                self._wakeupEvent.clear()
+                continue
+
+            if isinstance(item, _Barrier):
+                item.reached.set()
+                item.released.wait()
+                continue
+
+            try:
+                processGCodeLine(item)
+            except Exception:
+                self._logger.exception("Could not process line '%s'" % item)
+            self.processedLines += 1
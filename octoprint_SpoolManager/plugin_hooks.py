@@ -1,13 +1,21 @@
 from .spool_manager_plugin import SpoolmanagerPlugin
 from .filament_odometer import FilamentOdometer
+from .odometer_queue import OdometerQueue
 from octoprint_SpoolManager.common.EventBusKeys import EventBusKeys
+from octoprint_SpoolManager.common.GCodeTokenizer import isOdometerGCodeCommand
 
 class PluginHooks:
     """ handles plugin hooks """
 
-    def __init__(self, plugin: SpoolmanagerPlugin, filament_odometer: FilamentOdometer) -> None:
+    def __init__(
+        self,
+        plugin: SpoolmanagerPlugin,
+        filament_odometer: FilamentOdometer,
+        odometer_queue: OdometerQueue = None,
+    ) -> None:
         self.plugin = plugin
         self.filament_odometer = filament_odometer
+        self.odometer_queue = odometer_queue
 
 
     def get_update_information(self):
@@ -57,8 +65,14 @@ class PluginHooks:
         Listen to all g-code which where already sent to the printer
         (thread: comm.sending_thread)
         """
+        # temperature polls, progress reports,... could never change the extrusion
+        if not isOdometerGCodeCommand(gcode):
+            return
 
-        self.filament_odometer.processGCodeLine(cmd)
+        if self.odometer_queue is not None and self.odometer_queue.isRunning():
+            self.odometer_queue.enqueue(cmd)
+        else:
+            self.filament_odometer.processGCodeLine(cmd)
 
     def register_custom_events(*args, **kwargs):
         return [
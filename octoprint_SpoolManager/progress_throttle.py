@@ -0,0 +1,36 @@
+# coding=utf-8
+import time
+
+
+class ProgressThrottle:
+    """
+    Passes the progress to the callback at most every N items or every T milliseconds,
+    so a long running task (e.g. CSV import) doesn't send a client message for each row
+    """
+
+    def __init__(self, callback, everyItems=100, everyMillis=500, clock=time.monotonic):
+        self._callback = callback
+        self._everyItems = everyItems
+        self._everyMillis = everyMillis
+        self._clock = clock
+        self._lastItemNumber = None
+        self._lastReportTime = None
+
+    def update(self, itemNumber, force=False):
+        """
+        :param itemNumber: current item number, increasing
+        :param force: report anyway, e.g. the last item
+        :return: True if passed to the callback
+        """
+        now = self._clock()
+        if (
+            force == False
+            and self._lastItemNumber != None
+            and int(itemNumber) - self._lastItemNumber < self._everyItems
+            and (now - self._lastReportTime) * 1000 < self._everyMillis
+        ):
+            return False
+        self._lastItemNumber = int(itemNumber)
+        self._lastReportTime = now
+        self._callback(itemNumber)
+        return True
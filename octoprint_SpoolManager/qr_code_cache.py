@@ -0,0 +1,231 @@
+# coding=utf-8
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import qrcode
+from PIL import Image
+
+# image formats of the QR code: format -> (PIL format, mimetype, file extension)
+QR_CODE_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "png": ("PNG", "image/png", "png"),
+}
+
+# QR codes per task of the render executor
+RENDER_CHUNK_SIZE = 8
+
+
+def loadLogoImage(imageFileLocation):
+    """
+    :return: (decoded logo image, fingerprint of the image file)
+    """
+    with open(imageFileLocation, "rb") as imageFile:
+        imageBytes = imageFile.read()
+    logoImage = Image.open(BytesIO(imageBytes))
+    logoImage.load()
+    return (logoImage, hashlib.sha256(imageBytes).hexdigest()[:16])
+
+
+def renderQRCode(url, fillColor, backgroundColor, logoImage, size, imageFormat):
+    """
+    QR code of the url with the logo in the middle, size is the width/height in pixel or None for the native size
+    :return: encoded image
+    """
+    # https://note.nkmk.me/en/python-pillow-qrcode/
+    qrMaker = qrcode.QRCode(border=4, error_correction=qrcode.constants.ERROR_CORRECT_H)
+    qrMaker.add_data(url)
+    qrMaker.make(fit=True)
+
+    qrImage = qrMaker.make_image(
+        fill_color=fillColor, back_color=backgroundColor
+    ).convert("RGB")
+    if logoImage != None:
+        pos = (
+            (qrImage.size[0] - logoImage.size[0]) // 2,
+            (qrImage.size[1] - logoImage.size[1]) // 2,
+        )
+        qrImage.paste(logoImage, pos)
+    if size != None and size != qrImage.size[0]:
+        qrImage = qrImage.resize((size, size), Image.NEAREST)
+
+    qrImageIO = BytesIO()
+    pilFormat = QR_CODE_FORMATS[imageFormat][0]
+    if pilFormat == "JPEG":
+        qrImage.save(qrImageIO, pilFormat, quality=100)
+    else:
+        qrImage.save(qrImageIO, pilFormat)
+    return qrImageIO.getvalue()
+
+
+class QRCodeCache:
+    """
+    Rendered QR code images, content-addressed: the key is a hash of everything the image depends on
+    (url, colors, size, format and the logo), so an entry never gets outdated and the key is also the ETag.
+    Most recently used images are kept in memory, all rendered images are stored in the cache folder
+    (oldest files are removed above maxFiles).
+    """
+
+    def __init__(
+        self, cacheFolder, logoImage, logoFingerprint, maxEntries=64, maxFiles=2000
+    ):
+        self._logger = logging.getLogger(__name__)
+        self._cacheFolder = cacheFolder
+        self._logoImage = logoImage
+        self._logoFingerprint = logoFingerprint
+        self._maxEntries = maxEntries
+        self._maxFiles = maxFiles
+        self._lock = threading.Lock()
+        # key -> image bytes
+        self._images = OrderedDict()
+        self._fileCount = None
+
+    def buildKey(self, url, fillColor, backgroundColor, size, imageFormat):
+        keySource = "\n".join(
+            [
+                url,
+                str(fillColor),
+                str(backgroundColor),
+                str(size),
+                imageFormat,
+                self._logoFingerprint,
+            ]
+        )
+        return hashlib.sha256(keySource.encode("utf-8")).hexdigest()
+
+    def getImage(self, key, url, fillColor, backgroundColor, size, imageFormat):
+        """
+        :param key: buildKey of the other parameters
+        :return: encoded image, rendered only if neither in memory nor in the cache folder
+        """
+        imageBytes = self._getCachedImage(key, imageFormat)
+        if imageBytes == None:
+            imageBytes = renderQRCode(
+                url, fillColor, backgroundColor, self._logoImage, size, imageFormat
+            )
+            self._storeImage(key, imageFormat, imageBytes)
+        return imageBytes
+
+    def getImages(self, qrCodeRequests, executor=None):
+        """
+        Like getImage for many QR codes, the missing images are rendered in parallel with the executor
+        (e.g. a ProcessPoolExecutor). If the executor fails, they are rendered in this thread.
+        :param qrCodeRequests: list of (url, fillColor, backgroundColor, size, imageFormat)
+        :return: list of the encoded images
+        """
+        keys = [self.buildKey(*qrCodeRequest) for qrCodeRequest in qrCodeRequests]
+        imagesByKey = {}
+        missingRequestsByKey = {}
+        for key, qrCodeRequest in zip(keys, qrCodeRequests):
+            if key in imagesByKey or key in missingRequestsByKey:
+                continue
+            imageBytes = self._getCachedImage(key, qrCodeRequest[4])
+            if imageBytes == None:
+                missingRequestsByKey[key] = qrCodeRequest
+            else:
+                imagesByKey[key] = imageBytes
+
+        if len(missingRequestsByKey) > 0:
+            missingKeys = list(missingRequestsByKey.keys())
+            renderedImages = self._renderImages(
+                [missingRequestsByKey[key] for key in missingKeys], executor
+            )
+            for key, imageBytes in zip(missingKeys, renderedImages):
+                self._storeImage(key, missingRequestsByKey[key][4], imageBytes)
+                imagesByKey[key] = imageBytes
+        return [imagesByKey[key] for key in keys]
+
+    def _renderImages(self, qrCodeRequests, executor):
+        # url, fillColor, backgroundColor, logoImage, size, imageFormat
+        renderArguments = [
+            (url, fillColor, backgroundColor, self._logoImage, size, imageFormat)
+            for url, fillColor, backgroundColor, size, imageFormat in qrCodeRequests
+        ]
+        if executor != None and len(renderArguments) > 1:
+            try:
+                return list(
+                    executor.map(
+                        renderQRCode,
+                        *zip(*renderArguments),
+                        chunksize=RENDER_CHUNK_SIZE
+                    )
+                )
+            except Exception:
+                self._logger.exception(
+                    "Could not render QR codes in parallel, rendering them one by one"
+                )
+        return [renderQRCode(*arguments) for arguments in renderArguments]
+
+    def _getCachedImage(self, key, imageFormat):
+        with self._lock:
+            imageBytes = self._images.get(key)
+            if imageBytes != None:
+                self._images.move_to_end(key)
+                return imageBytes
+        imageBytes = self._readImageFile(self._buildImagePath(key, imageFormat))
+        if imageBytes != None:
+            self._rememberImage(key, imageBytes)
+        return imageBytes
+
+    def _storeImage(self, key, imageFormat, imageBytes):
+        self._writeImageFile(self._buildImagePath(key, imageFormat), imageBytes)
+        self._rememberImage(key, imageBytes)
+
+    def _rememberImage(self, key, imageBytes):
+        with self._lock:
+            self._images[key] = imageBytes
+            self._images.move_to_end(key)
+            while len(self._images) > self._maxEntries:
+                self._images.popitem(last=False)
+
+    def _buildImagePath(self, key, imageFormat):
+        return os.path.join(
+            self._cacheFolder, key + "." + QR_CODE_FORMATS[imageFormat][2]
+        )
+
+    def _readImageFile(self, imagePath):
+        try:
+            with open(imagePath, "rb") as imageFile:
+                return imageFile.read()
+        except (IOError, OSError):
+            return None
+
+    def _writeImageFile(self, imagePath, imageBytes):
+        # the cache folder is only an optimization, failures are logged and ignored
+        try:
+            if not os.path.exists(self._cacheFolder):
+                os.makedirs(self._cacheFolder)
+            # complete files only, parallel requests could render the same image
+            fileDescriptor, tempPath = tempfile.mkstemp(
+                dir=self._cacheFolder, suffix=".tmp"
+            )
+            with os.fdopen(fileDescriptor, "wb") as imageFile:
+                imageFile.write(imageBytes)
+            os.replace(tempPath, imagePath)
+            self._removeOldestFiles()
+        except (IOError, OSError):
+            self._logger.exception(
+                "Could not store QR code in '%s'" % self._cacheFolder
+            )
+
+    def _removeOldestFiles(self):
+        with self._lock:
+            if self._fileCount == None:
+                self._fileCount = len(os.listdir(self._cacheFolder))
+            else:
+                self._fileCount += 1
+            if self._fileCount <= self._maxFiles:
+                return
+            imagePaths = [
+                os.path.join(self._cacheFolder, fileName)
+                for fileName in os.listdir(self._cacheFolder)
+            ]
+            imagePaths.sort(key=os.path.getmtime)
+            # remove 10% to not list the folder with every new image
+            for imagePath in imagePaths[: len(imagePaths) - self._maxFiles * 9 // 10]:
+                os.remove(imagePath)
+            self._fileCount = len(os.listdir(self._cacheFolder))
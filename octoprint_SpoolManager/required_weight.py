@@ -0,0 +1,129 @@
+# coding=utf-8
+import logging
+import math
+from collections import namedtuple
+
+_logger = logging.getLogger(__name__)
+
+# everything the required weight depends on, taken once per evaluation:
+# filament length per tool of the selected file, selected spool per tool (None for no selection) and the
+# safety length from the settings
+RequiredWeightSnapshot = namedtuple(
+    "RequiredWeightSnapshot", ["filamentLengths", "selectedSpools", "safetyLengthInMM"]
+)
+
+
+def createRequiredWeightSnapshot(filamentLengths, selectedSpools, safetyLengthInMM):
+    return RequiredWeightSnapshot(
+        tuple(filamentLengths), tuple(selectedSpools), safetyLengthInMM or 0
+    )
+
+
+def calculateWeight(length, diameter, density):
+    radius = diameter / 2.0
+    volume = length * math.pi * (radius * radius) / 1000
+    result = volume * density
+    return result
+
+
+def _readSpoolValues(selectedSpool):
+    """
+    :return: (values diameter, density, totalWeight, usedWeight as float, missing fields, not a number fields)
+    """
+    missingFields = []
+    invalidFields = []
+    values = []
+    for fieldName, value in (
+        ("diameter", selectedSpool.diameter),
+        ("density", selectedSpool.density),
+        ("total weight", selectedSpool.totalWeightInGram),
+        ("used weight", selectedSpool.usedWeightInGram),
+    ):
+        if value is None:
+            if fieldName == "used weight":
+                value = 0.0
+            else:
+                missingFields.append(fieldName)
+                continue
+        try:
+            values.append(float(value))
+        except ValueError:
+            invalidFields.append(fieldName)
+    return (values, missingFields, invalidFields)
+
+
+def evaluateRequiredWeight(snapshot):
+    """
+    Required weight for all tools of the file in one pass over the snapshot
+    :return: dict with metaDataMissing, attributesMissing, notEnough and detailedSpoolResult (one item per tool
+    of the file, for a selected spool with missingFields/invalidFields the weight is not calculated)
+    """
+    metaDataMissing = len(snapshot.filamentLengths) <= 0
+    requiredWeightResultDict = {
+        "metaDataMissing": metaDataMissing,
+        "attributesMissing": False,
+        "notEnough": False,
+        "detailedSpoolResult": [],
+    }
+    for toolIndex, filamentLength in enumerate(snapshot.filamentLengths):
+        selectedSpool = (
+            snapshot.selectedSpools[toolIndex]
+            if toolIndex < len(snapshot.selectedSpools)
+            else None
+        )
+        if selectedSpool == None:
+            # No selected spool for this tool-index, just create an simple entry
+            requiredWeightResultDict["detailedSpoolResult"].append(
+                {
+                    "toolIndex": toolIndex,
+                    "requiredLength": filamentLength,
+                    "spoolSelected": False,
+                    "spoolName": "not selected",
+                }
+            )
+            continue
+
+        detailedSpoolResultItem = {
+            "toolIndex": toolIndex,
+            "requiredLength": filamentLength,
+            "spoolSelected": True,
+            "spoolName": selectedSpool.displayName,
+        }
+        requiredWeightResultDict["detailedSpoolResult"].append(detailedSpoolResultItem)
+
+        values, missingFields, invalidFields = _readSpoolValues(selectedSpool)
+        detailedSpoolResultItem["missingFields"] = missingFields
+        detailedSpoolResultItem["invalidFields"] = invalidFields
+        if len(missingFields) > 0 or len(invalidFields) > 0:
+            requiredWeightResultDict["attributesMissing"] = True
+            continue
+
+        diameter, density, totalWeight, usedWeight = values
+        requiredWeight = calculateWeight(filamentLength, diameter, density)
+        if snapshot.safetyLengthInMM != 0:
+            requiredWeight += calculateWeight(
+                snapshot.safetyLengthInMM, diameter, density
+            )
+        # TODO don't calculate here use the value from the database
+        remainingWeight = totalWeight - usedWeight
+        notEnough = remainingWeight < requiredWeight and requiredWeight > 0
+        _logger.info(
+            "tool%d, requiredWeight '%s', remainingWeight '%s'%s",
+            toolIndex,
+            requiredWeight,
+            remainingWeight,
+            ", filament not enough!" if notEnough else "",
+        )
+        if notEnough:
+            requiredWeightResultDict["notEnough"] = True
+
+        detailedSpoolResultItem.update(
+            {
+                "requiredWeight": requiredWeight,
+                "remainingWeight": remainingWeight,
+                "diameter": diameter,
+                "density": density,
+                "notEnough": notEnough,
+            }
+        )
+    return requiredWeightResultDict
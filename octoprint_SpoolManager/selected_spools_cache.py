@@ -0,0 +1,130 @@
+# coding=utf-8
+import logging
+import threading
+
+
+def copySpoolModel(spoolModel):
+    copiedSpoolModel = type(spoolModel)(**spoolModel.__data__)
+    copiedSpoolModel._dirty = set(spoolModel._dirty)
+    return copiedSpoolModel
+
+
+def toDatabaseId(databaseId):
+    """
+    :return: the databaseId as int, None for no selection or an invalid value
+    """
+    if databaseId == None:
+        return None
+    try:
+        return int(databaseId)
+    except (TypeError, ValueError):
+        return None
+
+
+class SelectedSpoolsCache:
+    """
+    In-memory copy of the selected spools, so the read paths (file selection, client open, allowedToPrint,
+    settings save,...) don't touch the database.
+    Write-through: a spool/selection is stored in the database first and then the stored model is put into the cache.
+    Every change increases the version. invalidate() drops everything and the next read reloads from the database,
+    needed if other OctoPrint instances share the same external database.
+    Only copies are handed out, the callers are free to modify them.
+    """
+
+    def __init__(self, loadSpools):
+        """
+        :param loadSpools: function(databaseIds) -> dict databaseId -> SpoolModel, None if the database call failed
+        """
+        self._logger = logging.getLogger(__name__)
+        self._loadSpools = loadSpools
+        self._lock = threading.RLock()
+        self._version = 0
+        self._databaseIds = []
+        # databaseId -> SpoolModel, None if the spool doesn't exist (anymore)
+        self._spoolModelsById = {}
+
+    def getVersion(self):
+        return self._version
+
+    def getSelectedSpools(self, databaseIds):
+        """
+        :param databaseIds: selected databaseId for each tool (None for no selection)
+        :return: copy of the SpoolModel for each tool, None if not selected or not in the database
+        """
+        with self._lock:
+            if databaseIds != self._databaseIds:
+                # changed outside of the plugin, e.g. settings restored
+                self._databaseIds = list(databaseIds)
+                self._version += 1
+            # ids from older settings (QR code selection) could be strings
+            databaseIds = [toDatabaseId(databaseId) for databaseId in databaseIds]
+            missingDatabaseIds = [
+                databaseId
+                for databaseId in databaseIds
+                if databaseId != None and databaseId not in self._spoolModelsById
+            ]
+            if len(missingDatabaseIds) > 0:
+                self._loadMissingSpools(missingDatabaseIds)
+            return [
+                (
+                    None
+                    if databaseId == None
+                    or self._spoolModelsById.get(databaseId) == None
+                    else copySpoolModel(self._spoolModelsById[databaseId])
+                )
+                for databaseId in databaseIds
+            ]
+
+    def _loadMissingSpools(self, databaseIds):
+        spoolModelsById = self._loadSpools(databaseIds)
+        if spoolModelsById == None:
+            # database not available, try again with the next read
+            return
+        for databaseId in databaseIds:
+            self._spoolModelsById[databaseId] = spoolModelsById.get(databaseId)
+        self._version += 1
+
+    def setSelection(self, databaseIds, spoolModel=None):
+        """
+        selection changed by the plugin, spoolModel is the (already loaded) new selected spool
+        """
+        with self._lock:
+            self._databaseIds = list(databaseIds)
+            if spoolModel != None:
+                self._spoolModelsById[spoolModel.databaseId] = copySpoolModel(
+                    spoolModel
+                )
+            self._version += 1
+
+    def updateSpool(self, spoolModel):
+        """
+        spool was stored in the database, only cached spools are updated
+        """
+        self.updateSpools([spoolModel])
+
+    def updateSpools(self, spoolModels):
+        with self._lock:
+            changed = False
+            for spoolModel in spoolModels:
+                if spoolModel.databaseId in self._spoolModelsById:
+                    self._spoolModelsById[spoolModel.databaseId] = copySpoolModel(
+                        spoolModel
+                    )
+                    changed = True
+            if changed:
+                self._version += 1
+
+    def removeSpool(self, databaseId):
+        """
+        spool was deleted from the database
+        """
+        with self._lock:
+            if self._spoolModelsById.get(databaseId) != None:
+                self._spoolModelsById[databaseId] = None
+                self._version += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._logger.info("Selected spools cache invalidated")
+            self._spoolModelsById = {}
+            self._version += 1
@@ -0,0 +1,155 @@
+# coding=utf-8
+import json
+import threading
+import uuid
+from collections import Counter
+
+
+def readSpoolLabels(labels):
+    """
+    :param labels: JSON value of SpoolModel.labels
+    :return: tuple of the labels, without duplicates
+    """
+    if labels == None:
+        return ()
+    try:
+        spoolLabels = json.loads(labels)
+    except ValueError:
+        return ()
+    if spoolLabels == None:
+        return ()
+    return tuple(dict.fromkeys(spoolLabels))
+
+
+def _readCatalogValues(spoolModel):
+    """
+    :return: (vendor, material, labels, colorKey) of the spool, None for not present values
+    """
+    labels = readSpoolLabels(spoolModel.labels)
+    colorKey = None
+    if spoolModel.color != None and spoolModel.colorName:
+        colorKey = (spoolModel.color, spoolModel.colorName)
+    return (spoolModel.vendor, spoolModel.material, labels, colorKey)
+
+
+class SpoolCatalogs:
+    """
+    Vendors, materials, labels and colors of all spools, loaded once with a single table scan and then
+    maintained on spool save/delete. Every value is reference counted and disappears with the last spool using it.
+    The version changes with every change of the catalogs, so a client could skip catalogs it already has.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # the counter restarts with OctoPrint, the instance part makes old client versions invalid
+        self._instanceId = uuid.uuid4().hex[:8]
+        self._versionCounter = 0
+        self._loaded = False
+        self._valuesById = {}
+        self._vendors = Counter()
+        self._materials = Counter()
+        self._labels = Counter()
+        self._colors = Counter()
+
+    def isLoaded(self):
+        return self._loaded
+
+    def getVersion(self):
+        return "%s-%d" % (self._instanceId, self._versionCounter)
+
+    def load(self, spoolModels):
+        with self._lock:
+            self._clear()
+            for spoolModel in spoolModels:
+                self._addValues(spoolModel.databaseId, _readCatalogValues(spoolModel))
+            self._loaded = True
+            self._versionCounter += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._clear()
+            self._loaded = False
+            self._versionCounter += 1
+
+    def updateSpool(self, spoolModel):
+        """
+        spool was created/updated in the database
+        """
+        with self._lock:
+            if self._loaded == False:
+                return
+            newValues = _readCatalogValues(spoolModel)
+            oldValues = self._valuesById.get(spoolModel.databaseId)
+            if oldValues == newValues:
+                return
+            if oldValues != None:
+                self._removeValues(spoolModel.databaseId)
+            self._addValues(spoolModel.databaseId, newValues)
+            self._versionCounter += 1
+
+    def removeSpool(self, databaseId):
+        """
+        spool was deleted from the database
+        """
+        with self._lock:
+            if self._loaded == False or databaseId not in self._valuesById:
+                return
+            self._removeValues(databaseId)
+            self._versionCounter += 1
+
+    def getCatalogs(self):
+        """
+        :return: (version, dict with vendors, materials, labels and colors)
+        """
+        with self._lock:
+            vendors = [""] + [vendor for vendor in self._vendors if vendor != ""]
+            colors = [
+                {
+                    "colorId": color + ";" + colorName,
+                    "color": color,
+                    "colorName": colorName,
+                }
+                for color, colorName in self._colors
+            ]
+            catalogs = {
+                "vendors": vendors,
+                "materials": list(self._materials),
+                "labels": list(self._labels),
+                "colors": colors,
+            }
+            return (self.getVersion(), catalogs)
+
+    def _clear(self):
+        self._valuesById = {}
+        self._vendors = Counter()
+        self._materials = Counter()
+        self._labels = Counter()
+        self._colors = Counter()
+
+    def _addValues(self, databaseId, values):
+        vendor, material, labels, colorKey = values
+        self._valuesById[databaseId] = values
+        if vendor != None:
+            self._vendors[vendor] += 1
+        if material != None:
+            self._materials[material] += 1
+        for label in labels:
+            self._labels[label] += 1
+        if colorKey != None:
+            self._colors[colorKey] += 1
+
+    def _removeValues(self, databaseId):
+        vendor, material, labels, colorKey = self._valuesById.pop(databaseId)
+        if vendor != None:
+            self._decrease(self._vendors, vendor)
+        if material != None:
+            self._decrease(self._materials, material)
+        for label in labels:
+            self._decrease(self._labels, label)
+        if colorKey != None:
+            self._decrease(self._colors, colorKey)
+
+    def _decrease(self, counter, value):
+        counter[value] -= 1
+        if counter[value] <= 0:
+            del counter[value]
@@ -0,0 +1,57 @@
+# coding=utf-8
+import threading
+from collections import OrderedDict
+
+
+class SpoolCounts:
+    """
+    Spool count per filter signature of the table, until the next change of the spools.
+    A count is only stored if no clear() happened since its query started (generation), so a count of a query that
+    raced with a save/delete can't come back. The filter values come from the clients, the least recently used
+    counts are dropped above maxSize.
+    """
+
+    def __init__(self, maxSize):
+        self._lock = threading.Lock()
+        self._maxSize = maxSize
+        self._generation = 0
+        self._countsBySignature = OrderedDict()
+
+    def getGeneration(self):
+        """
+        :return: generation to pass to put(), read before the count query
+        """
+        with self._lock:
+            return self._generation
+
+    def get(self, filterSignature):
+        """
+        :return: cached count or None
+        """
+        with self._lock:
+            count = self._countsBySignature.get(filterSignature)
+            if count != None:
+                self._countsBySignature.move_to_end(filterSignature)
+            return count
+
+    def put(self, filterSignature, count, generation):
+        """
+        :return: False if the spools changed since the generation was read, the count is not stored
+        """
+        with self._lock:
+            if generation != self._generation:
+                return False
+            self._countsBySignature[filterSignature] = count
+            self._countsBySignature.move_to_end(filterSignature)
+            while len(self._countsBySignature) > self._maxSize:
+                self._countsBySignature.popitem(last=False)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._countsBySignature.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._countsBySignature)
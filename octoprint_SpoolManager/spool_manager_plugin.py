@@ -1,18 +1,47 @@
-import math
+import os
+import threading
 from datetime import datetime
 
 import flask
 import octoprint.plugin
 from octoprint.events import Events
+from octoprint.filemanager import FileDestinations
+from octoprint.util import RepeatedTimer
 
 from octoprint_SpoolManager.api import Transformer
-from octoprint_SpoolManager.api.SpoolManagerAPI import SpoolManagerAPI
+from octoprint_SpoolManager.api.SpoolManagerAPI import (
+    LABEL_RENDER_IDLE_SECONDS,
+    SpoolManagerAPI,
+)
 from octoprint_SpoolManager.common import StringUtils
 from octoprint_SpoolManager.common.EventBusKeys import EventBusKeys
 from octoprint_SpoolManager.common.SettingsKeys import SettingsKeys
 from octoprint_SpoolManager.DatabaseManager import DatabaseManager
 from octoprint_SpoolManager.db import DatabaseSettings
+from octoprint_SpoolManager.debounced_task import DebouncedTask
 from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+from octoprint_SpoolManager.gcode_file_analyzer import (
+    CHECKPOINT_INDEX_METADATA_KEY,
+    FILE_METADATA_KEY,
+    analyseGCodeFile,
+    buildCheckpointIndex,
+    remainingFilamentFromOffset,
+)
+from octoprint_SpoolManager.idle_executor import IdleExecutor
+from octoprint_SpoolManager.odometer_checkpoint import OdometerCheckpoint
+from octoprint_SpoolManager.odometer_queue import OdometerQueue
+from octoprint_SpoolManager.qr_code_cache import QRCodeCache, loadLogoImage
+from octoprint_SpoolManager.required_weight import (
+    calculateWeight,
+    createRequiredWeightSnapshot,
+    evaluateRequiredWeight,
+)
+from octoprint_SpoolManager.selected_spools_cache import SelectedSpoolsCache
+
+# delay of the initial data after a client opened, the client needs some time until it receives plugin messages
+INITIAL_DATA_DELAY_SECONDS = 3
+# clients opening all the time (e.g. reconnects) don't postpone the initial data longer than this
+INITIAL_DATA_MAX_WAIT_SECONDS = 10
 
 
 class SpoolmanagerPlugin(
@@ -22,12 +51,18 @@ class SpoolmanagerPlugin(
     octoprint.plugin.AssetPlugin,
     octoprint.plugin.TemplatePlugin,
     octoprint.plugin.StartupPlugin,
+    octoprint.plugin.ShutdownPlugin,
     octoprint.plugin.EventHandlerPlugin,
 ):
-    def __init__(self, filament_odometer: FilamentOdometer) -> None:
+    def __init__(
+        self, filament_odometer: FilamentOdometer, odometer_queue: OdometerQueue = None
+    ) -> None:
         super().__init__()
 
         self.myFilamentOdometer = filament_odometer
+        if odometer_queue is None:
+            odometer_queue = OdometerQueue(filament_odometer)
+        self.myOdometerQueue = odometer_queue
 
     def initialize(self):
         self._logger.info("Start initializing")
@@ -43,18 +78,71 @@ class SpoolmanagerPlugin(
 
         # init database
         self._databaseManager.initDatabase(databaseSettings, self._sendMessageToClient)
+        self._selectedSpoolsCache = SelectedSpoolsCache(
+            self._databaseManager.loadSpools
+        )
 
-        self.myFilamentOdometer.set_extrusion_changed_listener(self._extrusionValuesChanged)
+        self.myFilamentOdometer.set_extrusion_changed_listener(
+            self._extrusionValuesChanged,
+            self._settings.get_int(
+                [SettingsKeys.SETTINGS_KEY_EXTRUSION_NOTIFICATIONS_PER_SECOND]
+            ),
+        )
         self.myFilamentOdometer.set_g90_extruder(
             self._settings.get_boolean(["feature", "g90InfluencesExtruder"])
         )
+        if self._settings.get_boolean(
+            [SettingsKeys.SETTINGS_KEY_ASYNC_ODOMETER_ENABLED]
+        ):
+            self.myOdometerQueue.start(
+                self._settings.get_int(
+                    [SettingsKeys.SETTINGS_KEY_ASYNC_ODOMETER_QUEUE_SIZE]
+                )
+            )
 
         self._filamentManagerPluginImplementation = None
         self._filamentManagerPluginImplementationState = None
 
         self._lastPrintState = None
 
-        self.metaDataFilamentLengths = []
+        self._fileAnalysisLock = threading.Lock()
+        self._runningFileAnalysis = set()
+
+        self._commitLock = threading.RLock()
+        self._incrementalCommitTimer = None
+
+        self._odometerCheckpoint = OdometerCheckpoint(
+            os.path.join(self.get_plugin_data_folder(), "odometer.checkpoint")
+        )
+
+        # QR codes: logo decoded once, rendered images cached in memory and in the data folder
+        logoImage, logoFingerprint = loadLogoImage(
+            os.path.join(self._basefolder, "static", "images", "SPMByOlli.png")
+        )
+        self._qrCodeCache = QRCodeCache(
+            os.path.join(self.get_plugin_data_folder(), "qrcodes"),
+            logoImage,
+            logoFingerprint,
+        )
+        # allowedToPrint result of the selected file: (key, result), see getAllowedToPrintResult
+        self._allowedToPrintCache = None
+        self._allowedToPrintLock = threading.Lock()
+        # increased with every settings save, part of the allowedToPrint key
+        self._settingsVersion = 0
+
+        # process pool for the label sheets, started on first use and stopped when idle
+        self._labelRenderExecutor = IdleExecutor(
+            self._createLabelRenderExecutor, LABEL_RENDER_IDLE_SECONDS
+        )
+
+        # start-workaround https://github.com/foosel/OctoPrint/issues/3400
+        # the initial data is sent later in a worker thread, not on the event thread
+        self._initialDataTask = DebouncedTask(
+            self._sendInitialData,
+            INITIAL_DATA_DELAY_SECONDS,
+            "SpoolManagerInitialData",
+            INITIAL_DATA_MAX_WAIT_SECONDS,
+        )
 
         self.alreadyCanceled = False
 
@@ -64,8 +152,8 @@ class SpoolmanagerPlugin(
         """
         Checks if all spools or single spool includes enough filament
 
-        :param forToolIndex check only for the provided toolIndex
-        :return: see
+        :param forToolIndex warn only for the provided toolIndex
+        :return: see _evaluateRequiredWeight
         """
         shouldWarn = self._settings.get_boolean(
             [SettingsKeys.SETTINGS_KEY_WARN_IF_FILAMENT_NOT_ENOUGH]
@@ -74,10 +162,8 @@ class SpoolmanagerPlugin(
         # - check, if spool change in pause-mode
 
         # - check if new spool fits for current printjob
-        selectedSpools = self.loadSelectedSpools()
-
         requiredWeightResult = self._evaluateRequiredWeight(
-            selectedSpools, forToolIndex, shouldWarn
+            self._createRequiredWeightSnapshot(), forToolIndex, shouldWarn
         )
 
         # for a single check, don't send the info to the browser
@@ -253,8 +339,12 @@ class SpoolmanagerPlugin(
             )
 
     def _readingFilamentMetaData(self):
+        """
+        :return: filament length per tool of the selected file (only the not printed part during a print),
+        empty if unknown
+        """
         filamentLengthPresentInMeta = False
-        self.metaDataFilamentLengths = []
+        filamentLengths = []
         if "job" in self._printer.get_current_data():
             jobData = self._printer.get_current_data()["job"]
             if "file" in jobData:
@@ -269,194 +359,216 @@ class SpoolmanagerPlugin(
                                 "filament"
                             ].items():
                                 toolIndex = int(toolName[4:])
-                                self.metaDataFilamentLengths += [0.0] * (
-                                    toolIndex + 1 - len(self.metaDataFilamentLengths)
+                                filamentLengths += [0.0] * (
+                                    toolIndex + 1 - len(filamentLengths)
                                 )
-                                self.metaDataFilamentLengths[toolIndex] = toolData[
-                                    "length"
-                                ]
+                                filamentLengths[toolIndex] = toolData["length"]
                                 filamentLengthPresentInMeta = True
-        return filamentLengthPresentInMeta
+                    if filamentLengthPresentInMeta == False and metadata is not None:
+                        analysedLengths = self._loadFilamentLengthsFromFileAnalysis(
+                            origin, path, metadata
+                        )
+                        if analysedLengths is not None:
+                            filamentLengths = list(analysedLengths)
+                            filamentLengthPresentInMeta = True
+                    if filamentLengthPresentInMeta and (
+                        self._printer.is_printing() or self._printer.is_paused()
+                    ):
+                        # during a print (e.g. spool swap) only the not printed part is required
+                        remainingLengths = self._loadRemainingFilamentLengths(
+                            origin, path, metadata
+                        )
+                        if remainingLengths is not None:
+                            filamentLengths = remainingLengths
+        return filamentLengths
+
+    def _loadRemainingFilamentLengths(self, origin, path, metadata, filePos=None):
+        checkpointIndex = self._loadCheckpointIndex(origin, path, metadata)
+        if checkpointIndex is None:
+            return None
+        if filePos is None:
+            filePos = self._printer.get_current_data()["progress"]["filepos"]
+            if filePos is None:
+                return None
+        return remainingFilamentFromOffset(
+            self._file_manager.path_on_disk(origin, path), checkpointIndex, filePos
+        )
 
-    def _evaluateRequiredWeight(
-        self, selectedSpools, forToolIndex=None, warnUser=False
-    ):
+    def _loadCheckpointIndex(self, origin, path, metadata):
+        if origin != FileDestinations.LOCAL or metadata is None:
+            return None
+        checkpointIndex = metadata.get(CHECKPOINT_INDEX_METADATA_KEY)
+        if checkpointIndex is not None and checkpointIndex.get("hash") == metadata.get(
+            "hash"
+        ):
+            return checkpointIndex
+        return None
 
-        self._readingFilamentMetaData()
-        metaDataMissing = len(self.metaDataFilamentLengths) <= 0
-        someAttributesMissing = False
-        overallNotEnough = False
-        requiredWeightResultDict = {
-            "metaDataMissing": metaDataMissing,
-            "warnUser": warnUser,
-            "attributesMissing": someAttributesMissing,
-            "notEnough": overallNotEnough,
-            "detailedSpoolResult": [],
-        }
-        if metaDataMissing == True:
-            return requiredWeightResultDict
-
-        # loop over all tools
-        for toolIndex, filamentLength in enumerate(self.metaDataFilamentLengths):
-            if forToolIndex is not None and forToolIndex != toolIndex:
-                continue
-            selectedSpool = (
-                selectedSpools[toolIndex] if toolIndex < len(selectedSpools) else None
+    def buildCheckpointIndex(self, origin, path, fileHash):
+        """
+        Odometer snapshots every n KB of the file, so the remaining filament from any file position is
+        a short scan. The index is stored in the file metadata and reused for every print of the file.
+        """
+        filePath = self._file_manager.path_on_disk(origin, path)
+        self._logger.info("Start building checkpoint index of '" + filePath + "'")
+        checkpointIndex = buildCheckpointIndex(
+            filePath,
+            self._settings.get_boolean(["feature", "g90InfluencesExtruder"]),
+            self._settings.get_int(
+                [SettingsKeys.SETTINGS_KEY_CHECKPOINT_INDEX_INTERVAL_KB]
             )
+            * 1024,
+        )
+        checkpointIndex["hash"] = fileHash
+        self._file_manager.set_additional_metadata(
+            origin,
+            path,
+            CHECKPOINT_INDEX_METADATA_KEY,
+            checkpointIndex,
+            overwrite=True,
+        )
+        self._logger.info(
+            "Checkpoint index of '"
+            + filePath
+            + "' with "
+            + str(len(checkpointIndex["checkpoints"]))
+            + " checkpoints stored"
+        )
+        return checkpointIndex
 
-            if selectedSpool != None:
-                diameter = selectedSpool.diameter
-                density = selectedSpool.density
-                totalWeight = selectedSpool.totalWeightInGram
-                usedWeight = selectedSpool.usedWeightInGram
-
-                # need attributes present: diameter, density, totalWeight
-                missing_fields = []
-                if diameter is None:
-                    missing_fields.append("diameter")
-                if density is None:
-                    missing_fields.append("density")
-                if totalWeight is None:
-                    missing_fields.append("total weight")
-                if usedWeight is None:
-                    usedWeight = 0.0
-
-                if missing_fields:
-                    if warnUser == True:
-                        self._sendMessageToClient(
-                            "warning",
-                            "Filament prediction not possible!",
-                            "Following fields not set in Spool '%s' (in tool %d): %s"
-                            % (
-                                selectedSpool.displayName,
-                                toolIndex,
-                                ", ".join(missing_fields),
-                            ),
-                        )
-                    someAttributesMissing = True
-                else:
-                    not_a_number_fields = []
-                    try:
-                        diameter = float(diameter)
-                    except ValueError:
-                        not_a_number_fields.append("diameter")
-                    try:
-                        density = float(density)
-                    except ValueError:
-                        not_a_number_fields.append("density")
-                    try:
-                        totalWeight = float(totalWeight)
-                    except ValueError:
-                        not_a_number_fields.append("totalweight")
-                    try:
-                        usedWeight = float(usedWeight)
-                    except ValueError:
-                        not_a_number_fields.append("used weight")
-
-                    if not_a_number_fields:
-                        if warnUser == True:
-                            self._sendMessageToClient(
-                                "warning",
-                                "Filament prediction not possible!",
-                                "One of the needed fields are not a number in Spool '%s' (in tool %d): %s"
-                                % (
-                                    selectedSpool.displayName,
-                                    toolIndex,
-                                    ", ".join(not_a_number_fields),
-                                ),
-                            )
-                        someAttributesMissing = True
-                    else:
-                        # Benötigtes Gewicht = gewicht(geplante länge, durchmesser, dichte)
-                        requiredWeight = self._calculateWeight(
-                            filamentLength, diameter, density
-                        )
+    def _startBackgroundFileTask(self, path, task, *args):
+        """
+        run the task in a separate thread, but only once per path at the same time
+        """
+        taskKey = (task.__name__, path)
+        with self._fileAnalysisLock:
+            if taskKey in self._runningFileAnalysis:
+                return
+            self._runningFileAnalysis.add(taskKey)
 
-                        # Vorhanden Gewicht = Gesamtgewicht - Verbrauchtes Gewicht
-                        # TODO don't calculate here use the value from the database
-                        remainingWeight = totalWeight - usedWeight
+        def runTask():
+            try:
+                task(*args)
+            except Exception:
+                self._logger.exception(
+                    "Background task '" + task.__name__ + "' for '" + path + "' failed"
+                )
+            finally:
+                with self._fileAnalysisLock:
+                    self._runningFileAnalysis.discard(taskKey)
 
-                        saftyLengthInMM = self._settings.get_int(
-                            [SettingsKeys.SETTINGS_KEY_SAFETY_LENGTH]
-                        )
-                        if saftyLengthInMM != 0:
-                            saftyRequiredWeight = self._calculateWeight(
-                                saftyLengthInMM, diameter, density
-                            )
-                            self._logger.info(
-                                "saftyWeight '"
-                                + str(saftyRequiredWeight)
-                                + "' from saftyLengthInMM '"
-                                + str(saftyLengthInMM)
-                                + "' calculated"
-                            )
-                            requiredWeight = requiredWeight + saftyRequiredWeight
-
-                        self._logger.info(
-                            "tool"
-                            + str(toolIndex)
-                            + ", requiredWeight '"
-                            + str(requiredWeight)
-                            + "',  remainingWeight '"
-                            + str(remainingWeight)
-                            + "'"
-                        )
+        thread = threading.Thread(target=runTask)
+        thread.daemon = True
+        thread.start()
 
-                        notEnough = False
-                        if remainingWeight < requiredWeight and requiredWeight > 0:
-                            self._logger.info("Filament not enough!")
-                            if warnUser == True:
-                                self._sendMessageToClient(
-                                    "warning",
-                                    "Filament not enough!",
-                                    "Required on tool %d: %dg, available from Spool '%s': '%dg'"
-                                    % (
-                                        toolIndex,
-                                        requiredWeight,
-                                        selectedSpool.displayName,
-                                        remainingWeight,
-                                    ),
-                                )
-                            notEnough = True
-                            overallNotEnough = True
-
-                        detailedSpoolResultItem = {
-                            "toolIndex": toolIndex,
-                            "requiredWeight": requiredWeight,
-                            "requiredLength": filamentLength,
-                            "remainingWeight": remainingWeight,
-                            "diameter": diameter,
-                            "density": density,
-                            "notEnough": notEnough,
-                            "spoolSelected": True,
-                            "spoolName": selectedSpool.displayName,
-                        }
-                        requiredWeightResultDict["detailedSpoolResult"].append(
-                            detailedSpoolResultItem
-                        )
-            else:
-                # No selected spool for this tool-index, just create an simple entry
-                detailedSpoolResultItem = {
-                    "toolIndex": toolIndex,
-                    "requiredLength": filamentLength,
-                    "spoolSelected": False,
-                    "spoolName": "not selected",
-                }
-                requiredWeightResultDict["detailedSpoolResult"].append(
-                    detailedSpoolResultItem
-                )
-                pass
+    def _loadFilamentLengthsFromFileAnalysis(
+        self, origin, path, metadata, startAnalysis=True
+    ):
+        """
+        Fallback, if OctoPrint provides no filament analysis: use the result of our own file analysis.
+        If not already done, the analysis is started in the background and the client is informed when done.
+        """
+        if origin != FileDestinations.LOCAL:
+            return None
+        fileHash = metadata.get("hash")
+        fileAnalysis = metadata.get(FILE_METADATA_KEY)
+        if fileAnalysis is not None and fileAnalysis.get("hash") == fileHash:
+            return fileAnalysis["filamentLengths"]
+
+        if startAnalysis:
+            self._startBackgroundFileTask(
+                path, self._analyseFileAsync, origin, path, fileHash
+            )
+        return None
 
-        requiredWeightResultDict["attributesMissing"] = someAttributesMissing
-        requiredWeightResultDict["notEnough"] = overallNotEnough
+    def analyseFile(self, origin, path, fileHash):
+        filePath = self._file_manager.path_on_disk(origin, path)
+        self._logger.info("Start filament analysis of '" + filePath + "'")
+        filamentLengths = analyseGCodeFile(
+            filePath, self._settings.get_boolean(["feature", "g90InfluencesExtruder"])
+        )
+        self._file_manager.set_additional_metadata(
+            origin,
+            path,
+            FILE_METADATA_KEY,
+            {"hash": fileHash, "filamentLengths": filamentLengths},
+            overwrite=True,
+        )
+        self._logger.info(
+            "Filament analysis of '" + filePath + "' done: " + str(filamentLengths)
+        )
+        return filamentLengths
 
+    def _analyseFileAsync(self, origin, path, fileHash):
+        self.analyseFile(origin, path, fileHash)
+        self.invalidateAllowedToPrint()
+        # data for the sidebar
+        self.checkRemainingFilament()
+
+    def _createRequiredWeightSnapshot(self):
+        """
+        File metadata, selected spools and settings for _evaluateRequiredWeight, each read once
+        """
+        return createRequiredWeightSnapshot(
+            self._readingFilamentMetaData(),
+            self.loadSelectedSpools(),
+            self._settings.get_int([SettingsKeys.SETTINGS_KEY_SAFETY_LENGTH]),
+        )
+
+    def _evaluateRequiredWeight(self, snapshot, forToolIndex=None, warnUser=False):
+        """
+        Required weight of all tools, see required_weight.evaluateRequiredWeight
+
+        :param forToolIndex warn only for the provided toolIndex
+        """
+        requiredWeightResultDict = evaluateRequiredWeight(snapshot)
+        requiredWeightResultDict["warnUser"] = warnUser
+        if warnUser == True:
+            for detailedSpoolResult in requiredWeightResultDict["detailedSpoolResult"]:
+                if (
+                    forToolIndex is None
+                    or forToolIndex == detailedSpoolResult["toolIndex"]
+                ):
+                    self._warnAboutRequiredWeight(detailedSpoolResult)
         return requiredWeightResultDict
 
-    def _calculateWeight(self, length, diameter, density):
-        radius = diameter / 2.0
-        volume = length * math.pi * (radius * radius) / 1000
-        result = volume * density
-        return result
+    def _warnAboutRequiredWeight(self, detailedSpoolResult):
+        if detailedSpoolResult["spoolSelected"] == False:
+            return
+        if len(detailedSpoolResult["missingFields"]) > 0:
+            self._sendMessageToClient(
+                "warning",
+                "Filament prediction not possible!",
+                "Following fields not set in Spool '%s' (in tool %d): %s"
+                % (
+                    detailedSpoolResult["spoolName"],
+                    detailedSpoolResult["toolIndex"],
+                    ", ".join(detailedSpoolResult["missingFields"]),
+                ),
+            )
+        elif len(detailedSpoolResult["invalidFields"]) > 0:
+            self._sendMessageToClient(
+                "warning",
+                "Filament prediction not possible!",
+                "One of the needed fields are not a number in Spool '%s' (in tool %d): %s"
+                % (
+                    detailedSpoolResult["spoolName"],
+                    detailedSpoolResult["toolIndex"],
+                    ", ".join(detailedSpoolResult["invalidFields"]),
+                ),
+            )
+        elif detailedSpoolResult["notEnough"] == True:
+            self._sendMessageToClient(
+                "warning",
+                "Filament not enough!",
+                "Required on tool %d: %dg, available from Spool '%s': '%dg'"
+                % (
+                    detailedSpoolResult["toolIndex"],
+                    detailedSpoolResult["requiredWeight"],
+                    detailedSpoolResult["spoolName"],
+                    detailedSpoolResult["remainingWeight"],
+                ),
+            )
 
     def _buildDatabaseSettingsFromPluginSettings(self):
         databaseSettings = DatabaseSettings()
@@ -481,6 +593,15 @@ class SpoolmanagerPlugin(
         databaseSettings.password = self._settings.get(
             [SettingsKeys.SETTINGS_KEY_DATABASE_PASSWORD]
         )
+        databaseSettings.poolEnabled = self._settings.get_boolean(
+            [SettingsKeys.SETTINGS_KEY_DATABASE_POOL_ENABLED]
+        )
+        databaseSettings.poolSize = self._settings.get_int(
+            [SettingsKeys.SETTINGS_KEY_DATABASE_POOL_SIZE]
+        )
+        databaseSettings.poolIdleTimeout = self._settings.get_int(
+            [SettingsKeys.SETTINGS_KEY_DATABASE_POOL_IDLE_TIMEOUT]
+        )
         pluginDataBaseFolder = self.get_plugin_data_folder()
         databaseSettings.baseFolder = pluginDataBaseFolder
         databaseSettings.fileLocation = (
@@ -527,12 +648,23 @@ class SpoolmanagerPlugin(
     def _on_printJobStarted(self):
         # starting new print
 
-        self.myFilamentOdometer.reset()
+        # extrusion of a previous print, that could not be committed
+        self._recoverOdometerCheckpoint()
+
+        printerProfile = self._printer_profile_manager.get_current_or_default()
+        with self.myOdometerQueue.drained():
+            self.myFilamentOdometer.set_extruder_count(
+                printerProfile["extruder"]["count"]
+            )
+            self.myFilamentOdometer.reset()
+
+        self._startOdometerCheckpoints()
+        self._startIncrementalCommits()
+        self._prepareCheckpointIndex()
 
         reloadTable = False
         selectedSpools = self.loadSelectedSpools()
-        self._readingFilamentMetaData()
-        for toolIndex, filamentLength in enumerate(self.metaDataFilamentLengths):
+        for toolIndex, filamentLength in enumerate(self._readingFilamentMetaData()):
             spoolModel = (
                 selectedSpools[toolIndex] if toolIndex < len(selectedSpools) else None
             )
@@ -541,54 +673,119 @@ class SpoolmanagerPlugin(
                 if StringUtils.isEmpty(spoolModel.firstUse) == True:
                     firstUse = datetime.now()
                     spoolModel.firstUse = firstUse
-                    self._databaseManager.saveSpool(spoolModel)
+                    if self._databaseManager.saveSpool(spoolModel) != None:
+                        self._selectedSpoolsCache.updateSpool(spoolModel)
                     reloadTable = True
         if reloadTable:
             self._sendDataToClient(dict(action="reloadTable"))
 
+    def _prepareCheckpointIndex(self):
+        # needed for spool swaps during the print, build it in the background if not already present
+        jobFile = self._printer.get_current_data()["job"]["file"]
+        origin = jobFile["origin"]
+        path = jobFile["path"]
+        if origin != FileDestinations.LOCAL or path is None:
+            return
+        metadata = self._file_manager.get_metadata(origin, path)
+        if (
+            metadata is None
+            or self._loadCheckpointIndex(origin, path, metadata) is not None
+        ):
+            return
+        self._startBackgroundFileTask(
+            path, self.buildCheckpointIndex, origin, path, metadata.get("hash")
+        )
+
+    def _startOdometerCheckpoints(self):
+        intervalSeconds = self._settings.get_int(
+            [SettingsKeys.SETTINGS_KEY_ODOMETER_CHECKPOINT_INTERVAL]
+        )
+        if intervalSeconds > 0:
+            self._odometerCheckpoint.start(self.myFilamentOdometer, intervalSeconds)
+
+    def _stopOdometerCheckpoints(self):
+        # everything is committed, nothing to recover
+        self._odometerCheckpoint.stop()
+        self._odometerCheckpoint.remove()
+
+    def _recoverOdometerCheckpoint(self):
+        """
+        OctoPrint was stopped during a print (or the final commit failed), the extrusion since the last commit is
+        only in the checkpoint
+        """
+        checkpoint = self._odometerCheckpoint.read()
+        if checkpoint is None:
+            self._odometerCheckpoint.remove()
+            return
+        state, timestamp = checkpoint
+        self._logger.info(
+            "Recover odometer checkpoint from %s, extrusion per tool: %s"
+            % (datetime.fromtimestamp(timestamp), str(state["maxExtrusion"]))
+        )
+        with self.myOdometerQueue.drained():
+            self.myFilamentOdometer.setState(state)
+            try:
+                committed = self._commitOdometerData()
+            except Exception:
+                self._logger.exception("Could not commit recovered odometer checkpoint")
+                committed = False
+            finally:
+                self.myFilamentOdometer.reset()
+        if committed == False:
+            # keep the checkpoint, maybe the database is available on the next start
+            return
+        self._odometerCheckpoint.remove()
+
     # assign the current extrusion to the current selected spools
 
-    def commitOdometerData(self):
-        reload = False
+    def commitOdometerData(self, incremental=False):
+        # all already sent lines must be counted, and no new line should be processed during the commit
+        with self._commitLock, self.myOdometerQueue.drained():
+            committed = self._commitOdometerData(incremental)
+            if self._odometerCheckpoint.isRunning():
+                self._odometerCheckpoint.write(self.myFilamentOdometer.getState())
+        return committed
+
+    def _commitOdometerData(self, incremental=False):
+        """
+        Adds the extrusion since the last commit to the selected spools, all spools are updated in one transaction.
+        incremental: the commit is during the print, the odometer continues and only the committed-watermark is moved,
+        otherwise the extruded length is reset. Both only if the spools are stored, else the extrusion stays in the
+        odometer (and its checkpoint) for the next commit
+        :return: False if the spools could not be stored
+        """
         selectedSpools = self.loadSelectedSpools()
+        allExtrusions = self.myFilamentOdometer.getExtrusionAmount()
+        committedExtrusions = self.myFilamentOdometer.getCommittedExtrusion()
+        # (databaseId, used length, used weight, last use) and the tool of each changed spool
+        spoolUsages = []
+        changedToolIndexes = []
         for toolIndex, spoolModel in enumerate(selectedSpools):
             if spoolModel is None:
-                self._logger.warning(
-                    "Tool %d: No spool selected, could not update values after print"
-                    % toolIndex
-                )
+                if incremental == False:
+                    self._logger.warning(
+                        "Tool %d: No spool selected, could not update values after print"
+                        % toolIndex
+                    )
                 continue
 
-            # - Last usage datetime
-            lastUsage = datetime.now()
-            spoolModel.lastUse = lastUsage
             # - Used length
-            try:
-                allExtrusions = self.myFilamentOdometer.getExtrusionAmount()
-                currentExtrusionLength = allExtrusions[toolIndex]
-            except (KeyError, IndexError) as e:
-                self._logger.info("Tool %d: No filament extruded" % toolIndex)
+            if toolIndex >= len(allExtrusions):
+                if incremental == False:
+                    self._logger.info("Tool %d: No filament extruded" % toolIndex)
+                continue
+            currentExtrusionLength = (
+                allExtrusions[toolIndex] - committedExtrusions[toolIndex]
+            )
+            if incremental and currentExtrusionLength <= 0.0:
+                # nothing new, no database traffic
                 continue
             self._logger.info(
                 "Tool %d: Extruded filament length: %s"
                 % (toolIndex, str(currentExtrusionLength))
             )
-            spoolUsedLength = (
-                0.0
-                if StringUtils.isEmpty(spoolModel.usedLength) == True
-                else spoolModel.usedLength
-            )
-            self._logger.info(
-                "Tool %d: Current Spool used filament length: %s"
-                % (toolIndex, str(spoolUsedLength))
-            )
-            newUsedLength = spoolUsedLength + currentExtrusionLength
-            self._logger.info(
-                "Tool %d: New Spool used filament length: %s"
-                % (toolIndex, str(newUsedLength))
-            )
-            spoolModel.usedLength = newUsedLength
             # - Used weight
+            usedWeight = None
             diameter = spoolModel.diameter
             density = spoolModel.density
             if diameter is None or density is None:
@@ -597,59 +794,122 @@ class SpoolmanagerPlugin(
                     % (toolIndex, spoolModel.displayName)
                 )
             else:
-                usedWeight = self._calculateWeight(
-                    currentExtrusionLength, diameter, density
+                usedWeight = calculateWeight(currentExtrusionLength, diameter, density)
+                self._logger.info(
+                    "Tool %d: Used weight: %s" % (toolIndex, str(usedWeight))
                 )
-                spoolUsedWeight = (
-                    0.0 if spoolModel.usedWeight == None else spoolModel.usedWeight
+            # added to the stored values by the database, not to the maybe outdated selected spool
+            spoolUsages.append(
+                (
+                    spoolModel.databaseId,
+                    currentExtrusionLength,
+                    usedWeight,
+                    datetime.now(),
                 )
-                newUsedWeight = spoolUsedWeight + usedWeight
-                spoolModel.usedWeight = newUsedWeight
+            )
+            changedToolIndexes.append(toolIndex)
+
+        committed = True
+        storedSpools = []
+        if len(spoolUsages) > 0:
+            storedSpools = self._databaseManager.saveSpoolsUsage(spoolUsages)
+            committed = storedSpools != None
+            if committed:
+                self._selectedSpoolsCache.updateSpools(storedSpools)
+            else:
+                # e.g. changed by an other instance, reload with the next read
+                self._selectedSpoolsCache.invalidate()
+
+        if committed:
+            for toolIndex, spoolModel in zip(changedToolIndexes, storedSpools):
                 self._logger.info(
-                    "Tool %d: spoolUsedWeight: %s" % (toolIndex, str(spoolUsedWeight))
+                    "Tool %d: New Spool used filament length: %s, used weight: %s"
+                    % (
+                        toolIndex,
+                        str(spoolModel.usedLengthInMM),
+                        str(spoolModel.usedWeightInGram),
+                    )
                 )
-                self._logger.info(
-                    "Tool %d: New spoolUsedWeight: %s" % (toolIndex, str(newUsedWeight))
+                eventPayload = {
+                    "toolId": toolIndex,
+                    "databaseId": spoolModel.databaseId,
+                    "spoolName": spoolModel.displayName,
+                    "material": spoolModel.material,
+                    "colorName": spoolModel.colorName,
+                    "remainingWeight": spoolModel.remainingWeightInGram,
+                }
+                self._sendPayload2EventBus(
+                    EventBusKeys.EVENT_BUS_SPOOL_WEIGHT_UPDATED_AFTER_PRINT,
+                    eventPayload,
                 )
 
-            self._databaseManager.saveSpool(spoolModel)
-
-            eventPayload = {
-                "toolId": toolIndex,
-                "databaseId": spoolModel.databaseId,
-                "spoolName": spoolModel.displayName,
-                "material": spoolModel.material,
-                "colorName": spoolModel.colorName,
-                "remainingWeight": spoolModel.remainingWeight,
-            }
-            self._sendPayload2EventBus(
-                EventBusKeys.EVENT_BUS_SPOOL_WEIGHT_UPDATED_AFTER_PRINT, eventPayload
-            )
+            if incremental:
+                self.myFilamentOdometer.setCommittedExtrusion(allExtrusions)
+            else:
+                self.myFilamentOdometer.reset_extruded_length()
+
+        if committed and len(spoolUsages) > 0:
+            self._sendDataToClient(dict(action="reloadTable and sidebarSpools"))
+        return committed
 
-            reload = True
+    def _startIncrementalCommits(self):
+        self._stopIncrementalCommits()
+        if (
+            self._settings.get_boolean(
+                [SettingsKeys.SETTINGS_KEY_INCREMENTAL_COMMIT_ENABLED]
+            )
+            == False
+        ):
+            return
+        intervalSeconds = self._settings.get_int(
+            [SettingsKeys.SETTINGS_KEY_INCREMENTAL_COMMIT_INTERVAL]
+        )
+        if intervalSeconds is None or intervalSeconds <= 0:
+            return
+        self._incrementalCommitTimer = RepeatedTimer(
+            intervalSeconds, self._commitIncrementally, daemon=True
+        )
+        self._incrementalCommitTimer.start()
 
-        self.myFilamentOdometer.reset_extruded_length()
+    def _stopIncrementalCommits(self):
+        if self._incrementalCommitTimer is not None:
+            self._incrementalCommitTimer.cancel()
+            self._incrementalCommitTimer = None
 
-        if reload:
-            self._sendDataToClient(dict(action="reloadTable and sidebarSpools"))
+    def _commitIncrementally(self):
+        if self._printer.is_printing() == False:
+            return
+        try:
+            self.commitOdometerData(incremental=True)
+        except Exception:
+            self._logger.exception("Incremental commit of the odometer data failed")
 
     def _on_printJobFinished(self, printStatus, payload):
-        self.commitOdometerData()
+        # deliver the final extrusion values, before they are committed and reset
+        self.myFilamentOdometer.flush_extrusion_changed_event()
+        committed = self.commitOdometerData()
 
         # update remaining data in selected spools after a print
-        selectedSpools = self.loadSelectedSpools()
-        requiredWeightResult = self._evaluateRequiredWeight(selectedSpools, None, False)
+        requiredWeightResult = self._evaluateRequiredWeight(
+            self._createRequiredWeightSnapshot()
+        )
         requiredWeightResult["action"] = "requiredFilamentChanged"
         self._sendDataToClient(requiredWeightResult)
 
         if "paused" != printStatus:
+            self._stopIncrementalCommits()
+            if committed:
+                self._stopOdometerCheckpoints()
+            else:
+                # the checkpoint keeps the extrusion, committed on the next print start or OctoPrint start
+                self._odometerCheckpoint.stop()
             self.clear_temp_offsets()
 
     def _on_clientOpened(self, payload):
-        # start-workaround https://github.com/foosel/OctoPrint/issues/3400
-        import time
+        # clients opened at the same time share one initial data push
+        self._initialDataTask.trigger()
 
-        time.sleep(3)
+    def _sendInitialData(self):
         selectedSpoolsAsDicts = []
 
         # Check if database is available
@@ -702,21 +962,27 @@ class SpoolmanagerPlugin(
         )
         # data for the sidebar
         self.checkRemainingFilament()
-        pass
 
     def _on_clientClosed(self, payload):
         self.databaseConnectionProblemConfirmed = False
 
     def _on_file_selectionChanged(self, payload):
+        self.invalidateAllowedToPrint()
         self.checkRemainingFilament()
+        # precompute, so the print start answers from memory
+        self.getAllowedToPrintResult()
 
     def api_getSelectedSpoolInformations(self):
         """
         Returns the current extruded filament for each tool
         :param string path:
-        :return: array of spoolData-object ....
+        :return: array of spoolData-object .... (with requiredLength/requiredWeight/notEnough of the selected file,
+        None if unknown)
         """
-        spoolModels = self.loadSelectedSpools()
+        snapshot = self._createRequiredWeightSnapshot()
+        requiredWeightResult = self._evaluateRequiredWeight(snapshot)
+        detailedSpoolResults = requiredWeightResult["detailedSpoolResult"]
+        spoolModels = snapshot.selectedSpools
         result = []
         toolIndex = 0
         while toolIndex < len(spoolModels):
@@ -736,11 +1002,28 @@ class SpoolmanagerPlugin(
                     "cost": spoolModel.cost,
                     "weight": spoolModel.totalWeightInGram,
                 }
+                detailedSpoolResult = (
+                    detailedSpoolResults[toolIndex]
+                    if toolIndex < len(detailedSpoolResults)
+                    else {}
+                )
+                spoolData["requiredLength"] = detailedSpoolResult.get("requiredLength")
+                spoolData["requiredWeight"] = detailedSpoolResult.get("requiredWeight")
+                spoolData["notEnough"] = detailedSpoolResult.get("notEnough")
             result.append(spoolData)
 
             toolIndex += 1
         return result
 
+    def invalidateSelectedSpoolsCache(self):
+        """
+        Drops the cached selected spools, catalogs and counts, they are reloaded from the database with the next access
+        """
+        self._selectedSpoolsCache.invalidate()
+        self._databaseManager.invalidateCaches()
+        self.invalidateAllowedToPrint()
+        self.checkRemainingFilament()
+
     def api_getExtrusionAmount(self):
         """
         Returns the current extruded filament for each tool
@@ -753,9 +1036,17 @@ class SpoolmanagerPlugin(
     def on_after_startup(self):
         # check if needed plugins were available
         self._checkForMissingPluginInfos()
+        # fill the cache, before the first client/event needs the selected spools
+        self._selectedSpoolsCache.getSelectedSpools(
+            self._settings.get([SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS])
+        )
+        self._recoverOdometerCheckpoint()
         pass
 
-
+    def on_shutdown(self):
+        self._initialDataTask.shutdown()
+        self._databaseManager.closePool()
+        self._labelRenderExecutor.shutdown()
 
     def on_event(self, event, payload):
         if Events.CLIENT_OPENED == event:
@@ -791,6 +1082,10 @@ class SpoolmanagerPlugin(
             self._on_file_selectionChanged(payload)
             return
 
+        if Events.METADATA_ANALYSIS_FINISHED == event:
+            # filament lengths of OctoPrint's analysis are now available
+            self.invalidateAllowedToPrint()
+
     def on_settings_save(self, data):
         # Enable cleaning up any offsets that are turned off
         oldToolOffsetEnabled = self._settings.get_boolean(
@@ -805,6 +1100,7 @@ class SpoolmanagerPlugin(
 
         # # default save function
         octoprint.plugin.SettingsPlugin.on_settings_save(self, data)
+        self._settingsVersion += 1
 
         # Clean up any offsets that are turned off
         newToolOffsetEnabled = self._settings.get_boolean(
@@ -834,8 +1130,7 @@ class SpoolmanagerPlugin(
 
         # Update Temperature Offsets
         selectedSpools = self.loadSelectedSpools()
-        self._readingFilamentMetaData()
-        for toolIndex, filamentLength in enumerate(self.metaDataFilamentLengths):
+        for toolIndex, filamentLength in enumerate(self._readingFilamentMetaData()):
             selectedSpool = (
                 selectedSpools[toolIndex] if toolIndex < len(selectedSpools) else None
             )
@@ -859,6 +1154,16 @@ class SpoolmanagerPlugin(
                 return flask.jsonify(self.get_settings_defaults())
 
             # because of some race conditions, we can't push the initalDate during client-open event. So we provide the settings on request
+            if "odometerQueueStatistics" == action:
+                return flask.jsonify(self.myOdometerQueue.getStatistics())
+
+            # e.g. the spools were changed by an other OctoPrint instance with the same external database
+            if "invalidateSelectedSpoolsCache" == action:
+                self.invalidateSelectedSpoolsCache()
+                return flask.jsonify(
+                    selectedSpoolsVersion=self._selectedSpoolsCache.getVersion()
+                )
+
             if "additionalSettingsValues" == action:
                 return flask.jsonify(
                     {
@@ -903,9 +1208,18 @@ class SpoolmanagerPlugin(
         settings[SettingsKeys.SETTINGS_KEY_BED_OFFSET_ENABLED] = False
         settings[SettingsKeys.SETTINGS_KEY_ENCLOSURE_OFFSET_ENABLED] = False
 
+        ## Odometer
+        settings[SettingsKeys.SETTINGS_KEY_ASYNC_ODOMETER_ENABLED] = False
+        settings[SettingsKeys.SETTINGS_KEY_ASYNC_ODOMETER_QUEUE_SIZE] = 10000
+        settings[SettingsKeys.SETTINGS_KEY_CHECKPOINT_INDEX_INTERVAL_KB] = 1024
+        settings[SettingsKeys.SETTINGS_KEY_ODOMETER_CHECKPOINT_INTERVAL] = 5
+        settings[SettingsKeys.SETTINGS_KEY_INCREMENTAL_COMMIT_ENABLED] = False
+        settings[SettingsKeys.SETTINGS_KEY_INCREMENTAL_COMMIT_INTERVAL] = 60
+
         ## Debugging
         settings[SettingsKeys.SETTINGS_KEY_SQL_LOGGING_ENABLED] = False
         settings[SettingsKeys.SETTINGS_KEY_EXTRUSION_DEBUGGING_ENABLED] = False
+        settings[SettingsKeys.SETTINGS_KEY_EXTRUSION_NOTIFICATIONS_PER_SECOND] = 2
 
         ## Database
         ## nested settings are not working, because if only a few attributes are changed it only returns these few attribuets, instead the default values + adjusted values
@@ -923,6 +1237,9 @@ class SpoolmanagerPlugin(
         settings[SettingsKeys.SETTINGS_KEY_DATABASE_NAME] = "SpoolDatabase"
         settings[SettingsKeys.SETTINGS_KEY_DATABASE_USER] = "Olli"
         settings[SettingsKeys.SETTINGS_KEY_DATABASE_PASSWORD] = "illO"
+        settings[SettingsKeys.SETTINGS_KEY_DATABASE_POOL_ENABLED] = True
+        settings[SettingsKeys.SETTINGS_KEY_DATABASE_POOL_SIZE] = 5
+        settings[SettingsKeys.SETTINGS_KEY_DATABASE_POOL_IDLE_TIMEOUT] = 300
         # {
         # 	"localDatabaseFileLocation": "",
         # 	"type": "postgres",
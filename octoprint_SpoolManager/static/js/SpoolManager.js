@@ -521,8 +521,12 @@ $(function() {
                 sortOrder: "desc"
             }
 
-            // api-call
-            self.apiClient.callLoadSpoolsByQuery(tableQuery, function(responseData){
+            // api-call, catalogs are only delivered if they changed since the last call
+            var query = $.extend({}, tableQuery);
+            if (self.catalogVersion != null){
+                query["catalogVersion"] = self.catalogVersion;
+            }
+            self.apiClient.callLoadSpoolsByQuery(query, function(responseData){
 
                 var allSpoolData = responseData["allSpools"]; // rawdtata
                 if (allSpoolData != null){
@@ -718,10 +722,17 @@ $(function() {
             e.stopPropagation();
         });
 
+        // version of the catalogs (vendors, materials,...) the table/edit-dialog already has
+        self.catalogVersion = null;
+
         self.spoolItemTableHelper = new TableItemHelper(function(tableQuery, observableTableModel, observableTotalItemCount){
 
-            // api-call
-            self.apiClient.callLoadSpoolsByQuery(tableQuery, function(responseData){
+            // api-call, catalogs are only delivered if they changed since the last call
+            var query = $.extend({}, tableQuery);
+            if (self.catalogVersion != null){
+                query["catalogVersion"] = self.catalogVersion;
+            }
+            self.apiClient.callLoadSpoolsByQuery(query, function(responseData){
 
                 if (responseData["databaseConnectionProblem"] != null && responseData["databaseConnectionProblem"] == true){
                     self.pluginNotWorking(true);
@@ -733,12 +744,15 @@ $(function() {
                 allSpoolItems = responseData["allSpools"];
                 var allCatalogs = responseData["catalogs"];
 
-                // assign catalogs to sidebarFilterSorter
-                // self.sidebarFilterSorter.updateCatalogs(allCatalogs);
-                // assign catalogs to tablehelper
-                self.spoolItemTableHelper.updateCatalogs(allCatalogs);
-                // assign all catalogs to editview
-                self.spoolDialog.updateCatalogs(allCatalogs);
+                if (allCatalogs != null){
+                    self.catalogVersion = responseData["catalogVersion"];
+                    // assign catalogs to sidebarFilterSorter
+                    // self.sidebarFilterSorter.updateCatalogs(allCatalogs);
+                    // assign catalogs to tablehelper
+                    self.spoolItemTableHelper.updateCatalogs(allCatalogs);
+                    // assign all catalogs to editview
+                    self.spoolDialog.updateCatalogs(allCatalogs);
+                }
 
                 templateSpoolsData = responseData["templateSpools"];
                 self.spoolDialog.updateTemplateSpools(templateSpoolsData);
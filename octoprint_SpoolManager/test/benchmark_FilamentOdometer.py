@@ -0,0 +1,313 @@
+# coding=utf-8
+"""
+Throughput benchmark of the odometer path, the hottest code path of the plugin (every sent line passes it).
+
+Replays synthetic and bundled G-code corpora through FilamentOdometer.processGCodeLine and
+PluginHooks.on_sentGCodeHook and reports lines/sec, ns/line and the memory allocations per line.
+
+    python -m octoprint_SpoolManager.test.benchmark_FilamentOdometer [scale]
+
+test_OdometerBenchmark.py runs the same corpora (small scale) and checks the results and allocation budgets.
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+from octoprint.util.comm import gcode_command_for_cmd
+
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+from octoprint_SpoolManager.plugin_hooks import PluginHooks
+
+TESTDATA_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "testdata"
+)
+
+REPEAT = 3
+
+# all E values are multiples of 1/8, so the expected sums are exact floats
+_E_STEP = 0.125
+
+
+class Corpus:
+    def __init__(self, name, lines, expectedExtrusion):
+        self.name = name
+        self.lines = lines
+        self.expectedExtrusion = expectedExtrusion
+        # (cmd, gcode)-tuples like OctoPrint passes it to the sent-hook
+        self.sentCommands = [(line, gcode_command_for_cmd(line)) for line in lines]
+
+
+class BenchmarkResult:
+    def __init__(
+        self,
+        corpus,
+        path,
+        seconds,
+        peakBytesPerLine,
+        retainedBlocksPerLine,
+        extrusion,
+    ):
+        self.corpus = corpus
+        self.path = path
+        self.lineCount = len(corpus.lines)
+        self.seconds = seconds
+        self.peakBytesPerLine = peakBytesPerLine
+        self.retainedBlocksPerLine = retainedBlocksPerLine
+        self.extrusion = extrusion
+
+    def linesPerSecond(self):
+        return self.lineCount / self.seconds
+
+    def nsPerLine(self):
+        return self.seconds / self.lineCount * 1e9
+
+
+def _statusLines(lines, moveIndex):
+    # typical noise between the moves: temperature polls, progress, layer comments
+    if moveIndex % 20 == 0:
+        lines.append("M105")
+    if moveIndex % 200 == 0:
+        lines.append(";LAYER:%d" % (moveIndex // 200))
+        lines.append("M117 Layer %d" % (moveIndex // 200))
+        lines.append("M73 P%d" % (moveIndex // 200 % 100))
+
+
+def buildSingleToolAbsoluteCorpus(moveCount):
+    lines = [
+        "; single tool, absolute E",
+        "G21",
+        "G90",
+        "M82",
+        "M104 S210",
+        "G28",
+        "G92 E0",
+    ]
+    e = 0.0
+    total = 0.0
+    for i in range(moveCount):
+        _statusLines(lines, i)
+        if i % 50 == 49:
+            # retract, travel, unretract
+            lines.append("G1 E%.4f F2400" % (e - 0.75))
+            lines.append("G0 X%.3f Y%.3f F9000" % (i % 200, i % 180))
+            lines.append("G1 E%.4f F2400" % e)
+        if i % 1000 == 999:
+            lines.append("G92 E0")
+            e = 0.0
+        step = _E_STEP * (i % 4 + 1)
+        e += step
+        total += step
+        lines.append("G1 X%.3f Y%.3f E%.4f" % (i % 200 * 0.5, i % 180 * 0.5, e))
+    return Corpus("single tool, absolute E", lines, [total])
+
+
+def buildSingleToolRelativeCorpus(moveCount):
+    lines = ["; single tool, relative E", "G21", "G90", "M83", "M104 S210", "G28"]
+    total = 0.0
+    for i in range(moveCount):
+        _statusLines(lines, i)
+        if i % 50 == 49:
+            lines.append("G1 E-0.75 F2400")
+            lines.append("G0 X%.3f Y%.3f F9000" % (i % 200, i % 180))
+            lines.append("G1 E0.75 F2400")
+        step = _E_STEP * (i % 4 + 1)
+        total += step
+        lines.append("G1 X%.3f Y%.3f E%.4f" % (i % 200 * 0.5, i % 180 * 0.5, step))
+    return Corpus("single tool, relative E", lines, [total])
+
+
+def buildMultiToolCorpus(moveCount, toolCount=5):
+    lines = ["; MMU / tool changer", "G21", "G90", "M83", "G28"]
+    totals = [0.0] * toolCount
+    tool = 0
+    loadedTools = set([tool])
+    for i in range(moveCount):
+        _statusLines(lines, i)
+        if i % 250 == 0:
+            tool = (i // 250) % toolCount
+            # unload/load sequence of a multi material unit, only the first load of a tool is new filament
+            lines.append("G1 E-15 F4000")
+            lines.append("T%d" % tool)
+            lines.append("G1 E15 F4000")
+            if tool not in loadedTools:
+                loadedTools.add(tool)
+                totals[tool] += 15.0
+        step = _E_STEP * (i % 3 + 1)
+        totals[tool] += step
+        lines.append("G1 X%.3f Y%.3f E%.4f" % (i % 200 * 0.5, i % 180 * 0.5, step))
+    return Corpus("multi tool (%d tools)" % toolCount, lines, totals)
+
+
+def buildDuplicationCorpus(moveCount):
+    lines = ["; IDEX duplication", "G21", "G90", "M83", "T1", "G1 E2", "T0", "M605 S2"]
+    totals = [0.0, 2.0]
+    for i in range(moveCount):
+        _statusLines(lines, i)
+        step = _E_STEP * (i % 4 + 1)
+        totals[0] += step
+        totals[1] += step
+        lines.append("G1 X%.3f Y%.3f E%.4f" % (i % 200 * 0.5, i % 180 * 0.5, step))
+    lines.append("M605 S1")
+    lines.append("G1 E1")
+    totals[0] += 1.0
+    return Corpus("M605 duplication", lines, totals)
+
+
+def loadFileCorpus(name, filePath, expectedExtrusion):
+    with open(filePath) as gcodeFile:
+        lines = [line.strip() for line in gcodeFile]
+    return Corpus(name, lines, expectedExtrusion)
+
+
+def buildCorpora(scale=1):
+    moveCount = 20000 * scale
+    return [
+        buildSingleToolAbsoluteCorpus(moveCount),
+        buildSingleToolRelativeCorpus(moveCount),
+        buildMultiToolCorpus(moveCount),
+        buildDuplicationCorpus(moveCount),
+        loadFileCorpus(
+            "M600 pause test",
+            os.path.join(TESTDATA_FOLDER, "pausehandling", "M600pausetest.gcode"),
+            [1500.0],
+        ),
+    ]
+
+
+def _createLineProcessor(path, filamentOdometer):
+    """
+    :return: function(cmd, gcode) for the benchmarked path
+    """
+    if path == "processGCodeLine":
+        processGCodeLine = filamentOdometer.processGCodeLine
+        return lambda cmd, gcode: processGCodeLine(cmd)
+    hooks = PluginHooks(plugin=None, filament_odometer=filamentOdometer)
+    on_sentGCodeHook = hooks.on_sentGCodeHook
+    return lambda cmd, gcode: on_sentGCodeHook(None, "sent", cmd, None, gcode)
+
+
+PATHS = ["processGCodeLine", "on_sentGCodeHook"]
+
+
+def _replay(processLine, sentCommands):
+    for cmd, gcode in sentCommands:
+        processLine(cmd, gcode)
+
+
+def measureThroughput(corpus, path, repeat=REPEAT):
+    """
+    best of 'repeat' runs, each with a fresh odometer
+    """
+    bestSeconds = None
+    extrusion = None
+    for _ in range(repeat):
+        filamentOdometer = FilamentOdometer()
+        processLine = _createLineProcessor(path, filamentOdometer)
+        gcWasEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            _replay(processLine, corpus.sentCommands)
+            seconds = time.perf_counter() - start
+        finally:
+            if gcWasEnabled:
+                gc.enable()
+        if bestSeconds is None or seconds < bestSeconds:
+            bestSeconds = seconds
+        extrusion = filamentOdometer.getExtrusionAmount()
+    return bestSeconds, extrusion
+
+
+def measureAllocations(corpus, path, sampleSize=2000):
+    """
+    CPython has no counter for the number of allocations, so two traced values are reported:
+    - peak bytes/line: average of the memory allocated while a single line is processed (temporary objects)
+    - retained blocks/line: memory blocks still allocated after the replay (growing state, leaks)
+    The peak needs tracemalloc.reset_peak (Python 3.9+), None on older versions.
+    """
+    filamentOdometer = FilamentOdometer()
+    processLine = _createLineProcessor(path, filamentOdometer)
+    # warm up: tool arrays, caches,...
+    _replay(processLine, corpus.sentCommands)
+    filamentOdometer.reset()
+
+    sample = corpus.sentCommands[:sampleSize]
+    peakBytesPerLine = None
+    if hasattr(tracemalloc, "reset_peak"):
+        wasTracing = tracemalloc.is_tracing()
+        if not wasTracing:
+            tracemalloc.start()
+        try:
+            peakBytes = 0
+            for cmd, gcode in sample:
+                current = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                processLine(cmd, gcode)
+                peakBytes += tracemalloc.get_traced_memory()[1] - current
+        finally:
+            if not wasTracing:
+                tracemalloc.stop()
+        peakBytesPerLine = peakBytes / float(len(sample))
+
+    gc.collect()
+    blocksBefore = sys.getallocatedblocks()
+    _replay(processLine, corpus.sentCommands)
+    gc.collect()
+    retainedBlocks = max(0, sys.getallocatedblocks() - blocksBefore)
+
+    return (peakBytesPerLine, retainedBlocks / float(len(corpus.sentCommands)))
+
+
+def runBenchmark(corpus, path, repeat=REPEAT):
+    seconds, extrusion = measureThroughput(corpus, path, repeat)
+    peakBytesPerLine, retainedBlocksPerLine = measureAllocations(corpus, path)
+    return BenchmarkResult(
+        corpus, path, seconds, peakBytesPerLine, retainedBlocksPerLine, extrusion
+    )
+
+
+def main():
+    scale = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    print(
+        "%-26s %-18s %9s %12s %9s %13s %15s"
+        % (
+            "corpus",
+            "path",
+            "lines",
+            "lines/sec",
+            "ns/line",
+            "peak B/line",
+            "retained/line",
+        )
+    )
+    for corpus in buildCorpora(scale):
+        for path in PATHS:
+            result = runBenchmark(corpus, path)
+            print(
+                "%-26s %-18s %9d %12.0f %9.0f %13s %15.4f%s"
+                % (
+                    corpus.name,
+                    path,
+                    result.lineCount,
+                    result.linesPerSecond(),
+                    result.nsPerLine(),
+                    (
+                        "n/a"
+                        if result.peakBytesPerLine is None
+                        else "%.1f" % result.peakBytesPerLine
+                    ),
+                    result.retainedBlocksPerLine,
+                    (
+                        ""
+                        if result.extrusion == corpus.expectedExtrusion
+                        else "  WRONG EXTRUSION %s" % result.extrusion
+                    ),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# coding=utf-8
+"""
+Micro-benchmark for PluginHooks.on_sentGCodeHook
+
+Compares the hook cost per sent line without the gcode-prefilter (every line is passed to the odometer, like before)
+and with the prefilter.
+
+    python -m octoprint_SpoolManager.test.benchmark_SentGCodeHook
+"""
+
+import timeit
+
+from octoprint.util.comm import gcode_command_for_cmd
+
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+from octoprint_SpoolManager.plugin_hooks import PluginHooks
+
+REPEAT = 5
+
+
+def buildSentStream():
+    # typical stream during a print: many short moves, interleaved with temperature polls and progress reports
+    stream = []
+    for i in range(1000):
+        stream.append("G1 X%.3f Y%.3f E%.5f" % (i * 0.1, i * 0.2, i * 0.01))
+        if i % 10 == 0:
+            stream.append("M105")
+        if i % 50 == 0:
+            stream.append("M27")
+            stream.append("M73 P%d R%d" % (i // 10, 100 - i // 10))
+        if i % 100 == 0:
+            stream.append("M117 Layer %d" % (i // 100))
+    # (cmd, gcode)-tuples like OctoPrint passes it to the hook
+    return [(cmd, gcode_command_for_cmd(cmd)) for cmd in stream]
+
+
+def measure(label, sentStream, callHook):
+    lineCount = len(sentStream) * REPEAT
+    duration = timeit.timeit(
+        lambda: [callHook(cmd, gcode) for cmd, gcode in sentStream], number=REPEAT
+    )
+    print("%-30s %8.0f ns/line" % (label, duration / lineCount * 1e9))
+
+
+def main():
+    sentStream = buildSentStream()
+    ignoredStream = [
+        (cmd, gcode) for cmd, gcode in sentStream if not cmd.startswith("G1")
+    ]
+
+    odometer = FilamentOdometer()
+    hooks = PluginHooks(plugin=None, filament_odometer=odometer)
+
+    def withoutPrefilter(cmd, gcode):
+        odometer.processGCodeLine(cmd)
+
+    def withPrefilter(cmd, gcode):
+        hooks.on_sentGCodeHook(None, "sent", cmd, None, gcode)
+
+    print("%d lines, %d ignored commands" % (len(sentStream), len(ignoredStream)))
+    measure("all lines, before", sentStream, withoutPrefilter)
+    measure("all lines, after", sentStream, withPrefilter)
+    measure("ignored lines, before", ignoredStream, withoutPrefilter)
+    measure("ignored lines, after", ignoredStream, withPrefilter)
+
+
+if __name__ == "__main__":
+    main()
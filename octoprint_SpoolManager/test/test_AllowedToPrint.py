@@ -0,0 +1,146 @@
+import logging
+import threading
+import unittest
+from unittest import mock
+
+from octoprint_SpoolManager.common.SettingsKeys import SettingsKeys
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+from octoprint_SpoolManager.selected_spools_cache import SelectedSpoolsCache
+from octoprint_SpoolManager.spool_manager_plugin import SpoolmanagerPlugin
+
+
+class TestAllowedToPrint(unittest.TestCase):
+    def setUp(self):
+        self.settingsValues = {
+            SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS: [1, None],
+            SettingsKeys.SETTINGS_KEY_WARN_IF_SPOOL_NOT_SELECTED: True,
+            SettingsKeys.SETTINGS_KEY_WARN_IF_FILAMENT_NOT_ENOUGH: True,
+            SettingsKeys.SETTINGS_KEY_REMINDER_SELECTING_SPOOL: True,
+            SettingsKeys.SETTINGS_KEY_SAFETY_LENGTH: 0,
+        }
+        settings = mock.Mock()
+        settings.get.side_effect = self._getSetting
+        settings.get_boolean.side_effect = self._getSetting
+        settings.get_int.side_effect = self._getSetting
+
+        self.spoolModels = {
+            1: SpoolModel(
+                databaseId=1,
+                displayName="PLA",
+                diameter=1.75,
+                density=1.24,
+                totalWeightInGram=1000.0,
+                usedWeightInGram=0.0,
+                remainingWeightInGram=1000.0,
+            ),
+        }
+
+        plugin = SpoolmanagerPlugin(FilamentOdometer())
+        plugin._logger = logging.getLogger("testLogger")
+        plugin._identifier = "SpoolManager"
+        plugin._settings = settings
+        plugin._printer = mock.Mock()
+        plugin._printer.is_printing.return_value = False
+        plugin._printer.is_paused.return_value = False
+        plugin._printer.get_current_data.return_value = {
+            "job": {
+                "file": {"origin": "local", "path": "a.gcode", "date": 1, "size": 2}
+            }
+        }
+        plugin._printer_profile_manager = mock.Mock()
+        plugin._printer_profile_manager.get_current_or_default.return_value = {
+            "extruder": {"count": 2}
+        }
+        plugin._file_manager = mock.Mock()
+        plugin._file_manager.get_metadata.return_value = {
+            "analysis": {
+                "filament": {"tool0": {"length": 1000.0}, "tool1": {"length": 500.0}}
+            }
+        }
+        plugin._event_bus = mock.Mock()
+        plugin._plugin_manager = mock.Mock()
+        plugin._selectedSpoolsCache = SelectedSpoolsCache(self._loadSpools)
+        plugin._allowedToPrintCache = None
+        plugin._allowedToPrintLock = threading.Lock()
+        plugin._settingsVersion = 0
+        self.plugin = plugin
+
+    def _getSetting(self, path):
+        return self.settingsValues.get(path[0], False)
+
+    def _loadSpools(self, databaseIds):
+        return {
+            databaseId: self.spoolModels[databaseId]
+            for databaseId in databaseIds
+            if databaseId in self.spoolModels
+        }
+
+    def _metadataReads(self):
+        return self.plugin._file_manager.get_metadata.call_count
+
+    def test_result(self):
+        allowedToPrintResult = self.plugin.getAllowedToPrintResult()
+        self.assertFalse(allowedToPrintResult["metaOrAttributesMissing"])
+        result = allowedToPrintResult["result"]
+        self.assertEqual([1], [info["toolIndex"] for info in result["noSpoolSelected"]])
+        self.assertEqual([], result["filamentNotEnough"])
+        self.assertEqual(
+            [(0, 1000.0)],
+            [
+                (info["toolIndex"], info["remainingWeight"])
+                for info in result["reminderSpoolSelection"]
+            ],
+        )
+        # metadata read once for all tools
+        self.assertEqual(1, self._metadataReads())
+
+        # missing fields
+        self.spoolModels[1].density = None
+        self.plugin._selectedSpoolsCache.invalidate()
+        self.assertTrue(
+            self.plugin.getAllowedToPrintResult()["metaOrAttributesMissing"]
+        )
+
+    def test_cached(self):
+        allowedToPrintResult = self.plugin.getAllowedToPrintResult()
+        self.assertIs(allowedToPrintResult, self.plugin.getAllowedToPrintResult())
+        self.assertEqual(1, self._metadataReads())
+
+        # settings saved
+        self.plugin._settingsVersion += 1
+        self.plugin.getAllowedToPrintResult()
+        self.assertEqual(2, self._metadataReads())
+
+        # other spool selected
+        self.settingsValues[SettingsKeys.SETTINGS_KEY_SELECTED_SPOOLS_DATABASE_IDS] = [
+            None,
+            1,
+        ]
+        self.assertEqual(
+            [0],
+            [
+                info["toolIndex"]
+                for info in self.plugin.getAllowedToPrintResult()["result"][
+                    "noSpoolSelected"
+                ]
+            ],
+        )
+        self.assertEqual(3, self._metadataReads())
+        self.plugin.getAllowedToPrintResult()
+        self.assertEqual(3, self._metadataReads())
+
+        # file selection changed
+        self.plugin.invalidateAllowedToPrint()
+        self.plugin.getAllowedToPrintResult()
+        self.assertEqual(4, self._metadataReads())
+
+        # not cached while printing
+        self.plugin._printer.is_printing.return_value = True
+        self.plugin.getAllowedToPrintResult()
+        self.plugin.getAllowedToPrintResult()
+        self.assertEqual(6, self._metadataReads())
+
+
+if __name__ == "__main__":
+    unittest.main()
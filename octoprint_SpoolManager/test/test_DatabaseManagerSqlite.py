@@ -0,0 +1,671 @@
+import datetime
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from peewee import DatabaseError
+
+from octoprint_SpoolManager.DatabaseManager import (
+    CURRENT_DATABASE_SCHEME_VERSION,
+    DatabaseManager,
+)
+from octoprint_SpoolManager.common import CSVExportImporter
+from octoprint_SpoolManager.db import DatabaseSettings
+from octoprint_SpoolManager.models.PluginMetaDataModel import PluginMetaDataModel
+from octoprint_SpoolManager.models.SpoolLabelModel import SpoolLabelModel
+from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+
+
+class TestDatabaseManagerSqlite(unittest.TestCase):
+    """
+    DatabaseManager against a temporary local SqLite database
+    """
+
+    poolEnabled = False
+
+    def setUp(self):
+        self.clientMessages = []
+        self.baseFolder = tempfile.mkdtemp()
+        databaseSettings = DatabaseSettings()
+        databaseSettings.useExternal = False
+        databaseSettings.baseFolder = self.baseFolder
+        databaseSettings.poolEnabled = self.poolEnabled
+
+        self.databaseManager = DatabaseManager(logging.getLogger("testLogger"), False)
+        self.databaseManager.initDatabase(databaseSettings, self._clientOutput)
+        self.databaseManager.reCreateDatabase()
+
+    def tearDown(self):
+        self.databaseManager.closePool()
+        shutil.rmtree(self.baseFolder)
+
+    def _clientOutput(self, type, title, message):
+        self.clientMessages.append((type, title, message))
+
+    def _createSpool(self, displayName, **values):
+        spoolModel = SpoolModel()
+        spoolModel.displayName = displayName
+        for key, value in values.items():
+            setattr(spoolModel, key, value)
+        return self.databaseManager.saveSpool(spoolModel)
+
+    def test_loadSpools(self):
+        firstId = self._createSpool("first")
+        secondId = self._createSpool("second")
+        spoolModelsById = self.databaseManager.loadSpools(
+            [secondId, 4711, firstId, secondId]
+        )
+        self.assertEqual({firstId, secondId}, set(spoolModelsById.keys()))
+        self.assertEqual("second", spoolModelsById[secondId].displayName)
+        self.assertEqual({}, self.databaseManager.loadSpools([]))
+
+    def test_loadCatalogs(self):
+        firstId = self._createSpool(
+            "first",
+            vendor="Prusa",
+            material="PLA",
+            labels='["a", "b"]',
+            color="#ff0000",
+            colorName="red",
+        )
+        self._createSpool("second", vendor="Prusa", material="PETG", labels='["b"]')
+
+        catalogVersion, catalogs = self.databaseManager.loadCatalogs()
+        self.assertEqual({"", "Prusa"}, set(catalogs["vendors"]))
+        self.assertEqual({"PLA", "PETG"}, set(catalogs["materials"]))
+        self.assertEqual({"a", "b"}, set(catalogs["labels"]))
+        self.assertEqual(
+            ["#ff0000;red"], [color["colorId"] for color in catalogs["colors"]]
+        )
+        # client has the current version
+        self.assertEqual(
+            (catalogVersion, None), self.databaseManager.loadCatalogs(catalogVersion)
+        )
+
+        # maintained on save/delete
+        firstSpool = self.databaseManager.loadSpool(firstId)
+        firstSpool.material = "ABS"
+        self.databaseManager.saveSpool(firstSpool)
+        newCatalogVersion, catalogs = self.databaseManager.loadCatalogs(catalogVersion)
+        self.assertNotEqual(catalogVersion, newCatalogVersion)
+        self.assertEqual({"ABS", "PETG"}, set(catalogs["materials"]))
+
+        self.databaseManager.deleteSpool(firstId)
+        catalogVersion, catalogs = self.databaseManager.loadCatalogs(newCatalogVersion)
+        self.assertEqual({"PETG"}, set(catalogs["materials"]))
+        self.assertEqual(["b"], catalogs["labels"])
+        self.assertEqual([], catalogs["colors"])
+
+    def _buildTableQuery(self, **values):
+        tableQuery = {
+            "selectedPageSize": "all",
+            "sortColumn": "displayName",
+            "sortOrder": "asc",
+            "filterName": "",
+        }
+        tableQuery.update(values)
+        return tableQuery
+
+    def _explainQueryPlan(self, query):
+        sql, params = query.sql()
+        self.databaseManager.connectoToDatabase()
+        cursor = self.databaseManager._database.execute_sql(
+            "EXPLAIN QUERY PLAN " + sql, params
+        )
+        return " | ".join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_labelFilter(self):
+        self._createSpool("first", labels='["outdoor", "flexible"]')
+        secondId = self._createSpool("second", labels='["outdoor"]')
+        self._createSpool("third", labels="[]")
+
+        def loadDisplayNames(labelFilter):
+            spoolModels = self.databaseManager.loadAllSpoolsByQuery(
+                self._buildTableQuery(labelFilter=labelFilter)
+            )
+            return [spoolModel.displayName for spoolModel in spoolModels]
+
+        self.assertEqual(["first", "second"], loadDisplayNames("outdoor"))
+        self.assertEqual(["first"], loadDisplayNames("flexible,unknown"))
+        self.assertEqual(["first", "second", "third"], loadDisplayNames("all"))
+
+        # labels changed/deleted
+        secondSpool = self.databaseManager.loadSpool(secondId)
+        secondSpool.labels = '["flexible"]'
+        self.databaseManager.saveSpool(secondSpool)
+        self.assertEqual(["first"], loadDisplayNames("outdoor"))
+        self.databaseManager.deleteSpool(secondId)
+        self.assertEqual(["first"], loadDisplayNames("flexible"))
+        # label table maintained on save/delete, like the catalog
+        self.databaseManager.connectoToDatabase()
+        self.assertEqual(
+            {"outdoor", "flexible"},
+            {spoolLabel.label for spoolLabel in SpoolLabelModel.select()},
+        )
+        self.assertEqual(
+            {"outdoor", "flexible"},
+            set(self.databaseManager.loadCatalogs()[1]["labels"]),
+        )
+
+        queryPlan = self._explainQueryPlan(
+            self.databaseManager.loadAllSpoolsByQuery(
+                self._buildTableQuery(labelFilter="outdoor")
+            )
+        )
+        self.assertIn("USING COVERING INDEX spoollabelmodel_label_spool_id", queryPlan)
+
+    def test_upgradeLabelsFrom7(self):
+        firstId = self._createSpool(
+            "first", labels='["outdoor", "flexible", "outdoor"]'
+        )
+        self._createSpool("second", labels=None)
+        # database of scheme version 7: only the JSON column
+        database = self.databaseManager._database
+        self.databaseManager.connectoToDatabase()
+        database.drop_tables([SpoolLabelModel])
+        PluginMetaDataModel.update(value=7).where(
+            PluginMetaDataModel.key == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
+        ).execute()
+        self.databaseManager.closeDatabase()
+
+        self.databaseManager.initDatabase(
+            self.databaseManager.getDatabaseSettings(), self._clientOutput
+        )
+        self.databaseManager.connectoToDatabase()
+        schemeVersion = PluginMetaDataModel.get(
+            PluginMetaDataModel.key == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
+        ).value
+        labelRows = [
+            (spoolLabel.spool_id, spoolLabel.label)
+            for spoolLabel in SpoolLabelModel.select().order_by(SpoolLabelModel.label)
+        ]
+        self.databaseManager.closeDatabase()
+        self.assertEqual(str(CURRENT_DATABASE_SCHEME_VERSION), schemeVersion)
+        self.assertEqual([(firstId, "flexible"), (firstId, "outdoor")], labelRows)
+
+    def test_sortUsesIndex(self):
+        for index in range(20):
+            self._createSpool("spool %d" % index, totalWeightInGram=1000.0 + index)
+        sortColumns = ["displayName", "lastUse", "firstUse", "remaining", "material"]
+        for sortColumn in sortColumns:
+            for sortOrder in ["asc", "desc"]:
+                for filterName in ["", "hideInactiveSpools"]:
+                    with self.subTest(
+                        sortColumn=sortColumn,
+                        sortOrder=sortOrder,
+                        filterName=filterName,
+                    ):
+                        queryPlan = self._explainQueryPlan(
+                            self.databaseManager.loadAllSpoolsByQuery(
+                                self._buildTableQuery(
+                                    selectedPageSize="10",
+                                    sortColumn=sortColumn,
+                                    sortOrder=sortOrder,
+                                    filterName=filterName,
+                                    **{"from": "0", "to": "10"}
+                                )
+                            )
+                        )
+                        self.assertIn("USING INDEX", queryPlan)
+                        if filterName == "":
+                            self.assertNotIn("TEMP B-TREE FOR ORDER BY", queryPlan)
+
+    def test_cursorPagination(self):
+        lastUse = datetime.datetime(2024, 1, 1, 12, 0, 0)
+        for index in range(23):
+            # duplicates, mixed case and NULLs
+            displayName = ("Spool %d" if index % 2 else "spool %d") % (index % 5)
+            self._createSpool(
+                None if index % 7 == 0 else displayName,
+                material=None if index % 4 == 0 else "PLA" if index % 3 else "PETG",
+                totalWeightInGram=None if index % 6 == 0 else 1000.0 + index % 3,
+                lastUse=(
+                    None
+                    if index % 5 == 0
+                    else lastUse + datetime.timedelta(hours=index % 4)
+                ),
+            )
+
+        def loadPage(cursor, selectedPageSize="4", **values):
+            return self.databaseManager.loadSpoolsByCursor(
+                self._buildTableQuery(
+                    selectedPageSize=selectedPageSize, cursor=cursor, **values
+                )
+            )
+
+        sortColumns = ["displayName", "lastUse", "remaining", "material", "databaseId"]
+        for sortColumn in sortColumns:
+            for sortOrder in ["asc", "desc"]:
+                with self.subTest(sortColumn=sortColumn, sortOrder=sortOrder):
+                    sorting = {"sortColumn": sortColumn, "sortOrder": sortOrder}
+                    allSpools, nextCursor = loadPage("", "all", **sorting)
+                    self.assertEqual(None, nextCursor)
+                    self.assertEqual(23, len(allSpools))
+
+                    pagedSpoolIds = []
+                    cursor = ""
+                    while cursor != None:
+                        spoolModels, cursor = loadPage(cursor, **sorting)
+                        pagedSpoolIds += [spool.databaseId for spool in spoolModels]
+                    self.assertEqual(
+                        [spool.databaseId for spool in allSpools], pagedSpoolIds
+                    )
+
+        # stable under inserts: the next page starts after the last spool of the previous page
+        firstPage, cursor = loadPage("")
+        self._createSpool("a new spool before the cursor")
+        secondPage, cursor = loadPage(cursor)
+        allSpools, nextCursor = loadPage("", "all")
+        allSpoolIds = [spoolModel.databaseId for spoolModel in allSpools]
+        self.assertEqual(
+            allSpoolIds[allSpoolIds.index(firstPage[-1].databaseId) + 1 :][:4],
+            [spoolModel.databaseId for spoolModel in secondPage],
+        )
+
+    def test_filteredCount(self):
+        self._createSpool("first", material="PLA", isActive=True)
+        secondId = self._createSpool("second", material="PLA", isActive=False)
+        self._createSpool("third", material="PETG", isActive=True)
+        tableQuery = self._buildTableQuery(
+            filterName="hideInactiveSpools",
+            materialFilter="PLA",
+            vendorFilter="all",
+            colorFilter="all",
+        )
+        self.assertEqual(
+            1, self.databaseManager.countSpoolsByQuery(tableQuery, useCache=True)
+        )
+        self.assertEqual(
+            3, self.databaseManager.countSpoolsByQuery(None, useCache=True)
+        )
+
+        # cached until the next change
+        self.databaseManager._spoolCounts.put(
+            self.databaseManager._buildFilterSignature(None),
+            4711,
+            self.databaseManager._spoolCounts.getGeneration(),
+        )
+        self.assertEqual(
+            4711, self.databaseManager.countSpoolsByQuery(None, useCache=True)
+        )
+        secondSpool = self.databaseManager.loadSpool(secondId)
+        secondSpool.isActive = True
+        self.databaseManager.saveSpool(secondSpool)
+        self.assertEqual(
+            2, self.databaseManager.countSpoolsByQuery(tableQuery, useCache=True)
+        )
+        self.assertEqual(
+            3, self.databaseManager.countSpoolsByQuery(None, useCache=True)
+        )
+
+    def test_pageWithCount(self):
+        for index in range(7):
+            self._createSpool(
+                "spool %d" % index,
+                material="PLA" if index % 3 else "PETG",
+                isActive=True,
+            )
+        tableQuery = self._buildTableQuery(
+            filterName="hideInactiveSpools",
+            materialFilter="PLA",
+            vendorFilter="all",
+            colorFilter="all",
+            sortColumn="displayName",
+            sortOrder="desc",
+            selectedPageSize="3",
+            to="3",
+        )
+
+        for supportsWindowFunctions in [True, False]:
+            self.databaseManager._supportsWindowFunctions = (
+                lambda: supportsWindowFunctions
+            )
+            for offset, expectedNames in [
+                ("0", ["spool 5", "spool 4", "spool 2"]),
+                ("3", ["spool 1"]),
+                ("6", []),
+            ]:
+                with self.subTest(
+                    supportsWindowFunctions=supportsWindowFunctions, offset=offset
+                ):
+                    self.databaseManager.invalidateCaches()
+                    pageQuery = dict(tableQuery, **{"from": offset})
+                    spoolModels, filteredCount = (
+                        self.databaseManager.loadSpoolsPageWithCount(pageQuery)
+                    )
+                    self.assertEqual(4, filteredCount)
+                    self.assertEqual(
+                        expectedNames,
+                        [spoolModel.displayName for spoolModel in spoolModels],
+                    )
+                    self.assertEqual(
+                        [spoolModel.databaseId for spoolModel in spoolModels],
+                        [
+                            spoolModel.databaseId
+                            for spoolModel in self.databaseManager.loadAllSpoolsByQuery(
+                                pageQuery
+                            )
+                        ],
+                    )
+                    # the count column doesn't end up in the transformed spools
+                    for spoolModel in spoolModels:
+                        self.assertNotIn("filteredCount", spoolModel.__data__)
+                    # filled the count cache
+                    self.assertEqual(
+                        4,
+                        self.databaseManager.countSpoolsByQuery(
+                            pageQuery, useCache=True
+                        ),
+                    )
+
+    def test_upgradeIndexesFrom8(self):
+        database = self.databaseManager._database
+        self.databaseManager.connectoToDatabase()
+        database.execute_sql('DROP INDEX "spoolmodel_lower_displayname"')
+        database.execute_sql('DROP INDEX "spoolmodel_lastUse"')
+        PluginMetaDataModel.update(value=8).where(
+            PluginMetaDataModel.key == PluginMetaDataModel.KEY_DATABASE_SCHEME_VERSION
+        ).execute()
+        self.databaseManager.closeDatabase()
+
+        self.databaseManager.initDatabase(
+            self.databaseManager.getDatabaseSettings(), self._clientOutput
+        )
+        self.databaseManager.connectoToDatabase()
+        indexNames = [index.name for index in database.get_indexes("spo_spoolmodel")]
+        self.databaseManager.closeDatabase()
+        self.assertIn("spoolmodel_lower_displayname", indexNames)
+        self.assertIn("spoolmodel_lastUse", indexNames)
+
+    def test_saveSpoolsInOneTransaction(self):
+        firstId = self._createSpool("first", totalWeightInGram=1000.0)
+        secondId = self._createSpool("second", totalWeightInGram=500.0)
+
+        firstSpool = self.databaseManager.loadSpool(firstId)
+        secondSpool = self.databaseManager.loadSpool(secondId)
+        firstSpool.usedWeightInGram = 10.0
+        secondSpool.usedWeightInGram = 20.0
+        self.assertTrue(self.databaseManager.saveSpools([firstSpool, secondSpool]))
+        self.assertEqual(
+            990.0, self.databaseManager.loadSpool(firstId).remainingWeightInGram
+        )
+        self.assertEqual(
+            480.0, self.databaseManager.loadSpool(secondId).remainingWeightInGram
+        )
+
+        # outdated version of the second spool: nothing is stored
+        firstSpool = self.databaseManager.loadSpool(firstId)
+        firstSpool.usedWeightInGram = 99.0
+        secondSpool.version = 1
+        self.assertFalse(self.databaseManager.saveSpools([firstSpool, secondSpool]))
+        self.assertEqual(10.0, self.databaseManager.loadSpool(firstId).usedWeightInGram)
+
+    def test_saveSpoolsUsage(self):
+        spoolId = self._createSpool(
+            "first", totalWeightInGram=1000.0, usedWeightInGram=100.0
+        )
+        # opened in the edit dialog / cached before the print
+        editedSpool = self.databaseManager.loadSpool(spoolId)
+        lastUse = datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+        # odometer commits during the print, added to the stored values
+        storedSpools = self.databaseManager.saveSpoolsUsage(
+            [(spoolId, 1000.4, 10.0, lastUse)]
+        )
+        self.assertEqual(
+            (1000, 110.0, 890.0, lastUse),
+            (
+                storedSpools[0].usedLengthInMM,
+                storedSpools[0].usedWeightInGram,
+                storedSpools[0].remainingWeightInGram,
+                storedSpools[0].lastUse,
+            ),
+        )
+        # weight unknown (no density), only the length
+        self.databaseManager.saveSpoolsUsage([(spoolId, 500.0, None, lastUse)])
+        storedSpool = self.databaseManager.loadSpool(spoolId)
+        self.assertEqual(
+            (1500, 110.0, 890.0, editedSpool.version),
+            (
+                storedSpool.usedLengthInMM,
+                storedSpool.usedWeightInGram,
+                storedSpool.remainingWeightInGram,
+                storedSpool.version,
+            ),
+        )
+
+        # no version conflict and the outdated usage of the edited spool is not written back
+        editedSpool.displayName = "edited"
+        editedSpool.totalWeightInGram = 2000.0
+        self.assertEqual(spoolId, self.databaseManager.saveSpool(editedSpool))
+        self.assertEqual(
+            (110.0, 1890.0),
+            (editedSpool.usedWeightInGram, editedSpool.remainingWeightInGram),
+        )
+        storedSpool = self.databaseManager.loadSpool(spoolId)
+        self.assertEqual(
+            ("edited", 1500, 110.0, 1890.0),
+            (
+                storedSpool.displayName,
+                storedSpool.usedLengthInMM,
+                storedSpool.usedWeightInGram,
+                storedSpool.remainingWeightInGram,
+            ),
+        )
+
+        # a commit after the edit keeps the edit
+        self.databaseManager.saveSpoolsUsage([(spoolId, 100.0, 10.0, lastUse)])
+        storedSpool = self.databaseManager.loadSpool(spoolId)
+        self.assertEqual(
+            ("edited", 120.0, 1880.0),
+            (
+                storedSpool.displayName,
+                storedSpool.usedWeightInGram,
+                storedSpool.remainingWeightInGram,
+            ),
+        )
+
+        # an explicit change of the usage is stored
+        storedSpool.usedWeightInGram = 0.0
+        self.databaseManager.saveSpool(storedSpool)
+        self.assertEqual(
+            2000.0, self.databaseManager.loadSpool(spoolId).remainingWeightInGram
+        )
+
+        self.databaseManager.deleteSpool(spoolId)
+        self.assertEqual(
+            None,
+            self.databaseManager.saveSpoolsUsage([(spoolId, 1.0, 1.0, lastUse)]),
+        )
+
+    def test_importSpools(self):
+        def buildSpools(count):
+            spoolModels = []
+            for index in range(count):
+                spoolModel = SpoolModel()
+                spoolModel.displayName = "imported %d" % index
+                spoolModel.totalWeightInGram = 1000.0
+                spoolModel.usedWeightInGram = float(index)
+                spoolModel.labels = '["outdoor", "flexible"]' if index % 2 else None
+                spoolModels.append(spoolModel)
+            return spoolModels
+
+        database = self.databaseManager._database
+        for returningClause in [False, True]:
+            with self.subTest(returningClause=returningClause):
+                database.returning_clause = returningClause
+                self.databaseManager.reCreateDatabase()
+                existingId = self._createSpool("existing", labels='["outdoor"]')
+
+                spoolModels = buildSpools(7)
+                progress = []
+                self.assertTrue(
+                    self.databaseManager.importSpools(
+                        spoolModels, batchSize=3, updateProgress=progress.append
+                    )
+                )
+                self.assertEqual([3, 6, 7], progress)
+                for index, spoolModel in enumerate(spoolModels):
+                    storedSpool = self.databaseManager.loadSpool(spoolModel.databaseId)
+                    self.assertEqual("imported %d" % index, storedSpool.displayName)
+                    self.assertEqual(1000.0 - index, storedSpool.remainingWeightInGram)
+                self.databaseManager.connectoToDatabase()
+                self.assertEqual(
+                    [existingId]
+                    + [spoolModels[index].databaseId for index in [1, 3, 5]],
+                    [
+                        spoolLabel.spool_id
+                        for spoolLabel in SpoolLabelModel.select()
+                        .where(SpoolLabelModel.label == "outdoor")
+                        .order_by(SpoolLabelModel.spool)
+                    ],
+                )
+                self.assertEqual(
+                    ["flexible", "outdoor"],
+                    sorted(self.databaseManager.loadCatalogs()[1]["labels"]),
+                )
+        database.returning_clause = False
+
+        # one failing batch: nothing is stored
+        insertSpoolBatch = self.databaseManager._insertSpoolBatch
+
+        def failingInsertSpoolBatch(spoolModels, insertFields):
+            if spoolModels[0].displayName == "imported 3":
+                raise ValueError("broken batch")
+            insertSpoolBatch(spoolModels, insertFields)
+
+        self.databaseManager._insertSpoolBatch = failingInsertSpoolBatch
+        spoolModels = buildSpools(7)
+        self.assertFalse(self.databaseManager.importSpools(spoolModels, batchSize=3))
+        self.assertEqual(8, self.databaseManager.countSpoolsByQuery())
+        self.assertEqual(
+            [None] * 7, [spoolModel.databaseId for spoolModel in spoolModels]
+        )
+
+    def test_exportSpools(self):
+        for index in range(7):
+            self._createSpool(
+                'spool "%d", with quotes' % index, totalWeightInGram=1000.0
+            )
+
+        for chunkSize in [3, 7, 100]:
+            with self.subTest(chunkSize=chunkSize):
+                self.assertEqual(
+                    ['spool "%d", with quotes' % index for index in reversed(range(7))],
+                    [
+                        spoolModel.displayName
+                        for spoolModel in self.databaseManager.iterateAllSpools(
+                            chunkSize
+                        )
+                    ],
+                )
+
+        csvParts = list(
+            CSVExportImporter.transform2CSV(
+                self.databaseManager.iterateAllSpools(3), rowsPerChunk=2
+            )
+        )
+        # header, 3 chunks of 2 rows and the last row
+        self.assertEqual(5, len(csvParts))
+        self.assertTrue(csvParts[0].startswith('"Spool Name"'))
+
+        csvFile = os.path.join(self.baseFolder, "export.csv")
+        with open(csvFile, "w") as exportFile:
+            exportFile.write("".join(csvParts))
+        errorCollection = []
+        importedSpools = CSVExportImporter.parseCSV(
+            csvFile,
+            lambda lineNumber: None,
+            errorCollection,
+            logging.getLogger("testLogger"),
+        )
+        self.assertEqual([], errorCollection)
+        self.assertEqual(
+            ['spool "%d", with quotes' % index for index in reversed(range(7))],
+            [spoolModel.displayName for spoolModel in importedSpools],
+        )
+
+        # database error in the second chunk, the export must not end like a complete one
+        allSpoolModels = self.databaseManager.iterateAllSpools(3)
+        self.assertEqual(3, len(list(itertools.islice(allSpoolModels, 3))))
+        connectoToDatabase = self.databaseManager.connectoToDatabase
+
+        def failingConnectToDatabase():
+            raise DatabaseError("database gone")
+
+        self.databaseManager.connectoToDatabase = failingConnectToDatabase
+        with self.assertLogs("testLogger", "ERROR"):
+            with self.assertRaises(DatabaseError):
+                list(CSVExportImporter.transform2CSV(allSpoolModels))
+        self.databaseManager.connectoToDatabase = connectoToDatabase
+
+
+class TestDatabaseManagerSqlitePooled(TestDatabaseManagerSqlite):
+
+    poolEnabled = True
+
+    def test_connectionPerThread(self):
+        databaseId = self._createSpool("first", totalWeightInGram=1000.0)
+        database = self.databaseManager._database
+
+        self.databaseManager.loadSpool(databaseId)
+        mainConnection = database.connection()
+        self.databaseManager.loadSpool(databaseId)
+        self.databaseManager.closeDatabase()
+        # sqlite: long-lived connection per thread
+        self.assertIs(mainConnection, database.connection())
+
+        threadConnections = []
+
+        def loadInThread():
+            self.databaseManager.loadSpool(databaseId)
+            threadConnections.append(database.connection())
+
+        thread = threading.Thread(target=loadInThread)
+        thread.start()
+        thread.join()
+        self.assertEqual(1, len(threadConnections))
+        self.assertIsNot(mainConnection, threadConnections[0])
+
+    def test_probeOtherSettings(self):
+        databaseId = self._createSpool("first")
+        self.databaseManager.connectoToDatabase()
+        pooledDatabase = self.databaseManager._pooledDatabase
+        mainConnection = pooledDatabase.connection()
+
+        otherSettings = DatabaseSettings()
+        otherSettings.useExternal = False
+        otherSettings.fileLocation = os.path.join(self.baseFolder, "other.db")
+        self.assertIsNone(self.databaseManager.testDatabaseConnection(otherSettings))
+        self.databaseManager.reCreateDatabase(otherSettings)
+        metaInformations = self.databaseManager.loadDatabaseMetaInformations()
+        self.assertEqual(
+            (True, CURRENT_DATABASE_SCHEME_VERSION, 1),
+            (
+                metaInformations["success"],
+                int(metaInformations["localSchemeVersionFromDatabaseModel"]),
+                metaInformations["localSpoolItemCount"],
+            ),
+        )
+
+        # the pool and the open connection of this thread are untouched
+        self.assertIs(pooledDatabase, self.databaseManager._pooledDatabase)
+        self.assertIs(mainConnection, pooledDatabase.connection())
+        self.assertEqual(
+            "first", self.databaseManager.loadSpool(databaseId).displayName
+        )
+        self.assertTrue(os.path.exists(otherSettings.fileLocation))
+
+        otherSettings.useExternal = True
+        otherSettings.type = "mysql"
+        self.assertEqual(
+            "error", self.databaseManager.testDatabaseConnection(otherSettings)["type"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
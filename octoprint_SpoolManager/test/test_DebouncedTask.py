@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+
+from octoprint_SpoolManager.debounced_task import DebouncedTask
+
+
+class TestDebouncedTask(unittest.TestCase):
+    def setUp(self):
+        self.runs = 0
+        self.ran = threading.Event()
+        self.debouncedTask = DebouncedTask(self._task, 0.05)
+
+    def tearDown(self):
+        self.debouncedTask.shutdown()
+
+    def _task(self):
+        self.runs += 1
+        self.ran.set()
+
+    def test_sharedRun(self):
+        startTime = time.monotonic()
+        self.assertTrue(self.debouncedTask.trigger())
+        for _ in range(4):
+            self.assertFalse(self.debouncedTask.trigger())
+        # not blocking the caller
+        self.assertLess(time.monotonic() - startTime, 0.05)
+
+        self.assertTrue(self.ran.wait(2))
+        time.sleep(0.1)
+        self.assertEqual(1, self.runs)
+
+        # after the run, the next trigger schedules a new one
+        self.ran.clear()
+        self.assertTrue(self.debouncedTask.trigger())
+        self.assertTrue(self.ran.wait(2))
+        self.assertEqual(2, self.runs)
+
+    def test_triggerRestartsDelay(self):
+        debouncedTask = DebouncedTask(self._task, 0.3)
+        try:
+            startTime = time.monotonic()
+            self.assertTrue(debouncedTask.trigger())
+            time.sleep(0.25)
+            # shortly before the first deadline, the late trigger gets the full delay
+            self.assertFalse(debouncedTask.trigger())
+            self.assertFalse(self.ran.wait(0.2))
+            self.assertTrue(self.ran.wait(2))
+            self.assertGreaterEqual(time.monotonic() - startTime, 0.55)
+            time.sleep(0.1)
+            self.assertEqual(1, self.runs)
+        finally:
+            debouncedTask.shutdown()
+
+    def test_maxWait(self):
+        runTimes = []
+        debouncedTask = DebouncedTask(
+            lambda: runTimes.append(time.monotonic()), 0.1, maxWaitSeconds=0.3
+        )
+        try:
+            startTime = time.monotonic()
+            for _ in range(12):
+                debouncedTask.trigger()
+                time.sleep(0.05)
+            lastTriggerTime = time.monotonic() - 0.05
+            time.sleep(0.3)
+        finally:
+            debouncedTask.shutdown()
+        # continuous triggers don't postpone the run forever
+        self.assertLess(runTimes[0] - startTime, 0.45)
+        # and the last trigger still gets its delay
+        self.assertGreaterEqual(runTimes[-1] - lastTriggerTime, 0.09)
+
+    def test_failingTask(self):
+        def failingTask():
+            self.runs += 1
+            raise ValueError("failed")
+
+        debouncedTask = DebouncedTask(failingTask, 0.01)
+        with self.assertLogs("octoprint_SpoolManager.debounced_task", "ERROR"):
+            debouncedTask.trigger()
+            time.sleep(0.2)
+        debouncedTask.trigger()
+        time.sleep(0.2)
+        debouncedTask.shutdown()
+        self.assertEqual(2, self.runs)
+
+    def test_shutdown(self):
+        self.debouncedTask.trigger()
+        self.debouncedTask.shutdown()
+        self.assertFalse(self.ran.wait(0.2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,327 @@
+import os
+import tempfile
+import time
+import unittest
+
+from octoprint_SpoolManager.common import GCodeTokenizer
+from octoprint_SpoolManager.filament_odometer import FilamentOdometer
+from octoprint_SpoolManager.gcode_file_analyzer import (
+    analyseGCodeFile,
+    buildCheckpointIndex,
+    remainingFilamentFromOffset,
+)
+from octoprint_SpoolManager.odometer_checkpoint import (
+    RECORD_SIZE,
+    OdometerCheckpoint,
+)
+from octoprint_SpoolManager.odometer_queue import OdometerQueue
+from octoprint_SpoolManager.plugin_hooks import PluginHooks
+
+TESTDATA_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "testdata"
+)
+
+
+class TestFilamentOdometer(unittest.TestCase):
+    def setUp(self):
+        self.odometer = FilamentOdometer()
+
+    def _process(self, *lines):
+        for line in lines:
+            self.odometer.processGCodeLine(line)
+
+    def test_tokenizer(self):
+        self.assertEqual(
+            ("G", 1, {"X": "10", "E": "1.5", "F": "1800"}),
+            GCodeTokenizer.tokenizeOdometerLine("G1 X10 E1.5 F1800 ; E99"),
+        )
+        self.assertEqual(("T", 3, {}), GCodeTokenizer.tokenizeOdometerLine("T3"))
+        self.assertEqual(("M", 83, {}), GCodeTokenizer.tokenizeOdometerLine("N12 M83"))
+        self.assertIsNone(GCodeTokenizer.tokenizeOdometerLine("M105"))
+        self.assertIsNone(GCodeTokenizer.tokenizeOdometerLine("G28"))
+        self.assertIsNone(GCodeTokenizer.tokenizeOdometerLine("; only comment"))
+        self.assertIsNone(GCodeTokenizer.tokenizeOdometerLine(""))
+        self.assertIsNone(GCodeTokenizer.parseFloat("nan"))
+        self.assertIsNone(GCodeTokenizer.parseFloat("inf"))
+        self.assertIsNone(GCodeTokenizer.parseFloat("1.2.3"))
+
+    def test_absoluteExtrusion(self):
+        self._process("M82", "G1 X1 E5", "G1 X2 E8", "G1 E6", "G1 E10")
+        self.assertEqual([10.0], self.odometer.getExtrusionAmount())
+
+    def test_relativeExtrusion(self):
+        self._process("M83", "G1 X1 E5", "G1 E-2", "G1 E2", "G1 E3")
+        self.assertEqual([8.0], self.odometer.getExtrusionAmount())
+
+    def test_g92ResetsPosition(self):
+        self._process("G1 E10", "G92 E0", "G1 E5", "G92", "G1 E1", "G92 X0", "G1 E2")
+        self.assertEqual([17.0], self.odometer.getExtrusionAmount())
+
+    def test_g91InfluencesExtruder(self):
+        self.odometer.set_g90_extruder(True)
+        self._process("G91", "G1 E5", "G1 E5", "G90", "G1 E20")
+        self.assertEqual([20.0], self.odometer.getExtrusionAmount())
+
+    def test_toolChange(self):
+        self._process("M83", "G1 E5", "T2", "G1 E3", "T0", "G1 E1", "T42", "G1 E1")
+        self.assertEqual([7.0, 0.0, 3.0], self.odometer.getExtrusionAmount())
+
+    def test_duplicationMode(self):
+        self._process("M83", "T1", "T0", "M605 S2", "G1 E4", "M605 S1", "G1 E1")
+        self.assertEqual([5.0, 4.0], self.odometer.getExtrusionAmount())
+
+    def test_extruderCountFromProfile(self):
+        self.odometer.set_extruder_count(2)
+        self.odometer.reset()
+        self._process("M83", "G1 E1")
+        # only the used tools are reported, not the preallocated ones
+        self.assertEqual([1.0], self.odometer.getExtrusionAmount())
+        self._process("T4", "G1 E2", "M605 S2", "T0", "G1 E1")
+        self.assertEqual([2.0, 1.0, 1.0, 1.0, 3.0], self.odometer.getExtrusionAmount())
+
+        state = self.odometer.getState()
+        restoredOdometer = FilamentOdometer()
+        restoredOdometer.setState(state)
+        self.assertEqual(state, restoredOdometer.getState())
+
+    def test_committedExtrusionWatermark(self):
+        self._process("M83", "G1 E5", "T1", "G1 E2")
+        self.odometer.setCommittedExtrusion(self.odometer.getExtrusionAmount())
+        # retract/unretract after the commit must not be counted again
+        self._process("G1 E-1", "G1 E1", "G1 E3", "T2", "G1 E1")
+        self.assertEqual([5.0, 5.0, 1.0], self.odometer.getExtrusionAmount())
+        self.assertEqual([5.0, 2.0, 0.0], self.odometer.getCommittedExtrusion())
+
+        self.odometer.reset_extruded_length()
+        self.assertEqual([0.0, 0.0, 0.0], self.odometer.getCommittedExtrusion())
+
+    def test_ignoredCommands(self):
+        self._process("M83", "M105", "M117 Extruding E100", "; G1 E100", "G28")
+        self.assertEqual([0.0], self.odometer.getExtrusionAmount())
+
+    def test_sentGCodeHookPrefilter(self):
+        hooks = PluginHooks(plugin=None, filament_odometer=self.odometer)
+        for cmd, gcode in [
+            ("M83", "M83"),
+            ("G1 X1 E2", "G1"),
+            ("G01 E1", "G01"),
+            ("T1", "T"),
+            ("G1 E3", "G1"),
+            ("M105", "M105"),
+            ("M117 G1 E100", "M117"),
+            # zero-padded commands are passed as written
+            ("M082", "M082"),
+            ("G092 E1", "G092"),
+            ("G1 E2", "G1"),
+            ("M0105", "M0105"),
+        ]:
+            hooks.on_sentGCodeHook(None, "sent", cmd, None, gcode)
+        self.assertEqual([3.0, 4.0], self.odometer.getExtrusionAmount())
+
+    def test_throttledExtrusionNotification(self):
+        receivedValues = []
+        self.odometer.set_extrusion_changed_listener(receivedValues.append, 5)
+        try:
+            self._process("M83", "G1 E1", "G1 E1", "G1 E1")
+            self.assertEqual([], receivedValues)
+            time.sleep(0.5)
+            self.assertEqual([[3.0]], receivedValues)
+
+            self._process("G1 E1")
+            self.odometer.flush_extrusion_changed_event()
+            self.assertEqual([[3.0], [4.0]], receivedValues)
+
+            self.odometer.reset()
+            self.assertEqual([[3.0], [4.0], [0.0]], receivedValues)
+        finally:
+            self.odometer.set_extrusion_changed_listener(None)
+
+    def test_odometerQueue(self):
+        odometerQueue = OdometerQueue(self.odometer)
+        hooks = PluginHooks(
+            plugin=None, filament_odometer=self.odometer, odometer_queue=odometerQueue
+        )
+        odometerQueue.start(3)
+        try:
+            for cmd, gcode in [("M83", "M83"), ("G1 E2", "G1"), ("G1 E3", "G1")]:
+                hooks.on_sentGCodeHook(None, "sent", cmd, None, gcode)
+            with odometerQueue.drained():
+                self.assertEqual([5.0], self.odometer.getExtrusionAmount())
+                # worker is paused, so the queue runs full: bounded, the sending thread doesn't wait
+                startTime = time.monotonic()
+                with self.assertLogs(
+                    "octoprint_SpoolManager.odometer_queue", "WARNING"
+                ):
+                    for _ in range(5):
+                        hooks.on_sentGCodeHook(None, "sent", "G1 E1", None, "G1")
+                self.assertLess(time.monotonic() - startTime, 0.1)
+                self.assertEqual(3, odometerQueue.getStatistics()["queueDepth"])
+            with odometerQueue.drained():
+                self.assertEqual([8.0], self.odometer.getExtrusionAmount())
+            statistics = odometerQueue.getStatistics()
+            self.assertEqual(2, statistics["droppedLines"])
+            self.assertEqual(1, statistics["fullQueueEpisodes"])
+            self.assertEqual(6, statistics["processedLines"])
+
+            # next full episode
+            with odometerQueue.drained():
+                for _ in range(4):
+                    hooks.on_sentGCodeHook(None, "sent", "G1 E1", None, "G1")
+            with odometerQueue.drained():
+                self.assertEqual([11.0], self.odometer.getExtrusionAmount())
+            statistics = odometerQueue.getStatistics()
+            self.assertEqual(3, statistics["droppedLines"])
+            self.assertEqual(2, statistics["fullQueueEpisodes"])
+        finally:
+            odometerQueue.stop()
+        self.assertFalse(odometerQueue.isRunning())
+
+    def test_pauseHandlingFile(self):
+        gcodeFile = os.path.join(
+            TESTDATA_FOLDER, "pausehandling", "M600pausetest.gcode"
+        )
+        with open(gcodeFile) as fp:
+            for line in fp:
+                self.odometer.processGCodeLine(line.strip())
+        self.assertEqual([1500.0], self.odometer.getExtrusionAmount())
+
+        self.assertEqual([1500.0], analyseGCodeFile(gcodeFile))
+
+    def test_analyseGCodeFile(self):
+        lines = [
+            "; generated",
+            "M82",
+            "G92 E0",
+            "G1 X1 Y1 E1.5 ; E100",
+            "G0 X2 Y2",
+            "G1 F1800 X3 E2.5",
+            "M105",
+            "T1",
+            "G92 E0",
+            "G1 X4\tE3",
+            "G1 E2 F2400",
+            "N3 G1 X1 E4",
+            "G91",
+            "M83",
+            "G1 E1",
+            "T0",
+            "M605 S2",
+            "G1 X1 E0.5",
+        ]
+        for line in lines:
+            self.odometer.processGCodeLine(line)
+        with tempfile.NamedTemporaryFile("w", suffix=".gcode", delete=False) as fp:
+            fp.write("\r\n".join(lines))
+        try:
+            # small chunks to check lines across chunk borders
+            for chunkSize in [7, 64, 1024]:
+                self.assertEqual(
+                    self.odometer.getExtrusionAmount(),
+                    analyseGCodeFile(fp.name, chunkSize=chunkSize),
+                )
+        finally:
+            os.remove(fp.name)
+
+    def test_analyseZeroPaddedGCodeFile(self):
+        for lines in [
+            ["M083", "G1 E1", "G1 E1"],
+            ["G1 E5", "G092 E0", "G1 E1"],
+            ["G91", "G1 E1", "G090", "G1 E3"],
+            ["M83", "G01 E2", "M082", "G0001 E5", "G00092 E1", "G1 E3"],
+            ["M83", "T1", "M0605 S2", "G1 E2", "G091", "G1 E1"],
+        ]:
+            with self.subTest(lines=lines):
+                odometer = FilamentOdometer()
+                odometer.set_g90_extruder(True)
+                for line in lines:
+                    odometer.processGCodeLine(line)
+                with tempfile.NamedTemporaryFile(
+                    "w", suffix=".gcode", delete=False
+                ) as fp:
+                    fp.write("\n".join(lines))
+                try:
+                    self.assertEqual(
+                        odometer.getExtrusionAmount(),
+                        analyseGCodeFile(fp.name, g90InfluencesExtruder=True),
+                    )
+                    self.assertEqual(
+                        odometer.getExtrusionAmount(),
+                        buildCheckpointIndex(fp.name, g90InfluencesExtruder=True)[
+                            "checkpoints"
+                        ][-1][7],
+                    )
+                finally:
+                    os.remove(fp.name)
+
+    def test_checkpointIndex(self):
+        lines = ["M83"]
+        for i in range(200):
+            lines.append("G1 X%d E%.2f ; move %d" % (i, (i % 7) * 0.25, i))
+            if i % 50 == 25:
+                lines.append("T%d" % (i % 3))
+        content = "\n".join(lines) + "\n"
+        with tempfile.NamedTemporaryFile("w", suffix=".gcode", delete=False) as fp:
+            fp.write(content)
+        try:
+            # small interval, so the offsets are between checkpoints
+            checkpointIndex = buildCheckpointIndex(fp.name, checkpointInterval=256)
+            self.assertGreater(len(checkpointIndex["checkpoints"]), 10)
+            total = analyseGCodeFile(fp.name)
+            self.assertEqual(total, checkpointIndex["checkpoints"][-1][7])
+
+            for offset in range(0, len(content) + 1, 97):
+                # reference: replay all complete lines before the offset
+                odometer = FilamentOdometer()
+                for line in content[:offset].split("\n")[:-1]:
+                    odometer.processGCodeLine(line)
+                extruded = odometer.getExtrusionAmount()
+                expected = [
+                    max(0.0, toolTotal - (extruded[i] if i < len(extruded) else 0.0))
+                    for i, toolTotal in enumerate(total)
+                ]
+                remaining = remainingFilamentFromOffset(
+                    fp.name, checkpointIndex, offset
+                )
+                self.assertEqual(len(expected), len(remaining))
+                for expectedLength, remainingLength in zip(expected, remaining):
+                    self.assertAlmostEqual(expectedLength, remainingLength)
+
+            self.assertEqual(
+                [0.0] * len(total),
+                remainingFilamentFromOffset(fp.name, checkpointIndex, len(content)),
+            )
+        finally:
+            os.remove(fp.name)
+
+    def test_odometerCheckpoint(self):
+        self._process("M83", "G1 E2.5", "T2", "G1 E1", "M605 S2")
+        with tempfile.TemporaryDirectory() as tempFolder:
+            checkpoint = OdometerCheckpoint(
+                os.path.join(tempFolder, "odometer.checkpoint")
+            )
+            self.assertIsNone(checkpoint.read())
+
+            checkpoint.start(self.odometer, 0.05)
+            try:
+                time.sleep(0.2)
+                self._process("G1 E1")
+                time.sleep(0.2)
+            finally:
+                checkpoint.stop()
+            self.assertEqual(RECORD_SIZE, os.path.getsize(checkpoint.getFilePath()))
+            state, timestamp = checkpoint.read()
+            self.assertEqual(self.odometer.getState(), state)
+            self.assertEqual([2.5, 0.0, 2.0], state["maxExtrusion"])
+
+            # damaged record
+            with open(checkpoint.getFilePath(), "r+b") as checkpointFile:
+                checkpointFile.seek(20)
+                checkpointFile.write(b"\xff")
+            self.assertIsNone(checkpoint.read())
+
+            checkpoint.remove()
+            self.assertFalse(os.path.exists(checkpoint.getFilePath()))
+
+
+if __name__ == "__main__":
+    unittest.main()
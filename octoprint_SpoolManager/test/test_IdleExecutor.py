@@ -0,0 +1,62 @@
+import concurrent.futures
+import time
+import unittest
+
+from octoprint_SpoolManager.idle_executor import IdleExecutor
+
+
+class TestIdleExecutor(unittest.TestCase):
+    def setUp(self):
+        self.createdExecutors = []
+        self.idleExecutor = IdleExecutor(self._createExecutor, 0.1)
+
+    def tearDown(self):
+        self.idleExecutor.shutdown()
+
+    def _createExecutor(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        self.createdExecutors.append(executor)
+        return executor
+
+    def test_shutdownAfterIdle(self):
+        # created with the first map, not with the batch
+        with self.idleExecutor.batch():
+            pass
+        self.assertFalse(self.idleExecutor.isRunning())
+
+        with self.idleExecutor.batch() as executor:
+            self.assertEqual([1, 2], list(executor.map(abs, [-1, -2])))
+            # not shut down while the batch is running
+            time.sleep(0.2)
+            self.assertEqual([3], list(executor.map(abs, [-3])))
+        with self.idleExecutor.batch() as executor:
+            executor.map(abs, [-1])
+        self.assertEqual(1, len(self.createdExecutors))
+        self.assertTrue(self.idleExecutor.isRunning())
+
+        time.sleep(0.3)
+        self.assertFalse(self.idleExecutor.isRunning())
+        with self.assertRaises(RuntimeError):
+            self.createdExecutors[0].submit(abs, -1)
+
+        # the next batch starts a new executor
+        with self.idleExecutor.batch() as executor:
+            self.assertEqual([4], list(executor.map(abs, [-4])))
+        self.assertEqual(2, len(self.createdExecutors))
+
+    def test_outsideOfBatch(self):
+        with self.assertRaises(RuntimeError):
+            self.idleExecutor.map(abs, [-1])
+        self.assertEqual([], self.createdExecutors)
+
+    def test_shutdown(self):
+        with self.idleExecutor.batch() as executor:
+            executor.map(abs, [-1])
+        self.idleExecutor.shutdown()
+        self.assertFalse(self.idleExecutor.isRunning())
+        with self.assertRaises(RuntimeError):
+            self.createdExecutors[0].submit(abs, -1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import concurrent.futures
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+
+from PIL import Image, PdfParser
+
+from octoprint_SpoolManager.label_sheet import (
+    LabelLayout,
+    buildLabelPages,
+    writeLabelSheet,
+)
+from octoprint_SpoolManager.qr_code_cache import QRCodeCache, loadLogoImage
+
+LOGO_LOCATION = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "static", "images", "SPMByOlli.png"
+)
+
+
+class TestLabelSheet(unittest.TestCase):
+    def setUp(self):
+        self.cacheFolder = tempfile.mkdtemp()
+        logoImage, logoFingerprint = loadLogoImage(LOGO_LOCATION)
+        self.qrCodeCache = QRCodeCache(self.cacheFolder, logoImage, logoFingerprint)
+        self.layout = LabelLayout("a4", columns=2, rows=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheFolder)
+
+    def _buildLabels(self, count, executor=None):
+        qrCodeRequests = [
+            (
+                "http://octopi.local/plugin/SpoolManager/selectSpoolByQRCode/%d"
+                % index,
+                "black",
+                "white",
+                self.layout.qrCodeSize,
+                "png",
+            )
+            for index in range(count)
+        ]
+        qrCodeImages = self.qrCodeCache.getImages(qrCodeRequests, executor)
+        return [
+            (qrCodeImage, "a very long spool name that does not fit %d" % index)
+            for index, qrCodeImage in enumerate(qrCodeImages)
+        ]
+
+    def test_renderedInProcessPool(self):
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=2, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            # no fallback to rendering in this process
+            with self.assertNoLogs("octoprint_SpoolManager.qr_code_cache"):
+                labels = self._buildLabels(5, executor)
+        # same images, now from the cache
+        self.assertEqual(labels, self._buildLabels(5))
+        qrCodeImage = Image.open(BytesIO(labels[0][0]))
+        self.assertEqual((self.layout.qrCodeSize,) * 2, qrCodeImage.size)
+
+    def test_pdfAndPng(self):
+        labels = self._buildLabels(5)
+        self.assertEqual(2, self.layout.pageCount(len(labels)))
+
+        pdfPath = os.path.join(self.cacheFolder, "labels.pdf")
+        with open(pdfPath, "w+b") as sheetFile:
+            writeLabelSheet(buildLabelPages(labels, self.layout), "pdf", sheetFile)
+        self.assertEqual(2, len(PdfParser.PdfParser(pdfPath).pages))
+
+        sheetFile = BytesIO()
+        writeLabelSheet(buildLabelPages(labels, self.layout), "png", sheetFile, 1)
+        pageImage = Image.open(BytesIO(sheetFile.getvalue()))
+        self.assertEqual((1240, 1754), pageImage.size)
+
+
+if __name__ == "__main__":
+    unittest.main()
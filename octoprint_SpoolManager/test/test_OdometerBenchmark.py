@@ -0,0 +1,40 @@
+import unittest
+
+from octoprint_SpoolManager.test import benchmark_FilamentOdometer as benchmark
+
+# budgets for the odometer path, currently ~520 bytes/line (tokenized line, parameter dict)
+MAX_PEAK_BYTES_PER_LINE = 2048
+MAX_RETAINED_BLOCKS_PER_LINE = 0.01
+
+
+class TestOdometerBenchmark(unittest.TestCase):
+    """
+    Small scale run of the odometer benchmark: extrusion results and allocation budgets of all corpora.
+    For the throughput numbers run: python -m octoprint_SpoolManager.test.benchmark_FilamentOdometer
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpora = benchmark.buildCorpora()
+
+    def test_corpora(self):
+        for corpus in self.corpora:
+            for path in benchmark.PATHS:
+                with self.subTest(corpus=corpus.name, path=path):
+                    result = benchmark.runBenchmark(corpus, path, repeat=1)
+                    self.assertEqual(corpus.expectedExtrusion, result.extrusion)
+                    self.assertGreater(result.linesPerSecond(), 0)
+                    if result.peakBytesPerLine is not None:
+                        # not measured before Python 3.9
+                        self.assertLess(
+                            result.peakBytesPerLine, MAX_PEAK_BYTES_PER_LINE
+                        )
+                    if len(corpus.lines) > 1000:
+                        # not significant for the few lines of the bundled files
+                        self.assertLess(
+                            result.retainedBlocksPerLine, MAX_RETAINED_BLOCKS_PER_LINE
+                        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from octoprint_SpoolManager.progress_throttle import ProgressThrottle
+
+
+class TestProgressThrottle(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.reported = []
+        self.progressThrottle = ProgressThrottle(
+            self.reported.append, everyItems=10, everyMillis=500, clock=lambda: self.now
+        )
+
+    def test_everyItems(self):
+        for itemNumber in range(1, 26):
+            self.progressThrottle.update(itemNumber)
+        self.assertEqual([1, 11, 21], self.reported)
+
+        self.assertTrue(self.progressThrottle.update(25, force=True))
+        self.assertEqual([1, 11, 21, 25], self.reported)
+
+    def test_everyMillis(self):
+        self.progressThrottle.update("1")
+        self.now = 0.4
+        self.progressThrottle.update("2")
+        self.now = 0.5
+        self.progressThrottle.update("3")
+        self.assertEqual(["1", "3"], self.reported)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+
+from octoprint_SpoolManager import qr_code_cache
+from octoprint_SpoolManager.qr_code_cache import QRCodeCache, loadLogoImage
+
+LOGO_LOCATION = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "static", "images", "SPMByOlli.png"
+)
+URL = "http://octopi.local/plugin/SpoolManager/selectSpoolByQRCode/1"
+
+
+class TestQRCodeCache(unittest.TestCase):
+    def setUp(self):
+        self.cacheFolder = tempfile.mkdtemp()
+        self.logoImage, self.logoFingerprint = loadLogoImage(LOGO_LOCATION)
+
+    def tearDown(self):
+        shutil.rmtree(self.cacheFolder)
+
+    def _createCache(self, **kwargs):
+        return QRCodeCache(
+            self.cacheFolder, self.logoImage, self.logoFingerprint, **kwargs
+        )
+
+    def _getImage(self, qrCodeCache, url=URL, size=None, imageFormat="jpeg"):
+        key = qrCodeCache.buildKey(url, "darkblue", "white", size, imageFormat)
+        return qrCodeCache.getImage(key, url, "darkblue", "white", size, imageFormat)
+
+    def test_renderedOnce(self):
+        with mock.patch.object(
+            qr_code_cache, "renderQRCode", wraps=qr_code_cache.renderQRCode
+        ) as renderQRCode:
+            qrCodeCache = self._createCache()
+            imageBytes = self._getImage(qrCodeCache)
+            self.assertEqual(imageBytes, self._getImage(qrCodeCache))
+            # from the cache folder after a restart
+            self.assertEqual(imageBytes, self._getImage(self._createCache()))
+            self.assertEqual(1, renderQRCode.call_count)
+
+            pngBytes = self._getImage(qrCodeCache, size=200, imageFormat="png")
+            pngImage = Image.open(BytesIO(pngBytes))
+            self.assertEqual(("PNG", (200, 200)), (pngImage.format, pngImage.size))
+            self.assertEqual(2, renderQRCode.call_count)
+
+    def test_keys(self):
+        qrCodeCache = self._createCache()
+        keys = {
+            qrCodeCache.buildKey(URL, "darkblue", "white", None, "jpeg"),
+            qrCodeCache.buildKey(URL + "0", "darkblue", "white", None, "jpeg"),
+            qrCodeCache.buildKey(URL, "black", "white", None, "jpeg"),
+            qrCodeCache.buildKey(URL, "darkblue", "yellow", None, "jpeg"),
+            qrCodeCache.buildKey(URL, "darkblue", "white", 300, "jpeg"),
+            qrCodeCache.buildKey(URL, "darkblue", "white", None, "png"),
+        }
+        self.assertEqual(6, len(keys))
+        self.assertEqual(
+            qrCodeCache.buildKey(URL, "darkblue", "white", None, "jpeg"),
+            self._createCache().buildKey(URL, "darkblue", "white", None, "jpeg"),
+        )
+
+    def test_limits(self):
+        qrCodeCache = self._createCache(maxEntries=2, maxFiles=10)
+        for index in range(15):
+            self._getImage(qrCodeCache, url=URL + str(index))
+        self.assertEqual(2, len(qrCodeCache._images))
+        self.assertTrue(len(os.listdir(self.cacheFolder)) <= 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
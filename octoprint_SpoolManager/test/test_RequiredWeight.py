@@ -0,0 +1,80 @@
+import unittest
+
+from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+from octoprint_SpoolManager.required_weight import (
+    calculateWeight,
+    createRequiredWeightSnapshot,
+    evaluateRequiredWeight,
+)
+
+
+def createSpool(**kwargs):
+    spoolValues = dict(
+        displayName="PLA",
+        diameter=1.75,
+        density=1.24,
+        totalWeightInGram=1000.0,
+        usedWeightInGram=900.0,
+    )
+    spoolValues.update(kwargs)
+    return SpoolModel(**spoolValues)
+
+
+class TestRequiredWeight(unittest.TestCase):
+    def test_allTools(self):
+        snapshot = createRequiredWeightSnapshot(
+            [10000.0, 100000.0, 500.0, 0.0],
+            [createSpool(), createSpool(), None, createSpool(density=None)],
+            0,
+        )
+        requiredWeightResult = evaluateRequiredWeight(snapshot)
+        self.assertFalse(requiredWeightResult["metaDataMissing"])
+        self.assertTrue(requiredWeightResult["attributesMissing"])
+        self.assertTrue(requiredWeightResult["notEnough"])
+
+        tool0, tool1, tool2, tool3 = requiredWeightResult["detailedSpoolResult"]
+        self.assertAlmostEqual(
+            calculateWeight(10000.0, 1.75, 1.24), tool0["requiredWeight"]
+        )
+        self.assertEqual(100.0, tool0["remainingWeight"])
+        self.assertFalse(tool0["notEnough"])
+        self.assertTrue(tool1["notEnough"])
+        self.assertEqual(
+            (False, 500.0), (tool2["spoolSelected"], tool2["requiredLength"])
+        )
+        self.assertEqual(["density"], tool3["missingFields"])
+        self.assertNotIn("requiredWeight", tool3)
+
+    def test_safetyLength(self):
+        spools = [createSpool()]
+        withoutSafety = evaluateRequiredWeight(
+            createRequiredWeightSnapshot([1000.0], spools, 0)
+        )
+        withSafety = evaluateRequiredWeight(
+            createRequiredWeightSnapshot([1000.0], spools, 1000)
+        )
+        self.assertAlmostEqual(
+            2 * withoutSafety["detailedSpoolResult"][0]["requiredWeight"],
+            withSafety["detailedSpoolResult"][0]["requiredWeight"],
+        )
+
+    def test_invalidValues(self):
+        requiredWeightResult = evaluateRequiredWeight(
+            createRequiredWeightSnapshot(
+                [1000.0], [createSpool(usedWeightInGram=None, diameter="x")], 0
+            )
+        )
+        detailedSpoolResult = requiredWeightResult["detailedSpoolResult"][0]
+        self.assertEqual(["diameter"], detailedSpoolResult["invalidFields"])
+        self.assertTrue(requiredWeightResult["attributesMissing"])
+
+    def test_metaDataMissing(self):
+        requiredWeightResult = evaluateRequiredWeight(
+            createRequiredWeightSnapshot([], [createSpool()], 0)
+        )
+        self.assertTrue(requiredWeightResult["metaDataMissing"])
+        self.assertEqual([], requiredWeightResult["detailedSpoolResult"])
+
+
+if __name__ == "__main__":
+    unittest.main()
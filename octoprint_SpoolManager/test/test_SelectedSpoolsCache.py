@@ -0,0 +1,154 @@
+import logging
+import shutil
+import tempfile
+import unittest
+
+from octoprint_SpoolManager.DatabaseManager import DatabaseManager
+from octoprint_SpoolManager.db import DatabaseSettings
+from octoprint_SpoolManager.models.SpoolModel import SpoolModel
+from octoprint_SpoolManager.selected_spools_cache import SelectedSpoolsCache
+
+
+class TestSelectedSpoolsCache(unittest.TestCase):
+    def setUp(self):
+        self.baseFolder = tempfile.mkdtemp()
+        databaseSettings = DatabaseSettings()
+        databaseSettings.useExternal = False
+        databaseSettings.baseFolder = self.baseFolder
+
+        self.databaseManager = DatabaseManager(logging.getLogger("testLogger"), False)
+        self.databaseManager.initDatabase(databaseSettings, self._clientOutput)
+        self.databaseManager.reCreateDatabase()
+
+        self.loadedDatabaseIds = []
+        self.selectedSpoolsCache = SelectedSpoolsCache(self._loadSpools)
+
+    def tearDown(self):
+        self.databaseManager.closePool()
+        shutil.rmtree(self.baseFolder)
+
+    def _clientOutput(self, type, title, message):
+        pass
+
+    def _loadSpools(self, databaseIds):
+        self.loadedDatabaseIds.append(sorted(databaseIds))
+        return self.databaseManager.loadSpools(databaseIds)
+
+    def _createSpool(self, displayName):
+        spoolModel = SpoolModel()
+        spoolModel.displayName = displayName
+        spoolModel.totalWeightInGram = 1000.0
+        return self.databaseManager.saveSpool(spoolModel)
+
+    def test_readsWithoutDatabase(self):
+        firstId = self._createSpool("first")
+        secondId = self._createSpool("second")
+
+        selectedSpools = self.selectedSpoolsCache.getSelectedSpools(
+            [secondId, None, firstId, 4711]
+        )
+        self.assertEqual(
+            ["second", None, "first", None],
+            [
+                None if spoolModel is None else spoolModel.displayName
+                for spoolModel in selectedSpools
+            ],
+        )
+        self.selectedSpoolsCache.getSelectedSpools([secondId, None, firstId, 4711])
+        # only one query, also for the not existing spool
+        self.assertEqual([sorted([firstId, secondId, 4711])], self.loadedDatabaseIds)
+
+        # copies are handed out
+        selectedSpools[0].displayName = "modified"
+        self.assertEqual(
+            "second",
+            self.selectedSpoolsCache.getSelectedSpools([secondId])[0].displayName,
+        )
+
+    def test_writeThrough(self):
+        firstId = self._createSpool("first")
+        secondId = self._createSpool("second")
+        self.selectedSpoolsCache.getSelectedSpools([firstId])
+        version = self.selectedSpoolsCache.getVersion()
+
+        # save
+        spoolModel = self.databaseManager.loadSpool(firstId)
+        spoolModel.usedWeightInGram = 100.0
+        self.databaseManager.saveSpool(spoolModel)
+        self.selectedSpoolsCache.updateSpool(spoolModel)
+        self.assertEqual(
+            900.0,
+            self.selectedSpoolsCache.getSelectedSpools([firstId])[
+                0
+            ].remainingWeightInGram,
+        )
+        self.assertTrue(self.selectedSpoolsCache.getVersion() > version)
+
+        # select
+        version = self.selectedSpoolsCache.getVersion()
+        self.selectedSpoolsCache.setSelection(
+            [firstId, secondId], self.databaseManager.loadSpool(secondId)
+        )
+        selectedSpools = self.selectedSpoolsCache.getSelectedSpools([firstId, secondId])
+        self.assertEqual(
+            ["first", "second"],
+            [spoolModel.displayName for spoolModel in selectedSpools],
+        )
+        self.assertTrue(self.selectedSpoolsCache.getVersion() > version)
+
+        # delete
+        self.databaseManager.deleteSpool(secondId)
+        self.selectedSpoolsCache.removeSpool(secondId)
+        self.assertEqual(
+            None, self.selectedSpoolsCache.getSelectedSpools([firstId, secondId])[1]
+        )
+        self.assertEqual(1, len(self.loadedDatabaseIds))
+
+    def test_invalidate(self):
+        firstId = self._createSpool("first")
+        self.selectedSpoolsCache.getSelectedSpools([firstId])
+
+        # changed by an other instance
+        spoolModel = self.databaseManager.loadSpool(firstId)
+        spoolModel.displayName = "changed"
+        self.databaseManager.saveSpool(spoolModel)
+        self.assertEqual(
+            "first",
+            self.selectedSpoolsCache.getSelectedSpools([firstId])[0].displayName,
+        )
+
+        version = self.selectedSpoolsCache.getVersion()
+        self.selectedSpoolsCache.invalidate()
+        self.assertTrue(self.selectedSpoolsCache.getVersion() > version)
+        self.assertEqual(
+            "changed",
+            self.selectedSpoolsCache.getSelectedSpools([firstId])[0].displayName,
+        )
+        self.assertEqual(2, len(self.loadedDatabaseIds))
+
+    def test_stringDatabaseIds(self):
+        # selected by QR code, the id of the url is a string
+        firstId = self._createSpool("first")
+        self.assertEqual(
+            [firstId], list(self.databaseManager.loadSpools([str(firstId)]).keys())
+        )
+
+        selectedSpools = self.selectedSpoolsCache.getSelectedSpools(
+            [str(firstId), None, "invalid"]
+        )
+        self.assertEqual("first", selectedSpools[0].displayName)
+        self.assertEqual([None, None], selectedSpools[1:])
+
+        # stored selection (int) and old settings (string) share the cached spool
+        self.selectedSpoolsCache.setSelection(
+            [firstId], self.databaseManager.loadSpool(firstId)
+        )
+        self.assertEqual(
+            "first",
+            self.selectedSpoolsCache.getSelectedSpools([str(firstId)])[0].displayName,
+        )
+        self.assertEqual([[firstId]], self.loadedDatabaseIds)
+
+
+if __name__ == "__main__":
+    unittest.main()
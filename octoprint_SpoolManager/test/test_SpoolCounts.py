@@ -0,0 +1,44 @@
+import unittest
+
+from octoprint_SpoolManager.spool_counts import SpoolCounts
+
+
+class TestSpoolCounts(unittest.TestCase):
+    def setUp(self):
+        self.spoolCounts = SpoolCounts(3)
+
+    def test_staleCount(self):
+        generation = self.spoolCounts.getGeneration()
+        self.assertTrue(self.spoolCounts.put("all", 10, generation))
+        self.assertEqual(10, self.spoolCounts.get("all"))
+
+        # count query started before a save/delete
+        generation = self.spoolCounts.getGeneration()
+        self.spoolCounts.clear()
+        self.assertEqual(None, self.spoolCounts.get("all"))
+        self.assertFalse(self.spoolCounts.put("all", 10, generation))
+        self.assertEqual(None, self.spoolCounts.get("all"))
+
+        self.assertTrue(
+            self.spoolCounts.put("all", 11, self.spoolCounts.getGeneration())
+        )
+        self.assertEqual(11, self.spoolCounts.get("all"))
+
+    def test_maxSize(self):
+        generation = self.spoolCounts.getGeneration()
+        for index in range(3):
+            self.spoolCounts.put("filter %d" % index, index, generation)
+        # recently used, not dropped
+        self.assertEqual(0, self.spoolCounts.get("filter 0"))
+
+        self.spoolCounts.put("filter 3", 3, generation)
+        self.assertEqual(3, len(self.spoolCounts))
+        self.assertEqual(None, self.spoolCounts.get("filter 1"))
+        self.assertEqual(
+            [0, 2, 3],
+            [self.spoolCounts.get("filter %d" % index) for index in [0, 2, 3]],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()